@@ -1,6 +1,23 @@
 import os
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from common.db_pool import create_engine, log_pool_stats as _log_pool_stats, pool_stats as _pool_stats
+
+# пул и asyncpg настраиваются в common/db_pool.py, здесь — размеры для этого сервиса
 DATABASE_URL = os.getenv("DATABASE_URL")
-engine = create_async_engine(DATABASE_URL, echo=False, future=True)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "5"))
+DB_APPLICATION_NAME = os.getenv("DB_APPLICATION_NAME", "admin-bot")
+
+engine = create_engine(DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_APPLICATION_NAME)
 SessionLocal = async_sessionmaker(engine, expire_on_commit=False)
+
+
+def pool_stats() -> dict:
+    return _pool_stats(engine)
+
+
+async def log_pool_stats():
+    # метрик-эндпоинта у бота нет: состояние пула периодически пишем в лог
+    await _log_pool_stats(engine)
@@ -13,6 +13,7 @@ from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy import select
 
 from src.repositories.user_bots import UserBot
+from src.db import log_pool_stats
 
 from aiogram.fsm.storage.memory import SimpleEventIsolation
 
@@ -29,6 +30,8 @@ async def main():
     # session_maker = get_session_maker()
 
     bot = Bot(token=token, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+    # ссылку держим, иначе задачу может собрать GC
+    pool_stats_task = asyncio.create_task(log_pool_stats(), name="db-pool-stats")
 
     dp = Dispatcher(events_isolation=SimpleEventIsolation())
 
@@ -51,7 +54,10 @@ async def main():
     dp.include_router(stats.router)
     dp.include_router(super.router)
 
-    await dp.start_polling(bot)
+    try:
+        await dp.start_polling(bot)
+    finally:
+        pool_stats_task.cancel()
 
     # poll = PollingManager(dp=dp, session_maker=session_maker)
 
@@ -0,0 +1,129 @@
+"""
+Общая настройка async-движка SQLAlchemy для payment-api, user-bot и admin-bot:
+пул соединений, кеш prepared statements asyncpg, режим PgBouncer и статистика
+ожидания соединения из пула. Размеры пула у каждого сервиса свои (см. его db.py).
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Callable, List
+from uuid import uuid4
+
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+logger = logging.getLogger(__name__)
+
+DB_POOL_TIMEOUT_SEC = float(os.getenv("DB_POOL_TIMEOUT_SEC", "30"))
+DB_POOL_RECYCLE_SEC = int(os.getenv("DB_POOL_RECYCLE_SEC", "1800"))
+DB_PRE_PING = os.getenv("DB_PRE_PING", "1") == "1"
+# кеш подготовленных выражений asyncpg на соединение
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+# PgBouncer в режиме transaction pooling: серверное соединение меняется между транзакциями,
+# поэтому кеши prepared statements выключаем, а имена делаем уникальными
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "0") == "1"
+# ожидание соединения дольше этого считаем медленным
+DB_SLOW_CHECKOUT_SEC = float(os.getenv("DB_SLOW_CHECKOUT_SEC", "0.1"))
+# для сервисов без метрик-эндпоинта: как часто писать состояние пула в лог (0 — выключено)
+DB_POOL_STATS_LOG_SEC = int(os.getenv("DB_POOL_STATS_LOG_SEC", "300"))
+
+
+class CheckoutStats:
+    """Накопленная статистика ожидания соединения из пула."""
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.slow = 0
+        self._listeners: List[Callable[[float], None]] = []
+
+    def subscribe(self, callback: Callable[[float], None]):
+        """callback(seconds) на каждую выдачу — например, для Prometheus-счётчиков."""
+        self._listeners.append(callback)
+
+    def add(self, elapsed: float):
+        self.count += 1
+        self.sum += elapsed
+        self.max = max(self.max, elapsed)
+        if elapsed > DB_SLOW_CHECKOUT_SEC:
+            self.slow += 1
+        for callback in self._listeners:
+            callback(elapsed)
+
+
+checkout_stats = CheckoutStats()
+
+
+class TimedPool(AsyncAdaptedQueuePool):
+    """
+    QueuePool, который меряет ожидание свободного соединения (checkout).
+    Открытие нового соединения в замер не входит: его длительность
+    записывается в info соединения и вычитается.
+    """
+
+    @property
+    def capacity(self) -> int:
+        return self.size() + max(0, self._max_overflow)
+
+    def _create_connection(self):
+        t0 = time.perf_counter()
+        rec = super()._create_connection()
+        rec.info["_connect_sec"] = time.perf_counter() - t0
+        return rec
+
+    def _do_get(self):
+        t0 = time.perf_counter()
+        rec = None
+        try:
+            rec = super()._do_get()
+            return rec
+        finally:
+            connect = rec.info.pop("_connect_sec", 0.0) if rec is not None else 0.0
+            checkout_stats.add(max(0.0, time.perf_counter() - t0 - connect))
+
+
+def create_engine(url: str, pool_size: int, max_overflow: int, application_name: str) -> AsyncEngine:
+    connect_args = {
+        "statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+        "server_settings": {"application_name": application_name},
+    }
+    if DB_PGBOUNCER:
+        connect_args["statement_cache_size"] = 0
+        connect_args["prepared_statement_cache_size"] = 0
+        connect_args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid4()}__"
+    return create_async_engine(
+        url,
+        echo=False,
+        poolclass=TimedPool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=DB_POOL_TIMEOUT_SEC,
+        pool_recycle=DB_POOL_RECYCLE_SEC,
+        pool_pre_ping=DB_PRE_PING,
+        connect_args=connect_args,
+    )
+
+
+def pool_saturation(engine: AsyncEngine) -> float:
+    """Доля занятых соединений от pool_size + max_overflow."""
+    pool = engine.sync_engine.pool
+    return pool.checkedout() / max(1, pool.capacity)
+
+
+def pool_stats(engine: AsyncEngine) -> dict:
+    n = checkout_stats.count
+    return {
+        "checked_out": engine.sync_engine.pool.checkedout(),
+        "saturation": round(pool_saturation(engine), 3),
+        "checkout_avg_ms": round(checkout_stats.sum / n * 1000, 2) if n else 0.0,
+        "checkout_max_ms": round(checkout_stats.max * 1000, 2),
+        "checkout_slow": checkout_stats.slow,
+    }
+
+
+async def log_pool_stats(engine: AsyncEngine):
+    while DB_POOL_STATS_LOG_SEC > 0:
+        await asyncio.sleep(DB_POOL_STATS_LOG_SEC)
+        logger.info("db pool: %s", pool_stats(engine))
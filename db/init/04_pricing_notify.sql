@@ -0,0 +1,38 @@
+-- уведомления об изменении прайсинга: сервисы держат цены в памяти
+-- и сбрасывают кеш по LISTEN pricing_changed
+
+CREATE OR REPLACE FUNCTION notify_pricing_changed() RETURNS trigger AS $$
+DECLARE
+  rec RECORD;
+  key BIGINT;
+BEGIN
+  IF TG_OP = 'DELETE' THEN
+    rec := OLD;
+  ELSE
+    rec := NEW;
+  END IF;
+
+  IF TG_TABLE_NAME = 'pricing_rules' THEN
+    key := rec.bot_id;
+    -- правило перевесили на другого бота — сбрасываем и старого
+    IF TG_OP = 'UPDATE' AND OLD.bot_id IS DISTINCT FROM NEW.bot_id THEN
+      PERFORM pg_notify('pricing_changed', json_build_object('table', TG_TABLE_NAME, 'bot_id', OLD.bot_id)::text);
+    END IF;
+  ELSE
+    key := rec.id;
+  END IF;
+
+  PERFORM pg_notify('pricing_changed', json_build_object('table', TG_TABLE_NAME, 'bot_id', key)::text);
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_pricing_rules_notify ON pricing_rules;
+CREATE TRIGGER trg_pricing_rules_notify
+  AFTER INSERT OR UPDATE OR DELETE ON pricing_rules
+  FOR EACH ROW EXECUTE FUNCTION notify_pricing_changed();
+
+DROP TRIGGER IF EXISTS trg_user_bots_notify ON user_bots;
+CREATE TRIGGER trg_user_bots_notify
+  AFTER INSERT OR UPDATE OR DELETE ON user_bots
+  FOR EACH ROW EXECUTE FUNCTION notify_pricing_changed();
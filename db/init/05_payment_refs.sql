@@ -0,0 +1,5 @@
+-- поиск заказа по id транзакции провайдера (вебхуки Platega / Heleket)
+CREATE INDEX IF NOT EXISTS idx_orders_platega_tx ON orders ((gateway_payload ->> 'transactionId'))
+  WHERE gateway_payload ? 'transactionId';
+CREATE INDEX IF NOT EXISTS idx_orders_heleket_uuid ON orders (((gateway_payload -> 'heleket') ->> 'uuid'))
+  WHERE gateway_payload ? 'heleket';
@@ -0,0 +1,12 @@
+-- outbox событий по заказам: пишется в той же транзакции, что и смена статуса,
+-- relay в payment-api разбирает непереданные строки (FOR UPDATE SKIP LOCKED)
+CREATE TABLE IF NOT EXISTS order_events (
+  id           BIGSERIAL PRIMARY KEY,
+  order_id     BIGINT NOT NULL REFERENCES orders(id) ON DELETE CASCADE,
+  kind         VARCHAR(32) NOT NULL,          -- paid / ...
+  payload      JSONB,
+  created_at   TIMESTAMP DEFAULT NOW(),
+  published_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_order_events_unpublished ON order_events (id) WHERE published_at IS NULL;
@@ -0,0 +1,12 @@
+-- будим outbox relay сразу после коммита транзакции, записавшей события
+CREATE OR REPLACE FUNCTION notify_order_events() RETURNS trigger AS $$
+BEGIN
+  PERFORM pg_notify('order_events', '');
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_order_events_notify ON order_events;
+CREATE TRIGGER trg_order_events_notify
+  AFTER INSERT ON order_events
+  FOR EACH STATEMENT EXECUTE FUNCTION notify_order_events();
@@ -0,0 +1,35 @@
+-- составные и частичные индексы под реальные запросы репозиториев и выгрузок.
+-- CONCURRENTLY: файл можно прогнать на живой базе без блокировки записи
+-- (psql -f, вне транзакции). Проверка планов: db/bench/explain_queries.py
+
+-- выгрузка заказов пользователя за период (stats: st_do_user_*)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_orders_user_created
+  ON orders (user_id, created_at DESC);
+
+-- выгрузки за период по всем заказам и оплаченным
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_orders_created_at ON orders (created_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_orders_paid_range
+  ON orders (paid_at) WHERE status = 'paid';
+
+-- восстановление наблюдений за оплатой: OrdersRepo.list_pending_for_watch
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_orders_pending_created
+  ON orders (created_at) WHERE status = 'pending';
+
+-- пользователи бота (join в выгрузках) и выгрузка пользователей за период
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_bot_created
+  ON users (bot_id, created_at DESC);
+
+-- выводы пользователя / выгрузка выводов за период
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_withdrawals_user_created
+  ON withdrawals (user_id, created_at DESC);
+-- успешные выводы в выгрузке фильтруются по processed_at
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_withdrawals_processed
+  ON withdrawals (processed_at) WHERE processed_at IS NOT NULL;
+
+-- прайс-лист бота: PricingCache._load_sheet и точечные правила
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_pricing_rules_lookup
+  ON pricing_rules (bot_id, item_type, mode, currency) WHERE is_active;
+
+-- заменены составными выше
+DROP INDEX CONCURRENTLY IF EXISTS idx_orders_paid_at;
+DROP INDEX CONCURRENTLY IF EXISTS idx_pricing_rules_active;
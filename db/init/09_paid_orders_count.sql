@@ -0,0 +1,32 @@
+-- счётчик оплаченных заказов пользователя: история покупок не считает count(*) на каждую страницу.
+-- Ведётся триггером, поэтому попадает в ту же транзакцию, что и перевод заказа в paid,
+-- откуда бы он ни делался (settlement, вотчеры, ручные правки).
+ALTER TABLE users ADD COLUMN IF NOT EXISTS paid_orders_count INTEGER NOT NULL DEFAULT 0;
+
+-- keyset-пагинация истории идёт по (paid_at, id); у оплаченных заказов paid_at должен быть
+UPDATE orders SET paid_at = created_at WHERE status = 'paid' AND paid_at IS NULL;
+
+UPDATE users u SET paid_orders_count = c.cnt
+FROM (SELECT user_id, count(*) AS cnt FROM orders WHERE status = 'paid' GROUP BY user_id) c
+WHERE c.user_id = u.id AND u.paid_orders_count IS DISTINCT FROM c.cnt;
+
+CREATE OR REPLACE FUNCTION orders_paid_count() RETURNS trigger AS $$
+BEGIN
+  IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.status = 'paid' AND OLD.user_id IS NOT NULL THEN
+    UPDATE users SET paid_orders_count = GREATEST(paid_orders_count - 1, 0) WHERE id = OLD.user_id;
+  END IF;
+  IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.status = 'paid' AND NEW.user_id IS NOT NULL THEN
+    UPDATE users SET paid_orders_count = paid_orders_count + 1 WHERE id = NEW.user_id;
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_orders_paid_count ON orders;
+CREATE TRIGGER trg_orders_paid_count
+  AFTER INSERT OR DELETE OR UPDATE OF status, user_id ON orders
+  FOR EACH ROW EXECUTE FUNCTION orders_paid_count();
+
+-- индекс под курсор (paid_at, id) вместо OFFSET
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_orders_user_paid_keyset
+  ON orders (user_id, paid_at DESC, id DESC) WHERE status = 'paid';
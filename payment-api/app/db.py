@@ -1,6 +1,32 @@
 import os
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from common.db_pool import create_engine, checkout_stats, pool_saturation, DB_SLOW_CHECKOUT_SEC
+
+from . import metrics
+
+# пул и asyncpg настраиваются в common/db_pool.py, здесь — размеры для этого сервиса
 DATABASE_URL = os.getenv("DATABASE_URL")
-engine = create_async_engine(DATABASE_URL, echo=False, future=True)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_APPLICATION_NAME = os.getenv("DB_APPLICATION_NAME", "payment-api")
+
+engine = create_engine(DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_APPLICATION_NAME)
 SessionLocal = async_sessionmaker(engine, expire_on_commit=False)
+
+
+def _count_checkout(elapsed: float):
+    metrics.inc_counter("db_pool_checkout_seconds_sum", elapsed, "Суммарное ожидание соединения из пула")
+    metrics.inc_counter("db_pool_checkout_total", 1, "Выдачи соединений из пула")
+    if elapsed > DB_SLOW_CHECKOUT_SEC:
+        metrics.inc_counter("db_pool_checkout_slow_total", 1, "Выдачи соединений дольше 100 мс")
+
+
+checkout_stats.subscribe(_count_checkout)
+metrics.gauge_callback("db_pool_checked_out", lambda: engine.sync_engine.pool.checkedout(),
+                       "Соединений БД выдано из пула")
+metrics.gauge_callback("db_pool_overflow", lambda: engine.sync_engine.pool.overflow(),
+                       "Соединений сверх pool_size (отрицательное — ещё не открыты)")
+metrics.gauge_callback("db_pool_saturation", lambda: pool_saturation(engine),
+                       "Доля занятых соединений от pool_size + max_overflow")
@@ -0,0 +1,59 @@
+import os
+from typing import Dict
+
+import httpx
+
+try:
+    import h2  # noqa: F401  # нужен httpx для HTTP/2
+    _H2_AVAILABLE = True
+except ImportError:
+    _H2_AVAILABLE = False
+
+HTTP_TIMEOUT_SEC = float(os.getenv("HTTP_TIMEOUT_SEC", "30"))
+HTTP_CONNECT_TIMEOUT_SEC = float(os.getenv("HTTP_CONNECT_TIMEOUT_SEC", "10"))
+HTTP_MAX_CONNECTIONS_PER_HOST = int(os.getenv("HTTP_MAX_CONNECTIONS_PER_HOST", "20"))
+HTTP_MAX_KEEPALIVE_PER_HOST = int(os.getenv("HTTP_MAX_KEEPALIVE_PER_HOST", "10"))
+HTTP_KEEPALIVE_EXPIRY_SEC = float(os.getenv("HTTP_KEEPALIVE_EXPIRY_SEC", "60"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "1") == "1" and _H2_AVAILABLE
+
+# один пул соединений на origin (scheme://host:port) на весь процесс
+_clients: Dict[str, httpx.AsyncClient] = {}
+
+
+def _origin(url: str) -> str:
+    u = httpx.URL(url)
+    return f"{u.scheme}://{u.host}:{u.port or (443 if u.scheme == 'https' else 80)}"
+
+
+def get_client(url: str) -> httpx.AsyncClient:
+    """
+    Общий клиент для хоста из url. Соединения переиспользуются (keep-alive),
+    HTTP/2 включается, если хост его поддерживает (ALPN), иначе остаётся HTTP/1.1.
+    """
+    key = _origin(url)
+    client = _clients.get(key)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            http2=HTTP2_ENABLED,
+            timeout=httpx.Timeout(HTTP_TIMEOUT_SEC, connect=HTTP_CONNECT_TIMEOUT_SEC),
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS_PER_HOST,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_PER_HOST,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_SEC,
+            ),
+        )
+        _clients[key] = client
+    return client
+
+
+def open_clients(*urls: str):
+    """Заранее создаёт клиенты для известных шлюзов (вызывается из lifespan)."""
+    for url in urls:
+        if url:
+            get_client(url)
+
+
+async def close_clients():
+    for client in list(_clients.values()):
+        await client.aclose()
+    _clients.clear()
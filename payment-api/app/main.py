@@ -1,40 +1,77 @@
 import uvicorn
 from fastapi import FastAPI
-from .routers import orders, withdrawals
+from .routers import orders, withdrawals, metrics, quotes, callbacks
 from contextlib import asynccontextmanager
-from .redis import get_redis
+from .redis import close_redis
 import asyncio
 from multiprocessing import Process
-from .services.pricing import update_ton_price
-from rq import Worker, Queue
-from .services.fulfillment import fulfill_order
+from .services.pricing import run_price_refresher
+from .services.ton_watcher import stop_ton_watchers
+from .services.payment_watch import watch_scheduler, HELEKET_RECONCILE_ENABLED
+from .services.heleket_reconciler import heleket_reconciler
+from .services.outbox_relay import outbox_relay, run_outbox_relay
+from .services import platega, heleket
+from .http_client import open_clients, close_clients
+from .services.pricing_cache import pricing_cache
+from .services.fx import fx
+from .db import DATABASE_URL
+from .services.fulfillment_worker import run_fulfillment_worker
 import json
+import os
+
+# relay outbox можно вынести в отдельный процесс (при нескольких репликах API — рядом с воркером)
+OUTBOX_RELAY_PROCESS = os.getenv("OUTBOX_RELAY_PROCESS", "0") == "1"
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
 
-    task = asyncio.create_task(update_ton_price())
+    # общие HTTP-пулы к шлюзам: одно TLS-рукопожатие на хост вместо одного на запрос
+    open_clients(platega.BASE, heleket.HELEKET_BASE, "https://fragment.com")
+
+    await pricing_cache.start(DATABASE_URL)
+    await fx.start()
+    task = asyncio.create_task(run_price_refresher())
+    # поднимаем наблюдение за pending-заказами, в том числе оставшимися от прошлого запуска
+    if not OUTBOX_RELAY_PROCESS:
+        await outbox_relay.start()
+    await watch_scheduler.start()
+    if HELEKET_RECONCILE_ENABLED:
+        await heleket_reconciler.start()
 
     yield
 
+    await heleket_reconciler.stop()
+    await watch_scheduler.stop()
+    await outbox_relay.stop()
+    await stop_ton_watchers()
+    task.cancel()
     try:
         await task
     except asyncio.CancelledError:
         pass
+    await fx.stop()
+    await pricing_cache.stop()
+    await close_clients()
+    await close_redis()
 
 app = FastAPI(title="Payment API", lifespan=lifespan)
 app.include_router(orders.router)
 app.include_router(withdrawals.router)
-# app.include_router(callbacks.router)  # если используешь вебхуки
+app.include_router(quotes.router)
+app.include_router(metrics.router)
+app.include_router(callbacks.router)
 
 
 def start_worker():
-    redis = asyncio.run(get_redis())
-    q = Queue(connection=redis)
-    worker = Worker([q])
-    worker.work(with_scheduler=True)
+    # отдельный процесс: N параллельных задач фулфилмента на одном event loop
+    asyncio.run(run_fulfillment_worker())
+
+def start_relay():
+    asyncio.run(run_outbox_relay())
 
 if __name__ == "__main__":
     p = Process(target=start_worker)
     p.start()
+    if OUTBOX_RELAY_PROCESS:
+        Process(target=start_relay).start()
     uvicorn.run("app.main:app", host="0.0.0.0", port=8081, reload=False)
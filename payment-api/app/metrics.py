@@ -0,0 +1,72 @@
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+# Минимальный реестр метрик в текстовом формате Prometheus (отдаётся на /metrics).
+# Внешняя библиотека не нужна: у нас только счётчики и гейджи.
+
+_Labels = Tuple[Tuple[str, str], ...]
+
+_lock = threading.Lock()
+_types: Dict[str, str] = {}
+_help: Dict[str, str] = {}
+_values: Dict[str, Dict[_Labels, float]] = {}
+_callbacks: Dict[str, Callable[[], float]] = {}
+
+
+def _key(labels: Optional[dict]) -> _Labels:
+    return tuple(sorted((k, str(v)) for k, v in (labels or {}).items()))
+
+
+def _declare(name: str, kind: str, help: str):
+    if name not in _types:
+        _types[name] = kind
+        _help[name] = help
+        _values.setdefault(name, {})
+
+
+def set_gauge(name: str, value: float, help: str = "", labels: Optional[dict] = None):
+    with _lock:
+        _declare(name, "gauge", help)
+        _values[name][_key(labels)] = float(value)
+
+
+def inc_counter(name: str, value: float = 1.0, help: str = "", labels: Optional[dict] = None):
+    with _lock:
+        _declare(name, "counter", help)
+        series = _values[name]
+        k = _key(labels)
+        series[k] = series.get(k, 0.0) + value
+
+
+def gauge_callback(name: str, fn: Callable[[], float], help: str = ""):
+    """Гейдж, значение которого вычисляется в момент выдачи (например, «сколько секунд назад»)."""
+    with _lock:
+        _declare(name, "gauge", help)
+        _callbacks[name] = fn
+
+
+def get_value(name: str, labels: Optional[dict] = None) -> Optional[float]:
+    with _lock:
+        return (_values.get(name) or {}).get(_key(labels))
+
+
+def render() -> str:
+    lines = []
+    with _lock:
+        for name in sorted(_types):
+            if _help[name]:
+                lines.append(f"# HELP {name} {_help[name]}")
+            lines.append(f"# TYPE {name} {_types[name]}")
+            if name in _callbacks:
+                try:
+                    lines.append(f"{name} {float(_callbacks[name]())}")
+                except Exception:
+                    pass
+                continue
+            for labels, value in _values[name].items():
+                if labels:
+                    rendered = ",".join(f'{k}="{v}"' for k, v in labels)
+                    lines.append(f"{name}{{{rendered}}} {value}")
+                else:
+                    lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
@@ -17,6 +17,7 @@ class User(Base):
     accepted_offer_at: Mapped[datetime | None] = mapped_column(TIMESTAMP(timezone=False), nullable=True)
     # accepted_offer_at = mapped_column(TIMESTAMP(timezone=False), nullable=True)
     is_blocked: Mapped[bool] = mapped_column(Boolean, default=False)
+    bot_id: Mapped[int | None] = mapped_column(ForeignKey("user_bots.id"), nullable=True)
     created_at: Mapped[datetime | None] = mapped_column(TIMESTAMP(timezone=False))
 
 class RequiredChannel(Base):
@@ -43,6 +44,15 @@ class Order(Base):
     created_at: Mapped[datetime | None] = mapped_column(TIMESTAMP(timezone=False))
     paid_at: Mapped[datetime | None] = mapped_column(TIMESTAMP(timezone=False))
 
+class OrderEvent(Base):
+    __tablename__ = "order_events"
+    id: Mapped[int] = mapped_column(primary_key=True)
+    order_id: Mapped[int] = mapped_column(ForeignKey("orders.id"), nullable=False)
+    kind: Mapped[str] = mapped_column(String(32), nullable=False)
+    payload: Mapped[dict | None] = mapped_column(JSON)
+    created_at: Mapped[datetime | None] = mapped_column(TIMESTAMP(timezone=False))
+    published_at: Mapped[datetime | None] = mapped_column(TIMESTAMP(timezone=False))
+
 class Broadcast(Base):
     __tablename__ = "broadcasts"
     id: Mapped[int] = mapped_column(primary_key=True)
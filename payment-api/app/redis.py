@@ -1,24 +1,40 @@
 import os
-from redis import Redis
-from rq import Queue
+from redis.asyncio import ConnectionPool, Redis
 
+# Один асинхронный пул на процесс: постановка в очередь, стримы, дедуп вебхуков, локи.
+# Синхронного клиента в payment-api нет — блокирующий сетевой вызов в event loop
+# тормозил бы создание заказов под нагрузкой.
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+REDIS_SOCKET_TIMEOUT_SEC = float(os.getenv("REDIS_SOCKET_TIMEOUT_SEC", "10"))
+REDIS_HEALTH_CHECK_SEC = int(os.getenv("REDIS_HEALTH_CHECK_SEC", "30"))
+
+_pool: ConnectionPool | None = None
 _redis: Redis | None = None
 
 def get_redis_url() -> str:
     return os.getenv("REDIS_URL", "redis://redis/0")
 
-async def get_redis() -> Redis:
-    global _redis
+def get_redis() -> Redis:
+    global _pool, _redis
     if _redis is None:
-        _redis = Redis.from_url(get_redis_url())
+        # пул создаём лениво: воркер фулфилмента и relay живут в отдельных процессах
+        # и должны получить свои соединения уже после fork
+        _pool = ConnectionPool.from_url(
+            get_redis_url(),
+            max_connections=REDIS_MAX_CONNECTIONS,
+            # XREAD/XREADGROUP с block держат соединение дольше таймаута
+            socket_timeout=None,
+            socket_connect_timeout=REDIS_SOCKET_TIMEOUT_SEC,
+            health_check_interval=REDIS_HEALTH_CHECK_SEC,
+        )
+        _redis = Redis(connection_pool=_pool)
     return _redis
 
 async def close_redis():
-    global _redis
+    global _pool, _redis
     if _redis is not None:
-        _redis.close()
+        await _redis.aclose()
         _redis = None
-
-async def get_queue():
-    q = Queue(connection=(await get_redis()))
-    return q
+    if _pool is not None:
+        await _pool.disconnect()
+        _pool = None
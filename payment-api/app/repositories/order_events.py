@@ -0,0 +1,41 @@
+from typing import List
+from sqlalchemy import select, insert, update, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..models import OrderEvent
+
+
+class OrderEventsRepo:
+    """
+    Outbox событий по заказам. Методы не коммитят: строка пишется в транзакции
+    вызывающего вместе со сменой статуса заказа.
+    """
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def add(self, order_id: int, kind: str, payload: dict | None = None):
+        await self.session.execute(
+            insert(OrderEvent).values(order_id=order_id, kind=kind, payload=payload or {}, created_at=func.now())
+        )
+
+    async def claim_unpublished(self, limit: int = 100) -> List[OrderEvent]:
+        """
+        Пачка непереданных событий под FOR UPDATE SKIP LOCKED:
+        параллельные relay'и берут разные строки и не ждут друг друга.
+        """
+        q = (
+            select(OrderEvent)
+            .where(OrderEvent.published_at.is_(None))
+            .order_by(OrderEvent.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        res = await self.session.execute(q)
+        return list(res.scalars().all())
+
+    async def mark_published(self, event_ids: List[int]):
+        if not event_ids:
+            return
+        await self.session.execute(
+            update(OrderEvent).where(OrderEvent.id.in_(event_ids)).values(published_at=func.now())
+        )
@@ -1,8 +1,11 @@
 from typing import Optional, List
-from sqlalchemy import select, insert, update, func, cast, desc, nulls_last
-from sqlalchemy.dialects.postgresql import JSONB
+from datetime import timedelta
+from sqlalchemy import select, insert, update, func, cast, desc, nulls_last, any_, bindparam, or_, text
+from sqlalchemy.dialects.postgresql import JSONB, ARRAY
+from sqlalchemy.types import BigInteger, String
 from sqlalchemy.ext.asyncio import AsyncSession
-from ..models import Order
+from ..models import Order, User
+from .order_events import OrderEventsRepo
 
 
 class OrdersRepo:
@@ -10,12 +13,15 @@ class OrdersRepo:
         self.session = session
 
     async def create_pending_ton_order(
-        self, user_id: int, username: str | None, recipient: str | None, type: str, amount: float, price: float, memo: str, wallet: str
+        self, user_id: int, username: str | None, recipient: str | None, type: str, amount: float, price: float, memo: str, wallet: str,
+        bot_id: int | None = None, amount_ton: str | None = None
     ) -> Order:
         """
         Создаёт заказ в статусе pending для оплаты TON.
+        amount_ton — точная сумма к оплате (9 знаков); orders.price округлён до 2 знаков.
         """
-        payload = {"wallet": wallet, "memo": memo, "network": "TON", "type": type, "amount": amount, "recipient": recipient}
+        payload = {"wallet": wallet, "memo": memo, "network": "TON", "type": type, "amount": amount, "recipient": recipient,
+                   "bot_id": bot_id, "amount_ton": amount_ton}
         res = await self.session.execute(
             insert(Order).values(
                 user_id=user_id,
@@ -33,14 +39,16 @@ class OrdersRepo:
             ).returning(Order)
         )
         order = res.scalar_one()
+        await self._created_event(order, bot_id)
         await self.session.commit()
         return order
     
     async def create_pending_sbp_order(
-        self, user_id: int, username: str | None, recipient: str | None, type: str, amount: float, price: float, transaction_id: str, redirect_url: str
+        self, user_id: int, username: str | None, recipient: str | None, type: str, amount: float, price: float, transaction_id: str, redirect_url: str,
+        bot_id: int | None = None
     ) -> Order:
         payload = {"provider": "platega", "paymentMethod": "SBP", "redirect": redirect_url,
-                   "transactionId": transaction_id, "type": type, "amount": amount, "recipient": recipient}
+                   "transactionId": transaction_id, "type": type, "amount": amount, "recipient": recipient, "bot_id": bot_id}
         res = await self.session.execute(
             insert(Order).values(
                 user_id=user_id, username=username, recipient=recipient,
@@ -50,13 +58,15 @@ class OrdersRepo:
             ).returning(Order)
         )
         order = res.scalar_one()
+        await self._created_event(order, bot_id)
         await self.session.commit()
         return order
     
     async def create_pending_other_crypto_order(
-        self, user_id: int, username: str | None, recipient: str | None, type: str, amount: float, price: float
+        self, user_id: int, username: str | None, recipient: str | None, type: str, amount: float, price: float,
+        bot_id: int | None = None
     ) -> Order:
-        payload = {"provider": "heleket", "type": type, "amount": amount, "recipient": recipient}
+        payload = {"provider": "heleket", "type": type, "amount": amount, "recipient": recipient, "bot_id": bot_id}
         res = await self.session.execute(
             insert(Order).values(
                 user_id=user_id, username=username, recipient=recipient,
@@ -66,6 +76,7 @@ class OrdersRepo:
             ).returning(Order)
         )
         order = res.scalar_one()
+        await self._created_event(order, bot_id)
         await self.session.commit()
         return order
     
@@ -86,10 +97,73 @@ class OrdersRepo:
         )
         await self.session.commit()
 
+    async def _created_event(self, order: Order, bot_id: int | None):
+        await OrderEventsRepo(self.session).add(order.id, "created", {
+            "type": order.type, "amount": order.amount, "price": str(order.price),
+            "currency": order.currency, "bot_id": bot_id,
+        })
+
+    async def mark_paid_if_pending(self, order_id: int, tx_hash: str, income: float | None = None) -> Optional[Order]:
+        """
+        UPDATE ... WHERE status='pending' RETURNING: переводит заказ в paid ровно один раз.
+        None — заказ уже не pending (его подтвердил параллельный обработчик).
+        Не коммитит: вызывающий делает это вместе с остальной проводкой.
+        """
+        new_kv = cast({"tx_hash": tx_hash}, JSONB)
+        merged_payload = func.coalesce(Order.gateway_payload, cast({}, JSONB)).op("||")(new_kv)
+        res = await self.session.execute(
+            update(Order)
+            .where(Order.id == order_id, Order.status == "pending")
+            .values(
+                status="paid",
+                paid_at=func.now(),
+                income=income,
+                gateway_payload=merged_payload,
+            )
+            .returning(Order)
+        )
+        return res.scalar_one_or_none()
+
+    async def claim_fulfillment(self, order_id: int) -> bool:
+        """
+        Захватывает оплаченный заказ под фулфилмент: gateway_payload.fulfillment = 'started'.
+        False — заказ уже захвачен или выполнен (задачу доставили повторно), покупать
+        второй раз нельзя. Повтор после ошибки ('retry') захватывается снова. Коммитит сразу,
+        чтобы захват был виден до похода в Fragment.
+        """
+        payload = func.coalesce(Order.gateway_payload, cast({}, JSONB), type_=JSONB)
+        res = await self.session.execute(
+            update(Order)
+            .where(
+                Order.id == order_id,
+                Order.status == "paid",
+                or_(
+                    payload["fulfillment"].astext == "retry",
+                    # fulfillment_result без fulfillment — заказы, выполненные до появления захвата
+                    ~payload.has_key("fulfillment") & ~payload.has_key("fulfillment_result"),
+                ),
+            )
+            .values(gateway_payload=payload.op("||")(cast({"fulfillment": "started"}, JSONB)))
+            .returning(Order.id)
+        )
+        claimed = res.scalar_one_or_none() is not None
+        await self.session.commit()
+        return claimed
+
     async def get_by_id(self, order_id: int) -> Optional[Order]:
         res = await self.session.execute(select(Order).where(Order.id == order_id))
         return res.scalar_one_or_none()
     
+    async def get_statuses(self, order_ids: List[int]) -> List[tuple]:
+        """[(id, status, message), ...] одним запросом WHERE id = ANY(:ids)."""
+        if not order_ids:
+            return []
+        ids = bindparam("ids", list(order_ids), type_=ARRAY(BigInteger))
+        res = await self.session.execute(
+            select(Order.id, Order.status, Order.message).where(Order.id == any_(ids))
+        )
+        return [tuple(row) for row in res.all()]
+
     async def list_paid_by_user(self, user_id: int, limit: int = 10, offset: int = 0) -> List[Order]:
         q = (
             select(Order)
@@ -121,11 +195,107 @@ class OrdersRepo:
         )
         await self.session.commit()
 
-    async def change_memo(self, order_id: int, type: str, amount: float, memo: str, wallet: str, recipient: str | None):
-        payload = {"wallet": wallet, "memo": memo, "network": "TON", "type": type, "amount": amount, "recipient": recipient}
+    async def change_memo(self, order_id: int, type: str, amount: float, memo: str, wallet: str, recipient: str | None, bot_id: int | None = None,
+                          amount_ton: str | None = None):
+        payload = {"wallet": wallet, "memo": memo, "network": "TON", "type": type, "amount": amount, "recipient": recipient,
+                   "bot_id": bot_id, "amount_ton": amount_ton}
         q = (
             update(Order).where(Order.id==order_id).values(gateway_payload=payload)
         )
         await self.session.execute(q)
         await self.session.commit()
 
+    async def list_pending_for_watch(self, max_age_sec: int) -> List[tuple]:
+        """
+        Незавершённые заказы моложе max_age_sec для восстановления наблюдения после рестарта.
+        Возвращает [(order, user_tg_id, user_bot_id, age_sec), ...]; возраст считаем на стороне БД,
+        чтобы не зависеть от часового пояса сервера.
+        """
+        age_sec = func.extract("epoch", func.now() - Order.created_at).label("age_sec")
+        q = (
+            select(Order, User.tg_user_id, User.bot_id, age_sec)
+            .join(User, User.id == Order.user_id, isouter=True)
+            .where(
+                Order.status == "pending",
+                Order.created_at >= func.now() - timedelta(seconds=max_age_sec),
+            )
+            .order_by(Order.id)
+        )
+        res = await self.session.execute(q)
+        return [tuple(row) for row in res.all()]
+
+    # Выражения и условия слово в слово как в индексах db/init/05_payment_refs.sql:
+    # с ключами-параметрами и CAST (как строит gateway_payload[...].as_string())
+    # планировщик индекс не узнаёт и читает orders целиком.
+    async def get_by_platega_transaction(self, transaction_id: str) -> Optional[Order]:
+        res = await self.session.execute(
+            select(Order).where(
+                text("gateway_payload ? 'transactionId'"),
+                text("gateway_payload ->> 'transactionId' = :tx").bindparams(tx=transaction_id),
+            )
+        )
+        return res.scalars().first()
+
+    async def get_by_heleket_uuid(self, uuid: str) -> Optional[Order]:
+        res = await self.session.execute(
+            select(Order).where(
+                text("gateway_payload ? 'heleket'"),
+                text("(gateway_payload -> 'heleket') ->> 'uuid' = :uuid").bindparams(uuid=uuid),
+            )
+        )
+        return res.scalars().first()
+
+    async def get_user_bot_id(self, order: Order) -> Optional[int]:
+        """bot_id для проводки: из gateway_payload, для старых заказов — из users.bot_id."""
+        bot_id = (order.gateway_payload or {}).get("bot_id")
+        if bot_id:
+            return bot_id
+        res = await self.session.execute(select(User.bot_id).where(User.id == order.user_id))
+        return res.scalar_one_or_none()
+
+    async def list_pending_by_heleket_uuids(self, uuids: List[str]) -> List[tuple]:
+        """Pending-заказы Heleket по пачке uuid инвойсов: [(order, user_bot_id), ...]."""
+        if not uuids:
+            return []
+        q = (
+            select(Order, User.bot_id)
+            .join(User, User.id == Order.user_id, isouter=True)
+            .where(
+                Order.status == "pending",
+                text("gateway_payload ? 'heleket'"),
+                text("(gateway_payload -> 'heleket') ->> 'uuid' = ANY(:uuids)").bindparams(
+                    bindparam("uuids", list(uuids), type_=ARRAY(String))
+                ),
+            )
+        )
+        res = await self.session.execute(q)
+        return [tuple(row) for row in res.all()]
+
+    async def oldest_pending_heleket_age(self) -> Optional[float]:
+        """Возраст в секундах самого старого pending-инвойса Heleket; None — таких нет."""
+        res = await self.session.execute(
+            select(func.extract("epoch", func.now() - func.min(Order.created_at)))
+            .where(Order.status == "pending", Order.gateway_payload["heleket"]["uuid"].as_string().isnot(None))
+        )
+        age = res.scalar_one_or_none()
+        return float(age) if age is not None else None
+
+    async def mark_failed_bulk(self, order_ids: List[int]) -> List[int]:
+        """
+        Переводит pending-заказы в failed одним UPDATE, возвращает id реально изменённых.
+        События failed пишутся в outbox в той же транзакции.
+        """
+        if not order_ids:
+            return []
+        res = await self.session.execute(
+            update(Order)
+            .where(Order.id.in_(order_ids), Order.status == "pending")
+            .values(status="failed")
+            .returning(Order.id)
+        )
+        ids = [row[0] for row in res.all()]
+        events = OrderEventsRepo(self.session)
+        for order_id in ids:
+            await events.add(order_id, "failed")
+        await self.session.commit()
+        return ids
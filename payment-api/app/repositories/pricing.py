@@ -1,5 +1,5 @@
 from typing import Optional
-from sqlalchemy import select, update, insert
+from sqlalchemy import select, update, insert, text
 from sqlalchemy.ext.asyncio import AsyncSession
 from ..models import PricingRule
 import os
@@ -50,3 +50,31 @@ class PricingRepo:
             )
         await self.session.execute(q)
         await self.session.commit()
+
+    async def set_dynamic_for_all_bots(self, prices: dict[tuple[str, str], float], markup: float | None = None):
+        """
+        Выставляет динамические цены сразу всем ботам: по одному set-based запросу на тип товара
+        (обновить существующие dynamic-правила, недостающим ботам вставить новые) и один commit.
+        prices: {(item_type, currency): price}
+        """
+        if markup is None:
+            markup = float(os.getenv("REFERRAL_PERCENT", "5.0"))
+        q = text("""
+            WITH upd AS (
+                UPDATE pricing_rules
+                   SET manual_price = :price
+                 WHERE item_type = :item_type
+                   AND currency = :currency
+                   AND mode = 'dynamic'
+                RETURNING bot_id
+            )
+            INSERT INTO pricing_rules (item_type, mode, markup_percent, currency, is_active, manual_price, bot_id)
+            SELECT :item_type, 'dynamic', :markup, :currency, TRUE, :price, b.id
+              FROM user_bots b
+             WHERE NOT EXISTS (SELECT 1 FROM upd WHERE upd.bot_id = b.id)
+        """)
+        for (item_type, currency), price in prices.items():
+            await self.session.execute(q, {
+                "item_type": item_type, "currency": currency, "price": price, "markup": markup,
+            })
+        await self.session.commit()
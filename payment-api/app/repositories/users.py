@@ -45,14 +45,15 @@ class UsersRepo:
         )
         await self.session.commit()
 
-    async def add_balance(self, user_id: int, delta: float):
+    async def add_balance(self, user_id: int, delta: float, *, commit: bool = True):
         # аккуратное инкрементирование DECIMAL
         await self.session.execute(
             update(User)
             .where(User.id == user_id)
             .values(balance=User.balance + delta)
         )
-        await self.session.commit()
+        if commit:
+            await self.session.commit()
 
     async def upsert_from_tg_payload(self, tg_user_id: int, username: str | None) -> User:
         stmt = pg_insert(User).values(
@@ -1,54 +1,119 @@
 # app/routers/callbacks.py
-import json, base64, hashlib, os
+import json, base64, hashlib, hmac, os, logging
 from fastapi import APIRouter, Request, HTTPException
 from ..db import SessionLocal
 from ..repositories.orders import OrdersRepo
-from ..services.referral_accrual import accrue_referral_reward
-from ..services.fulfillment import fulfill_order
+from ..redis import get_redis
+from ..services import heleket as hk
+from ..services import platega
+from ..services.payment_watch import watch_scheduler
+from ..services.settlement import on_order_paid
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/callbacks", tags=["callbacks"])
 HELEKET_PAYMENT_KEY = os.getenv("HELEKET_PAYMENT_API_KEY", "")
+# повторные доставки одного и того же события отбрасываем по ключу в Redis
+WEBHOOK_DEDUPE_TTL_SEC = int(os.getenv("WEBHOOK_DEDUPE_TTL_SEC", str(7 * 24 * 3600)))
 
 def _verify_heleket_signature(raw_body: bytes) -> dict:
+    if not HELEKET_PAYMENT_KEY:
+        # без ключа подпись может посчитать кто угодно
+        raise HTTPException(503, "Heleket callbacks are not configured")
     data = json.loads(raw_body.decode("utf-8"))
     sign = data.pop("sign", None)
-    # Важно: хеш считается по ТОМУ ЖЕ JSON, который прислал Heleket (экранирование слешей уже учтено),
-    # поэтому сериализуем с separators и ensure_ascii=True, а затем base64+md5.
-    normalized = json.dumps(data, ensure_ascii=True, separators=(",", ":"))
+    # Хеш считается по тому же JSON, что сформировал Heleket (PHP json_encode):
+    # без пробелов, \uXXXX для не-ASCII и экранированные слеши. Затем base64 + md5 с ключом.
+    normalized = json.dumps(data, ensure_ascii=True, separators=(",", ":")).replace("/", "\\/")
     b64 = base64.b64encode(normalized.encode("utf-8")).decode("ascii")
     calc = hashlib.md5((b64 + HELEKET_PAYMENT_KEY).encode("utf-8")).hexdigest()
-    if not sign or calc != sign:
+    if not sign or not hmac.compare_digest(calc, str(sign)):
         raise HTTPException(400, "Invalid Heleket signature")
     return data
 
+def _verify_platega_headers(request: Request):
+    # Platega присылает в колбэке те же X-MerchantId / X-Secret, что мы используем в запросах
+    if not (platega.MID and platega.SEC):
+        # иначе пустые заголовки совпадут с пустыми настройками
+        raise HTTPException(503, "Platega callbacks are not configured")
+    mid = request.headers.get("X-MerchantId", "")
+    secret = request.headers.get("X-Secret", "")
+    if not (hmac.compare_digest(mid, platega.MID) and hmac.compare_digest(secret, platega.SEC)):
+        raise HTTPException(401, "Invalid Platega credentials")
+
+async def _first_delivery(provider: str, tx_id: str, status: str) -> bool:
+    r = get_redis()
+    return bool(await r.set(f"webhook:{provider}:{tx_id}:{status}", 1, nx=True, ex=WEBHOOK_DEDUPE_TTL_SEC))
+
+async def _forget_delivery(provider: str, tx_id: str, status: str):
+    # обработка упала — пусть провайдер доставит событие ещё раз
+    r = get_redis()
+    await r.delete(f"webhook:{provider}:{tx_id}:{status}")
+
+async def _settle(order, tx_hash: str | None):
+    async with SessionLocal() as session:
+        bot_id = await OrdersRepo(session).get_user_bot_id(order)
+    watch_scheduler.cancel(order.id)
+    await on_order_paid(order.id, tx_hash, bot_id)
+
 @router.post("/heleket")
 async def heleket_webhook(request: Request):
     raw = await request.body()
     data = _verify_heleket_signature(raw)
 
-    # ожидаемые поля: order_id, status, txid и т.д.
-    order_id = data.get("order_id")
+    # ожидаемые поля: uuid, order_id (наш md5), status, txid и т.д.
+    uuid = data.get("uuid")
     status = (data.get("status") or "").lower()
     txid = data.get("txid")
 
-    if not order_id:
-        raise HTTPException(422, "order_id missing")
+    if not uuid:
+        raise HTTPException(422, "uuid missing")
+    if not await _first_delivery("heleket", uuid, status):
+        return {"ok": True, "duplicate": True}
+
+    try:
+        async with SessionLocal() as session:
+            order = await OrdersRepo(session).get_by_heleket_uuid(uuid)
+        if not order:
+            logger.warning("Heleket webhook: заказ с uuid=%s не найден", uuid)
+            return {"ok": True}
+
+        if hk.is_paid_status(status):
+            await _settle(order, txid)
+        elif hk.is_failed_status(status):
+            watch_scheduler.cancel(order.id)
+    except Exception:
+        await _forget_delivery("heleket", uuid, status)
+        raise
+
+    return {"ok": True}
+
+@router.post("/platega")
+async def platega_webhook(request: Request):
+    _verify_platega_headers(request)
+    data = await request.json()
 
-    # Нас интересует paid / paid_over
-    if status in {"paid", "paid_over"}:
+    tx_id = str(data.get("id") or data.get("transactionId") or "")
+    status = (data.get("status") or "").upper()
+
+    if not tx_id:
+        raise HTTPException(422, "id missing")
+    if not await _first_delivery("platega", tx_id, status):
+        return {"ok": True, "duplicate": True}
+
+    try:
         async with SessionLocal() as session:
-            orders = OrdersRepo(session)
-            order = await orders.get_by_id(int(order_id)) if str(order_id).isdigit() else None
-            # если ты используешь строковый order_id, то ищи по orders.gateway_payload->>'heleket_order_id'
-            if not order:
-                # fallback: найти по gateway_payload.order_id
-                # ... твой поиск ...
-                pass
-
-            if order and order.status != "paid":
-                await orders.mark_paid(order.id, txid or "n/a", income=None)
-                fresh = await orders.get_by_id(order.id)
-                await accrue_referral_reward(session, fresh)
-                await fulfill_order(session, fresh)
+            order = await OrdersRepo(session).get_by_platega_transaction(tx_id)
+        if not order:
+            logger.warning("Platega webhook: заказ с transactionId=%s не найден", tx_id)
+            return {"ok": True}
+
+        if status == "CONFIRMED":
+            await _settle(order, tx_id)
+        elif platega.is_final_failure(status):
+            watch_scheduler.cancel(order.id)
+    except Exception:
+        await _forget_delivery("platega", tx_id, status)
+        raise
 
     return {"ok": True}
@@ -0,0 +1,25 @@
+from fastapi import APIRouter, HTTPException
+from ..schemas import QuotesResponse, QuoteItem
+from ..db import SessionLocal
+from ..services.pricing_cache import pricing_cache
+from ..services.quotes import quote_engine
+
+router = APIRouter(prefix="/quotes", tags=["quotes"])
+
+
+@router.get("", response_model=QuotesResponse)
+async def get_quotes(bot_tg_id: int):
+    """Цены за единицу по всем типам товара и способам оплаты бота — для клавиатур user-bot."""
+    async with SessionLocal() as session:
+        bot_id = await pricing_cache.get_bot_id(session, bot_tg_id)
+        if bot_id is None:
+            raise HTTPException(404, "Bot not found")
+        quotes = await quote_engine.for_bot(session, bot_id)
+    return QuotesResponse(
+        bot_tg_id=bot_tg_id,
+        quotes=[
+            QuoteItem(order_type=q.order_type, payment_method=q.payment_method,
+                      currency=q.currency, unit_price=str(q.unit_price))
+            for q in quotes.as_list()
+        ],
+    )
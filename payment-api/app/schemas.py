@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Literal, Optional
+from typing import List, Literal, Optional
 
 PaymentMethod = Literal["TON", "SBP", "CRYPTO_OTHER"]
 OrderType = Literal["stars", "premium", "ton"]
@@ -40,3 +40,16 @@ class OrderStatusResponse(BaseModel):
     order_id: int
     status: Literal["pending", "paid", "failed"]
     message: Optional[str] = None
+
+class OrderStatusesResponse(BaseModel):
+    orders: List[OrderStatusResponse]
+
+class QuoteItem(BaseModel):
+    order_type: OrderType
+    payment_method: PaymentMethod
+    currency: str
+    unit_price: str  # строкой, чтобы не терять точность Decimal
+
+class QuotesResponse(BaseModel):
+    bot_tg_id: int
+    quotes: list[QuoteItem]
@@ -1,14 +1,11 @@
 from ..models import Order
-from ..repositories.pricing import PricingRepo
+from .pricing_cache import pricing_cache
 from sqlalchemy.ext.asyncio import AsyncSession
 from ..services.pricing import calc_ton_for_stars, calc_ton_for_premium
-import requests
-
-from currency_converter import CurrencyConverter
+from .fx import fx
 
 async def get_amount(session: AsyncSession, order: Order, bot_id: int) -> float | None:
-    repo = PricingRepo(session)
-    price_ton = await repo.get_active_dynamic(order.type, "TON", bot_id)
+    price_ton = await pricing_cache.get_rule(session, bot_id, order.type, "dynamic", "TON")
     if order.type == "stars":
         self_price = float(calc_ton_for_stars(order.amount, price_ton.manual_price))
     if order.type == "premium":
@@ -42,23 +39,12 @@ async def get_amount(session: AsyncSession, order: Order, bot_id: int) -> float
 
 
 async def get_ton_to_usd_price():
-    """Получает текущую цену TON в USD через CoinGecko API"""
+    """Текущая цена TON в USD из кеша курсов (обновляется в фоне)"""
     try:
-        url = "https://api.coingecko.com/api/v3/simple/price"
-        params = {
-            'ids': 'the-open-network',
-            'vs_currencies': 'usd'
-        }
-        
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        
-        data = response.json()
-        ton_price = data['the-open-network']['usd']
-        return ton_price
-        
-    except requests.exceptions.RequestException as e:
-        return None
+        await fx.ensure()
+    except Exception:
+        pass
+    return fx.ton_usd
 
 async def convert_ton_to_usd(amount) -> float| None:
     """Конвертирует количество TON в USD"""
@@ -69,15 +55,19 @@ async def convert_ton_to_usd(amount) -> float| None:
     else:
         return None
 
+async def _usd_per_rub() -> float:
+    await fx.ensure()
+    if fx.usd_per_rub is None:
+        raise RuntimeError("Нет курса RUB/USD")
+    return fx.usd_per_rub
+
 async def convert_ton_to_rub(amount: float) -> float:
     usd_amount = await convert_ton_to_usd(amount)
-    c = CurrencyConverter()
-    usd_to_rub = float(c.convert(1, 'RUB', 'USD'))
+    usd_to_rub = await _usd_per_rub()
     return usd_amount / usd_to_rub
 
 async def convert_rub_to_usd(amount: float) -> float:
-    c = CurrencyConverter()
-    return float(c.convert(amount, 'RUB', 'USD'))
+    return float(amount) * await _usd_per_rub()
 
 async def convert_usd_to_ton(amount: float) -> float:
     one_ton = await convert_ton_to_usd(1)
@@ -1,10 +1,11 @@
-import httpx
 import logging
 import base64
 import re
-from tonutils.client import TonapiClient
-from tonutils.wallet import WalletV5R1
+import time
+from collections import OrderedDict
 import os
+from ..http_client import get_client
+from .wallet_sender import wallet_sender
 
 STEL_SSID = os.getenv("STEL_SSID", "")
 STEL_DT = os.getenv("STEL_DT", "")
@@ -15,8 +16,6 @@ FRAGMENT_ADDRESS = os.getenv("FRAGMENT_ADDRESS", "")
 FRAGMENT_PUBLICKEY = os.getenv("FRAGMENT_PUBLICKEY", "")
 FRAGMENT_WALLETS = os.getenv("FRAGMENT_WALLETS", "")
 
-API_TON = os.getenv("API_TON", "")
-MNEMONIC = os.getenv("TON_MNEMONICS", "").split()
 
 def get_cookies():
     return {
@@ -33,18 +32,18 @@ class PremiumFragmentClient:
     async def fetch_recipient(self, query, mountity):
         data = {"query": query,  "months": mountity, "method": "searchPremiumGiftRecipient"}
         #print(data)
-        async with httpx.AsyncClient() as client:
-            response = await client.post(self.URL, cookies=get_cookies(), data=data)
-           # print(response.json())
-            return response.json().get("found", {}).get("recipient")
+        client = get_client(self.URL)
+        response = await client.post(self.URL, cookies=get_cookies(), data=data)
+        # print(response.json())
+        return response.json().get("found", {}).get("recipient")
 
     async def fetch_req_id(self, recipient, mountity):
         data = {"recipient": recipient, "months": mountity, "method": "initGiftPremiumRequest"}
         # print(data)
-        async with httpx.AsyncClient() as client:
-            response = await client.post(self.URL, cookies=get_cookies(), data=data)
-            # print(response.json())
-            return response.json().get("req_id")
+        client = get_client(self.URL)
+        response = await client.post(self.URL, cookies=get_cookies(), data=data)
+        # print(response.json())
+        return response.json().get("req_id")
 
     async def fetch_buy_link(self, recipient, req_id, mountity):
         data = {
@@ -66,13 +65,13 @@ class PremiumFragmentClient:
             "user-agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/141.0.0.0 Safari/537.36",
             "x-requested-with": "XMLHttpRequest"
         }
-        async with httpx.AsyncClient() as client:
-            response = await client.post(self.URL, headers=headers, cookies=get_cookies(), data=data)
-            json_data = response.json()
-            #print(json_data)
-            if json_data.get("ok") and "transaction" in json_data:
-                transaction = json_data["transaction"]
-                return transaction["messages"][0]["address"], transaction["messages"][0]["amount"], transaction["messages"][0]["payload"]
+        client = get_client(self.URL)
+        response = await client.post(self.URL, headers=headers, cookies=get_cookies(), data=data)
+        json_data = response.json()
+        #print(json_data)
+        if json_data.get("ok") and "transaction" in json_data:
+            transaction = json_data["transaction"]
+            return transaction["messages"][0]["address"], transaction["messages"][0]["amount"], transaction["messages"][0]["payload"]
         return None, None, None
     
     async def fetch_price_per_month(self):
@@ -89,18 +88,18 @@ class StarsFragmentClient:
     async def fetch_recipient(self, query, quantity):
         data = {"query": query,  "quantity": quantity, "method": "searchStarsRecipient"}
         #print(data)
-        async with httpx.AsyncClient() as client:
-            response = await client.post(self.URL, cookies=get_cookies(), data=data)
-           # print(response.json())
-            return response.json().get("found", {}).get("recipient")
+        client = get_client(self.URL)
+        response = await client.post(self.URL, cookies=get_cookies(), data=data)
+        # print(response.json())
+        return response.json().get("found", {}).get("recipient")
 
     async def fetch_req_id(self, recipient, quantity):
         data = {"recipient": recipient, "quantity": quantity, "method": "initBuyStarsRequest"}
         # print(data)
-        async with httpx.AsyncClient() as client:
-            response = await client.post(self.URL, cookies=get_cookies(), data=data)
-            # print(response.json())
-            return response.json().get("req_id")
+        client = get_client(self.URL)
+        response = await client.post(self.URL, cookies=get_cookies(), data=data)
+        # print(response.json())
+        return response.json().get("req_id")
 
     async def fetch_buy_link(self, recipient, req_id, quantity):
         data = {
@@ -122,13 +121,13 @@ class StarsFragmentClient:
             "user-agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/141.0.0.0 Safari/537.36",
             "x-requested-with": "XMLHttpRequest"
         }
-        async with httpx.AsyncClient() as client:
-            response = await client.post(self.URL, headers=headers, cookies=get_cookies(), data=data)
-            json_data = response.json()
-            #print(json_data)
-            if json_data.get("ok") and "transaction" in json_data:
-                transaction = json_data["transaction"]
-                return transaction["messages"][0]["address"], transaction["messages"][0]["amount"], transaction["messages"][0]["payload"]
+        client = get_client(self.URL)
+        response = await client.post(self.URL, headers=headers, cookies=get_cookies(), data=data)
+        json_data = response.json()
+        #print(json_data)
+        if json_data.get("ok") and "transaction" in json_data:
+            transaction = json_data["transaction"]
+            return transaction["messages"][0]["address"], transaction["messages"][0]["amount"], transaction["messages"][0]["payload"]
         return None, None, None
     
     async def fetch_price_per_star(self):
@@ -143,18 +142,18 @@ class TonFragmentClient:
     async def fetch_recipient(self, query):
         data = {"query": query,  "method": "searchAdsTopupRecipient"}
         #print(data)
-        async with httpx.AsyncClient() as client:
-            response = await client.post(self.URL, cookies=get_cookies(), data=data)
-           # print(response.json())
-            return response.json().get("found", {}).get("recipient")
+        client = get_client(self.URL)
+        response = await client.post(self.URL, cookies=get_cookies(), data=data)
+        # print(response.json())
+        return response.json().get("found", {}).get("recipient")
 
     async def fetch_req_id(self, recipient, ton):
         data = {"recipient": recipient, "amount": ton, "method": "initAdsTopupRequest"}
         # print(data)
-        async with httpx.AsyncClient() as client:
-            response = await client.post(self.URL, cookies=get_cookies(), data=data)
-            # print(response.json())
-            return response.json().get("req_id")
+        client = get_client(self.URL)
+        response = await client.post(self.URL, cookies=get_cookies(), data=data)
+        # print(response.json())
+        return response.json().get("req_id")
 
     async def fetch_buy_link(self, recipient, req_id):
         data = {
@@ -176,13 +175,13 @@ class TonFragmentClient:
             "user-agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/141.0.0.0 Safari/537.36",
             "x-requested-with": "XMLHttpRequest"
         }
-        async with httpx.AsyncClient() as client:
-            response = await client.post(self.URL, headers=headers, cookies=get_cookies(), data=data)
-            json_data = response.json()
-            #print(json_data)
-            if json_data.get("ok") and "transaction" in json_data:
-                transaction = json_data["transaction"]
-                return transaction["messages"][0]["address"], transaction["messages"][0]["amount"], transaction["messages"][0]["payload"]
+        client = get_client(self.URL)
+        response = await client.post(self.URL, headers=headers, cookies=get_cookies(), data=data)
+        json_data = response.json()
+        #print(json_data)
+        if json_data.get("ok") and "transaction" in json_data:
+            transaction = json_data["transaction"]
+            return transaction["messages"][0]["address"], transaction["messages"][0]["amount"], transaction["messages"][0]["payload"]
         return None, None, None
 
     async def fetch_price_per_ton(self):
@@ -230,10 +229,6 @@ class TonTransaction:
     async def send_ton_transaction(self, recipient, amount_nano, la, stars=None):
         """Отправка TON с текстом подарка Telegram Premium. Возвращает (success, tx_hash)"""
         try:
-            client = TonapiClient(api_key=API_TON, is_testnet=False)
-            wallet, public_key, private_key, mnemonic = WalletV5R1.from_mnemonic(client, MNEMONIC)
-            logging.info("Кошелек успешно загружен.")
-
             if not recipient:
                 logging.error("Ошибка: не указан получатель.")
                 return False, None
@@ -241,24 +236,12 @@ class TonTransaction:
                 logging.error("Ошибка: некорректная сумма (должна быть больше 0).")
                 return False, None
 
-            # decoded_bytes = base64.b64decode(fix_base64_padding(la))
-            # decoded_text = ''.join(chr(b) if 32 <= b < 127 else ' ' for b in decoded_bytes)
-            # clean_text = re.sub(r'\s+', ' ', decoded_text).strip()
-
-            # match = re.search(r'(Telegram.*?Ref\s*#\S+)', clean_text)
-            # final_text = match.group(1).replace('Ref #', 'Ref#') if match else clean_text
-            # print(final_text)
             final_text = decode_la(la)
 
             logging.info(f"Формируем текст для транзакции: {final_text}")
 
-            tx_hash = await wallet.transfer(
-                destination=recipient,
-                amount=amount_nano,
-                body=final_text,
-            )
-            logging.info(f"✅ Транзакция отправлена: {tx_hash}")
-            return True, tx_hash
+            # кошелёк загружен один раз, платежи уходят пачками
+            return await wallet_sender.send(recipient, amount_nano, final_text)
         except Exception as e:
             logging.error(f"❌ Ошибка при отправке транзакции: {str(e)}")
             return False, None
@@ -286,47 +269,127 @@ class TonTransaction:
 
 ##################################
 
-async def buy_stars(query: str, quantity: int):
-    client = StarsFragmentClient()
-    ton_transaction = TonTransaction()
-
-    recipient = await client.fetch_recipient(query=query, quantity=quantity)
-    req_id = await client.fetch_req_id(recipient=recipient, quantity=quantity)
-    buy_link = await client.fetch_buy_link(recipient=recipient, req_id=req_id, quantity=quantity)
-    adress, amount_nano, la = buy_link
-    success, tx_hash = await ton_transaction.send_ton_transaction(
-            recipient=adress,
-            amount_nano=float(amount_nano) / 1e9,
-            la=la
-        )
-    return {"success": success, "tx_hash": tx_hash}
-
-async def buy_premium(query: str, months: int):
-    client = PremiumFragmentClient()
-    ton_transaction = TonTransaction()
-
-    recipient = await client.fetch_recipient(query=query, mountity=months)
-    req_id = await client.fetch_req_id(recipient=recipient, mountity=months)
-    buy_link = await client.fetch_buy_link(recipient=recipient, req_id=req_id, mountity=months)
-    adress, amount_nano, la = buy_link
-    success, tx_hash = await ton_transaction.send_ton_transaction(
-            recipient=adress,
-            amount_nano=float(amount_nano) / 1e9,
-            la=la
-        )
-    return {"success": success, "tx_hash": tx_hash}
-
-async def buy_ton(query: str, ton: int):
-    client = TonFragmentClient()
-    ton_transaction = TonTransaction()
-
-    recipient = await client.fetch_recipient(query=query)
-    req_id = await client.fetch_req_id(recipient=recipient, ton=ton)
-    buy_link = await client.fetch_buy_link(recipient=recipient, req_id=req_id)
-    adress, amount_nano, la = buy_link
-    success, tx_hash = await ton_transaction.send_ton_transaction(
-            recipient=adress,
-            amount_nano=float(amount_nano) / 1e9,
-            la=la
-        )
-    return {"success": success, "tx_hash": tx_hash}
\ No newline at end of file
+FRAGMENT_RECIPIENT_CACHE_SIZE = int(os.getenv("FRAGMENT_RECIPIENT_CACHE_SIZE", "10000"))
+FRAGMENT_RECIPIENT_TTL_SEC = int(os.getenv("FRAGMENT_RECIPIENT_TTL_SEC", "3600"))
+FRAGMENT_REQ_TTL_SEC = int(os.getenv("FRAGMENT_REQ_TTL_SEC", "300"))
+
+
+class _TTLCache:
+    """Небольшой LRU с ограничением по времени жизни записи."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[tuple, tuple[float, object]]" = OrderedDict()
+
+    def get(self, key):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        at, value = item
+        if time.time() - at > self.ttl:
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        self._data[key] = (time.time(), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+
+class FragmentSession:
+    """
+    Покупки в Fragment через общий HTTP-пул.
+    Получатель (username -> recipient id) кешируется, а пока заказ ждёт оплаты,
+    prepare() заранее резолвит получателя и req_id — после оплаты остаётся
+    только запрос ссылки на покупку.
+    """
+
+    def __init__(self):
+        self.clients = {
+            "stars": StarsFragmentClient(),
+            "premium": PremiumFragmentClient(),
+            "ton": TonFragmentClient(),
+        }
+        self._recipients = _TTLCache(FRAGMENT_RECIPIENT_CACHE_SIZE, FRAGMENT_RECIPIENT_TTL_SEC)
+
+    async def resolve_recipient(self, order_type: str, query: str, amount: int):
+        key = (order_type, query.lower())
+        recipient = self._recipients.get(key)
+        if recipient:
+            return recipient
+        client = self.clients[order_type]
+        if order_type == "stars":
+            recipient = await client.fetch_recipient(query=query, quantity=amount)
+        elif order_type == "premium":
+            recipient = await client.fetch_recipient(query=query, mountity=amount)
+        else:
+            recipient = await client.fetch_recipient(query=query)
+        if recipient:
+            self._recipients.set(key, recipient)
+        return recipient
+
+    async def _req_id(self, order_type: str, recipient, amount: int):
+        client = self.clients[order_type]
+        if order_type == "stars":
+            return await client.fetch_req_id(recipient=recipient, quantity=amount)
+        if order_type == "premium":
+            return await client.fetch_req_id(recipient=recipient, mountity=amount)
+        return await client.fetch_req_id(recipient=recipient, ton=amount)
+
+    async def _buy_link(self, order_type: str, recipient, req_id, amount: int):
+        client = self.clients[order_type]
+        if order_type == "stars":
+            return await client.fetch_buy_link(recipient=recipient, req_id=req_id, quantity=amount)
+        if order_type == "premium":
+            return await client.fetch_buy_link(recipient=recipient, req_id=req_id, mountity=amount)
+        return await client.fetch_buy_link(recipient=recipient, req_id=req_id)
+
+    async def prepare(self, order_type: str, query: str, amount: int) -> dict:
+        """
+        Резолвит получателя и req_id заранее. Результат кладётся в gateway_payload заказа,
+        т.к. фулфилмент выполняет воркер стрима — возможно, в другой реплике.
+        """
+        recipient = await self.resolve_recipient(order_type, query, amount)
+        req_id = await self._req_id(order_type, recipient, amount) if recipient else None
+        return {"query": query, "recipient": recipient, "req_id": req_id, "at": time.time()}
+
+    async def buy(self, order_type: str, query: str, amount: int, prepared: dict | None = None) -> dict:
+        recipient, req_id = None, None
+        if prepared and prepared.get("query") == query and prepared.get("recipient"):
+            recipient = prepared["recipient"]
+            if time.time() - float(prepared.get("at") or 0) < FRAGMENT_REQ_TTL_SEC:
+                req_id = prepared.get("req_id")
+        if not recipient:
+            recipient = await self.resolve_recipient(order_type, query, amount)
+
+        adress, amount_nano, la = (None, None, None)
+        if req_id:
+            adress, amount_nano, la = await self._buy_link(order_type, recipient, req_id, amount)
+        if not adress:
+            # заранее полученный req_id протух — берём новый
+            req_id = await self._req_id(order_type, recipient, amount)
+            adress, amount_nano, la = await self._buy_link(order_type, recipient, req_id, amount)
+
+        success, tx_hash = await TonTransaction().send_ton_transaction(
+                recipient=adress,
+                amount_nano=float(amount_nano) / 1e9,
+                la=la
+            )
+        return {"success": success, "tx_hash": tx_hash}
+
+
+fragment_session = FragmentSession()
+
+
+async def buy_stars(query: str, quantity: int, prepared: dict | None = None):
+    return await fragment_session.buy("stars", query, quantity, prepared)
+
+async def buy_premium(query: str, months: int, prepared: dict | None = None):
+    return await fragment_session.buy("premium", query, months, prepared)
+
+async def buy_ton(query: str, ton: int, prepared: dict | None = None):
+    return await fragment_session.buy("ton", query, ton, prepared)
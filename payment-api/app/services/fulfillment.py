@@ -3,17 +3,22 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import update, func, cast
 from sqlalchemy.dialects.postgresql import JSONB
 import asyncio
-from ..redis import get_queue
+import logging
 from ..db import SessionLocal
 
 from ..repositories.orders import OrdersRepo
+from ..repositories.order_events import OrderEventsRepo
 from ..models import Order
-from .fragment import buy_stars, buy_premium, buy_ton
-from rq import Retry
+from .fragment import buy_stars, buy_premium, buy_ton, fragment_session
 
-async def _save_result(session: AsyncSession, order_id: int, ok: bool, text: str, result_json: dict | None):
-    # message — для пользователя; gateway_payload.result — сырой ответ API
-    new_payload = cast({"fulfillment_result": result_json or {}}, JSONB)
+logger = logging.getLogger(__name__)
+
+async def _save_result(session: AsyncSession, order_id: int, ok: bool, text: str, result_json: dict | None,
+                       final: bool = True):
+    # message — для пользователя; gateway_payload.result — сырой ответ API;
+    # gateway_payload.fulfillment — состояние захвата (см. OrdersRepo.claim_fulfillment)
+    state = "done" if ok else ("failed" if final else "retry")
+    new_payload = cast({"fulfillment_result": result_json or {}, "fulfillment": state}, JSONB)
     merged = func.coalesce(Order.gateway_payload, cast({}, JSONB)).op("||")(new_payload)
 
     await session.execute(
@@ -24,16 +29,52 @@ async def _save_result(session: AsyncSession, order_id: int, ok: bool, text: str
             gateway_payload=merged,
         )
     )
+    if ok or final:
+        # промежуточные ошибки перед повтором в outbox не пишем — только итог
+        await OrderEventsRepo(session).add(order_id, "fulfilled" if ok else "fulfillment_failed", {"message": text})
     await session.commit()
 
-def task_wrapper(order_id):
-    asyncio.run(fulfill_order(order_id))
-    print(f"Done: {order_id}")
+def _recipient_query(order: Order) -> str:
+    # recipient хранится с '@' в начале
+    if order.recipient:
+        return order.recipient[1::].strip()
+    return (order.username or "").strip()
+
+async def prefetch_fragment(order_id: int):
+    """
+    Пока заказ ждёт оплаты, заранее резолвим получателя и req_id в Fragment,
+    чтобы после оплаты остался один запрос до транзакции.
+    """
+    async with SessionLocal() as session:
+        orders = OrdersRepo(session)
+        order = await orders.get_by_id(order_id)
+        if not order or order.status != "pending":
+            return
+        query = _recipient_query(order)
+        if not query or order.type not in ("stars", "premium", "ton"):
+            return
+        try:
+            prepared = await fragment_session.prepare(order.type, query, int(order.amount or 0))
+        except Exception as e:
+            logger.warning("Fragment prefetch для заказа %s не удался: %s", order_id, e)
+            return
+        await orders.update_gateway_payload(order.id, {"fragment": prepared})
+
+_prefetch_tasks: set = set()
+
+def schedule_prefetch(order_id: int):
+    # держим ссылку на задачу, иначе её может собрать GC
+    task = asyncio.create_task(prefetch_fragment(order_id))
+    _prefetch_tasks.add(task)
+    task.add_done_callback(_prefetch_tasks.discard)
 
-async def fulfill_order(order_id: int) -> Tuple[bool, str]:
+async def fulfill_order(order_id: int, final: bool = True) -> Tuple[bool, str]:
     """
     Выполнить заказ через Fragment API.
     Возвращает (ok, msg) — для показа пользователю.
+    Задача может прийти повторно (relay доставляет at-least-once), поэтому заказ
+    сначала захватывается; уже захваченный или выполненный пропускаем.
+    final — последняя попытка: ошибка пишется событием fulfillment_failed.
     """
     # Кого кредитуем:
     # 1) если recipient задан в заказе — отправляем туда,
@@ -42,11 +83,12 @@ async def fulfill_order(order_id: int) -> Tuple[bool, str]:
     # recipient = (order.recipient or order.username or "").strip()
     async with SessionLocal() as session:
         orders = OrdersRepo(session)
+        if not await orders.claim_fulfillment(order_id):
+            logger.warning("Заказ %s уже выполняется или выполнен — повторную задачу пропускаем", order_id)
+            return False, "already claimed"
         order = await orders.get_by_id(order_id)
-        if order.recipient:
-            recipient = order.recipient[1::].strip()
-        else:
-            recipient = order.username.strip()
+        recipient = _recipient_query(order)
+        prepared = (order.gateway_payload or {}).get("fragment")
         if not recipient:
             msg = "Не указан получатель (username). Обратитесь в поддержку."
             await _save_result(session, order.id, False, msg, {"error": "missing recipient"})
@@ -58,7 +100,7 @@ async def fulfill_order(order_id: int) -> Tuple[bool, str]:
                 qty = int(order.amount or 0)
                 if qty <= 0:
                     raise ValueError("empty stars qty")
-                data = await buy_stars(query=recipient, quantity=qty)
+                data = await buy_stars(query=recipient, quantity=qty, prepared=prepared)
                 msg = f"⭐ Успешно начислено: {qty} звёзд(ы) для {recipient}"
                 await _save_result(session, order.id, True, msg, data)
                 return True, msg
@@ -67,7 +109,7 @@ async def fulfill_order(order_id: int) -> Tuple[bool, str]:
                 months = int(order.amount or 0)
                 if months <= 0:
                     raise ValueError("empty months")
-                data = await buy_premium(query=recipient, months=months)
+                data = await buy_premium(query=recipient, months=months, prepared=prepared)
                 msg = f"👑 Premium активирован на {months} мес. для {recipient}"
                 await _save_result(session, order.id, True, msg, data)
                 return True, msg
@@ -75,7 +117,7 @@ async def fulfill_order(order_id: int) -> Tuple[bool, str]:
                 amount = int(order.amount or 0)
                 if amount <= 0:
                     raise ValueError("empty ton")
-                data = await buy_ton(query=recipient, ton=amount)
+                data = await buy_ton(query=recipient, ton=amount, prepared=prepared)
                 msg = f"Зачислено {amount} TON для {recipient}"
                 await _save_result(session, order.id, True, msg, data)
                 return True, msg
@@ -90,7 +132,7 @@ async def fulfill_order(order_id: int) -> Tuple[bool, str]:
             # сюда попадём, если Fragment API вернул 4xx/5xx или ошибка сети/валидации
             err = {"error": str(e)}
             msg = f"❌ Не удалось выполнить заказ через Fragment: {e}"
-            await _save_result(session, order.id, False, msg, err)
+            await _save_result(session, order.id, False, msg, err, final=final)
             raise e
             # q = await get_queue()
             # q.enqueue(task_wrapper, order_id, retry=Retry(max=5, interval=10))
@@ -0,0 +1,158 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+from typing import Optional
+
+from redis.exceptions import ResponseError
+
+from ..redis import get_redis, close_redis
+from ..http_client import close_clients
+from .fulfillment import fulfill_order
+
+logger = logging.getLogger(__name__)
+
+FULFILLMENT_STREAM = os.getenv("FULFILLMENT_STREAM", "fulfillment")
+FULFILLMENT_GROUP = os.getenv("FULFILLMENT_GROUP", "fulfillment-workers")
+FULFILLMENT_DELAYED = f"{FULFILLMENT_STREAM}:delayed"
+FULFILLMENT_DEAD = f"{FULFILLMENT_STREAM}:dead"
+
+FULFILLMENT_CONCURRENCY = int(os.getenv("FULFILLMENT_CONCURRENCY", "8"))
+# как было в RQ: Retry(max=5, interval=10), только интервал растёт 10, 20, 40, 80, 160 с
+FULFILLMENT_MAX_RETRIES = int(os.getenv("FULFILLMENT_MAX_RETRIES", "5"))
+FULFILLMENT_RETRY_BASE_SEC = int(os.getenv("FULFILLMENT_RETRY_BASE_SEC", "10"))
+# сообщения упавших воркеров забираем после такого простоя
+FULFILLMENT_CLAIM_IDLE_MS = int(os.getenv("FULFILLMENT_CLAIM_IDLE_MS", str(10 * 60 * 1000)))
+
+
+async def enqueue_fulfillment(order_id: int, attempt: int = 0):
+    r = get_redis()
+    await r.xadd(FULFILLMENT_STREAM, {"order_id": str(order_id), "attempt": str(attempt)})
+
+
+class FulfillmentWorker:
+    """
+    Пул асинхронных воркеров фулфилмента поверх Redis Stream с consumer group.
+    Один процесс держит N задач, общий пул БД и HTTP-клиенты живут всё время работы.
+    Повторы — через sorted set с временем запуска, который переносит созревшие задачи
+    обратно в стрим.
+    """
+
+    def __init__(self, concurrency: int = FULFILLMENT_CONCURRENCY):
+        self.concurrency = max(1, concurrency)
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}"
+        self._tasks = []
+
+    async def _ensure_group(self):
+        r = get_redis()
+        try:
+            await r.xgroup_create(FULFILLMENT_STREAM, FULFILLMENT_GROUP, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def _handle(self, msg_id, fields: dict):
+        r = get_redis()
+        order_id = int(fields.get(b"order_id") or fields.get("order_id"))
+        attempt = int(fields.get(b"attempt") or fields.get("attempt") or 0)
+        try:
+            await fulfill_order(order_id, final=attempt >= FULFILLMENT_MAX_RETRIES)
+            logger.info("Done: %s", order_id)
+        except Exception as e:
+            if attempt < FULFILLMENT_MAX_RETRIES:
+                delay = FULFILLMENT_RETRY_BASE_SEC * 2 ** attempt
+                logger.warning("Фулфилмент заказа %s упал (попытка %s), повтор через %s с: %s",
+                               order_id, attempt + 1, delay, e)
+                job = json.dumps({"order_id": order_id, "attempt": attempt + 1})
+                await r.zadd(FULFILLMENT_DELAYED, {job: time.time() + delay})
+            else:
+                logger.error("Фулфилмент заказа %s не удался после %s попыток: %s",
+                             order_id, attempt + 1, e)
+                await r.rpush(FULFILLMENT_DEAD, json.dumps({"order_id": order_id, "error": str(e)}))
+        # подтверждаем только когда повтор уже запланирован: иначе сообщение подберёт _reclaim
+        await r.xack(FULFILLMENT_STREAM, FULFILLMENT_GROUP, msg_id)
+
+    async def _consume(self, name: str):
+        r = get_redis()
+        while True:
+            try:
+                resp = await r.xreadgroup(FULFILLMENT_GROUP, name, {FULFILLMENT_STREAM: ">"}, count=1, block=5000)
+                for _, messages in resp or []:
+                    for msg_id, fields in messages:
+                        await self._handle(msg_id, fields)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("fulfillment worker %s: %s", name, e)
+                await asyncio.sleep(1)
+
+    async def _move_delayed(self):
+        r = get_redis()
+        while True:
+            try:
+                due = await r.zrangebyscore(FULFILLMENT_DELAYED, 0, time.time(), start=0, num=100)
+                for job in due:
+                    # ZREM вернёт 1 только одному процессу — задача не задвоится
+                    if await r.zrem(FULFILLMENT_DELAYED, job):
+                        data = json.loads(job)
+                        await enqueue_fulfillment(data["order_id"], data["attempt"])
+                if not due:
+                    await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("fulfillment delayed mover: %s", e)
+                await asyncio.sleep(5)
+
+    async def _reclaim(self):
+        # сообщения, которые взял и не подтвердил упавший воркер, отдаём себе
+        r = get_redis()
+        while True:
+            try:
+                start = "0-0"
+                while True:
+                    resp = await r.xautoclaim(FULFILLMENT_STREAM, FULFILLMENT_GROUP, self.consumer,
+                                              FULFILLMENT_CLAIM_IDLE_MS, start_id=start, count=50)
+                    start, messages = resp[0], resp[1]
+                    for msg_id, fields in messages:
+                        if fields:
+                            await self._handle(msg_id, fields)
+                    if start in (b"0-0", "0-0"):
+                        break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("fulfillment reclaim: %s", e)
+            await asyncio.sleep(FULFILLMENT_CLAIM_IDLE_MS / 1000)
+
+    async def start(self):
+        await self._ensure_group()
+        for i in range(self.concurrency):
+            # у каждой задачи своё имя consumer'а, чтобы pending-списки не смешивались
+            self._tasks.append(asyncio.create_task(self._consume(f"{self.consumer}-{i}")))
+        self._tasks.append(asyncio.create_task(self._move_delayed()))
+        self._tasks.append(asyncio.create_task(self._reclaim()))
+
+    async def stop(self):
+        for t in self._tasks:
+            t.cancel()
+        for t in self._tasks:
+            try:
+                await t
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+
+async def run_fulfillment_worker(concurrency: Optional[int] = None):
+    """Точка входа отдельного процесса воркера."""
+    worker = FulfillmentWorker(concurrency or FULFILLMENT_CONCURRENCY)
+    await worker.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await worker.stop()
+        await close_clients()
+        await close_redis()
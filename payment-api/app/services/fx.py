@@ -0,0 +1,111 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Optional
+
+from ..http_client import get_client
+from .. import metrics
+
+logger = logging.getLogger(__name__)
+
+COINGECKO_URL = os.getenv("COINGECKO_URL", "https://api.coingecko.com/api/v3/simple/price")
+FX_REFRESH_INTERVAL_SEC = int(os.getenv("FX_REFRESH_INTERVAL_SEC", "120"))
+FX_REFRESH_JITTER = float(os.getenv("FX_REFRESH_JITTER", "0.1"))
+FX_ECB_REFRESH_SEC = int(os.getenv("FX_ECB_REFRESH_SEC", str(24 * 3600)))
+
+
+class FxRates:
+    """
+    Курсы TON/USD и RUB/USD в памяти.
+    Обновляются фоновым циклом; конвертации идут без I/O по последнему известному курсу.
+    Источник: CoinGecko (TON в USD и RUB одним запросом, отсюда же кросс-курс RUB/USD),
+    запасной вариант для RUB — датасет ECB через CurrencyConverter, который грузим
+    один раз в отдельном потоке и переиспользуем.
+    """
+
+    def __init__(self):
+        self.ton_usd: Optional[float] = None
+        self.usd_per_rub: Optional[float] = None
+        self.updated_at: Optional[float] = None
+        self._ecb = None
+        self._ecb_loaded_at = 0.0
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    # ==== обновление ====
+
+    async def _fetch_coingecko(self):
+        url = COINGECKO_URL
+        r = await get_client(url).get(url, params={"ids": "the-open-network", "vs_currencies": "usd,rub"})
+        r.raise_for_status()
+        data = r.json().get("the-open-network") or {}
+        return data.get("usd"), data.get("rub")
+
+    def _load_ecb(self):
+        from currency_converter import CurrencyConverter
+        return CurrencyConverter()
+
+    async def _ecb_usd_per_rub(self) -> Optional[float]:
+        if self._ecb is None or time.time() - self._ecb_loaded_at > FX_ECB_REFRESH_SEC:
+            # разбор датасета ECB занимает сотни мс — не в event loop
+            self._ecb = await asyncio.to_thread(self._load_ecb)
+            self._ecb_loaded_at = time.time()
+        return float(self._ecb.convert(1, "RUB", "USD"))
+
+    async def refresh(self):
+        async with self._lock:
+            ton_usd, ton_rub = await self._fetch_coingecko()
+            if ton_usd:
+                self.ton_usd = float(ton_usd)
+            if ton_usd and ton_rub:
+                self.usd_per_rub = float(ton_usd) / float(ton_rub)
+            else:
+                try:
+                    self.usd_per_rub = await self._ecb_usd_per_rub()
+                except Exception as e:
+                    logger.warning("FX: нет курса RUB/USD ни в CoinGecko, ни в ECB: %s", e)
+            self.updated_at = time.time()
+            metrics.set_gauge("fx_last_refresh_timestamp", self.updated_at, "Unix-время последнего обновления курсов")
+
+    async def ensure(self):
+        """Если курсов ещё нет (старт процесса) — один раз загрузить синхронно для вызывающего."""
+        if self.ton_usd is None or self.usd_per_rub is None:
+            await self.refresh()
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+                delay = FX_REFRESH_INTERVAL_SEC
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # остаёмся на последнем известном курсе
+                logger.warning("FX: не удалось обновить курсы: %s", e)
+                metrics.inc_counter("fx_refresh_failures_total", help="Неудачные обновления курсов")
+                delay = min(FX_REFRESH_INTERVAL_SEC, 30)
+            await asyncio.sleep(delay * (1 + random.uniform(-FX_REFRESH_JITTER, FX_REFRESH_JITTER)))
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="fx-refresh")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+fx = FxRates()
+
+metrics.gauge_callback(
+    "fx_staleness_seconds",
+    lambda: time.time() - fx.updated_at if fx.updated_at else -1,
+    "Секунд с последнего обновления курсов (-1 — ещё не было)",
+)
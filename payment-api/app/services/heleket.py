@@ -1,8 +1,9 @@
 # app/services/heleket.py
-import os, json, base64, hashlib, aiohttp, asyncio
-from typing import Optional, Tuple
+import os, json, base64, hashlib, asyncio
+from typing import List, Optional, Tuple
 from decimal import Decimal
 from typing import Dict, Any
+from ..http_client import get_client
 
 HELEKET_BASE = os.getenv("HELEKET_BASE", "https://api.heleket.com")
 MERCHANT = os.getenv("HELEKET_MERCHANT_UUID", "")
@@ -27,11 +28,9 @@ async def _post_json(path: str, payload: dict, is_payout: bool = False) -> dict:
         "sign": _sign_payload(payload, is_payout),
         "Content-Type": "application/json",
     }
-    async with aiohttp.ClientSession() as http:
-        async with http.post(url, headers=headers, json=payload, timeout=30) as r:
-            text = await r.text()
-            r.raise_for_status()
-            return json.loads(text)
+    r = await get_client(url).post(url, headers=headers, json=payload)
+    r.raise_for_status()
+    return json.loads(r.text)
 
 async def create_invoice(
     amount: str,
@@ -89,6 +88,38 @@ def is_paid_status(status: str) -> bool:
     # Статусы по докам: paid, paid_over — считаем как успешную оплату
     return (status or "").lower() in {"paid", "paid_over"}
 
+def is_failed_status(status: str) -> bool:
+    return (status or "").lower() in {"cancel", "fail", "system_fail"}
+
+async def get_invoice_status(*, uuid: Optional[str] = None, order_id: Optional[str] = None, user_tg_id: Optional[str] = None) -> Tuple[str, dict]:
+    """
+    Один запрос статуса инвойса. Возвращает (status, result).
+    """
+    info = await get_payment_info(uuid=uuid, order_id=order_id, user_tg_id=user_tg_id)
+    if info.get("state") != 0:
+        return "", {}
+    res = info.get("result") or {}
+    return (res.get("status") or res.get("payment_status") or "").lower(), res
+
+async def list_payments(*, date_from: str, date_to: Optional[str] = None, cursor: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+    """
+    POST /v1/payment/list — история платежей мерчанта, страницами.
+    date_from/date_to в формате "YYYY-MM-DD HH:MM:SS". Возвращает (items, next_cursor).
+    Документация: https://doc.heleket.com/methods/payments/payment-history
+    """
+    payload = {"date_from": date_from}
+    if date_to: payload["date_to"] = date_to
+    path = "/v1/payment/list" + (f"?cursor={cursor}" if cursor else "")
+    info = await _post_json(path, payload)
+    if info.get("state") != 0:
+        return [], None
+    res = info.get("result") or {}
+    paginate = res.get("paginate") or {}
+    return list(res.get("items") or []), (paginate.get("nextCursor") if paginate.get("hasPages") else None)
+
+def item_status(item: dict) -> str:
+    return (item.get("status") or item.get("payment_status") or "").lower()
+
 async def wait_invoice_paid(order_id: str, user_tg_id, *, poll_interval: float = 10.0, timeout: float = 900.0) -> Optional[dict]:
     """
     Пуллинг статуса до paid/paid_over/исчерпания таймаута.
@@ -96,16 +127,13 @@ async def wait_invoice_paid(order_id: str, user_tg_id, *, poll_interval: float =
     """
     deadline = asyncio.get_event_loop().time() + timeout
     while asyncio.get_event_loop().time() < deadline:
-        info = await get_payment_info(order_id=order_id, user_tg_id=user_tg_id)
-        # success response: {"state":0, "result": {..., "status": "..."}}
-        if info.get("state") == 0:
-            res = info.get("result") or {}
-            st = (res.get("status") or res.get("payment_status") or "").lower()
-            if is_paid_status(st):
-                return res
-            # финальные неуспешные можно обрывать: cancel/fail/system_fail
-            if st in {"cancel", "fail", "system_fail"} or res.get("is_final") is True:
-                await asyncio.sleep(poll_interval)
+        st, res = await get_invoice_status(order_id=order_id, user_tg_id=user_tg_id)
+        if is_paid_status(st):
+            return res
+        # финальные неуспешные обрываем: cancel/fail/system_fail
+        if is_failed_status(st) or res.get("is_final") is True:
+            return None
+        await asyncio.sleep(poll_interval)
     return None
 
 
@@ -0,0 +1,147 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from ..db import SessionLocal
+from ..redis import get_redis
+from ..repositories.orders import OrdersRepo
+from .. import metrics
+from . import heleket as hk
+from .payment_watch import watch_scheduler, HELEKET_TIMEOUT_SEC
+from .poll_schedule import heleket_schedule
+from .settlement import on_order_paid
+
+logger = logging.getLogger(__name__)
+
+HELEKET_RECONCILE_INTERVAL_SEC = int(os.getenv("HELEKET_RECONCILE_INTERVAL_SEC", "30"))
+# запас к окну на расхождение часов с Heleket
+HELEKET_RECONCILE_OVERLAP_SEC = int(os.getenv("HELEKET_RECONCILE_OVERLAP_SEC", "120"))
+HELEKET_RECONCILE_MAX_PAGES = int(os.getenv("HELEKET_RECONCILE_MAX_PAGES", "50"))
+
+_LOCK_KEY = "heleket:reconcile:lock"
+_DATE_FMT = "%Y-%m-%d %H:%M:%S"
+
+
+class HeleketReconciler:
+    """
+    Сверка статусов инвойсов Heleket по истории платежей мерчанта.
+    Раз в HELEKET_RECONCILE_INTERVAL_SEC листаем /v1/payment/list с момента создания самого
+    старого pending-инвойса (но не глубже HELEKET_TIMEOUT_SEC) и применяем переходы
+    к pending-заказам пачкой. Окно привязано к созданию, а не к прошлому проходу:
+    список фильтруется по дате создания инвойса, а оплатить его могут и через 10 минут.
+    Число запросов зависит от числа изменившихся платежей, а не от числа открытых инвойсов.
+    При нескольких инстансах проход делает один — под коротким локом в Redis.
+    Пока пользователь только что нажал «Оплатить» (boost), проходы идут с частотой
+    быстрого окна общего графика опроса.
+    """
+
+    def __init__(self, interval: int = HELEKET_RECONCILE_INTERVAL_SEC):
+        self.interval = max(5, interval)
+        self._boosted_at = 0.0
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def boost(self):
+        self._boosted_at = time.time()
+        heleket_schedule.record_boost()
+        self._wakeup.set()
+
+    def _current_interval(self) -> float:
+        if time.time() - self._boosted_at <= heleket_schedule.fast_window:
+            return min(self.interval, heleket_schedule.fast)
+        return self.interval
+
+    async def reconcile_once(self) -> int:
+        """Один проход сверки. Возвращает число применённых переходов."""
+        r = get_redis()
+        if not await r.set(_LOCK_KEY, 1, nx=True, ex=max(1, int(self._current_interval()))):
+            return 0
+
+        async with SessionLocal() as session:
+            age = await OrdersRepo(session).oldest_pending_heleket_age()
+        if age is None:
+            return 0  # открытых инвойсов нет — и в API идти незачем
+        window = min(age, HELEKET_TIMEOUT_SEC) + HELEKET_RECONCILE_OVERLAP_SEC
+        since = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=window)
+
+        # последний статус по каждому uuid
+        statuses: Dict[str, tuple] = {}
+        cursor, pages = None, 0
+        while True:
+            items, cursor = await hk.list_payments(date_from=since.strftime(_DATE_FMT), cursor=cursor)
+            pages += 1
+            for item in items:
+                if item.get("uuid"):
+                    statuses[item["uuid"]] = (hk.item_status(item), item.get("txid"))
+            if not cursor:
+                break
+            if pages >= HELEKET_RECONCILE_MAX_PAGES:
+                logger.warning("Heleket reconcile: остановились на лимите в %s страниц", pages)
+                break
+        heleket_schedule.record_request(pages)
+
+        interesting = [u for u, (st, _) in statuses.items() if hk.is_paid_status(st) or hk.is_failed_status(st)]
+        async with SessionLocal() as session:
+            repo = OrdersRepo(session)
+            rows = await repo.list_pending_by_heleket_uuids(interesting)
+            failed_ids = [
+                order.id for order, _ in rows
+                if hk.is_failed_status(statuses[order.gateway_payload["heleket"]["uuid"]][0])
+            ]
+            failed = await repo.mark_failed_bulk(failed_ids)
+        for order_id in failed:
+            watch_scheduler.cancel(order_id)
+
+        paid = 0
+        for order, user_bot_id in rows:
+            status, txid = statuses[order.gateway_payload["heleket"]["uuid"]]
+            if not hk.is_paid_status(status):
+                continue
+            watch_scheduler.cancel(order.id)
+            try:
+                await on_order_paid(order.id, txid, order.gateway_payload.get("bot_id") or user_bot_id)
+                paid += 1
+            except Exception as e:
+                # заказ всё ещё pending и попадёт в следующий проход
+                logger.warning("Heleket reconcile: заказ %s: ошибка проводки: %s", order.id, e)
+
+        metrics.inc_counter("heleket_reconcile_transitions_total", paid + len(failed),
+                            help="Переходы статусов заказов по сверке Heleket")
+        return paid + len(failed)
+
+    async def _run(self):
+        while True:
+            t0 = time.monotonic()
+            try:
+                n = await self.reconcile_once()
+                if n:
+                    logger.info("Heleket reconcile: применено %s переходов", n)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Heleket reconcile: %s", e)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(),
+                                       timeout=max(0.0, self._current_interval() - (time.monotonic() - t0)))
+            except asyncio.TimeoutError:
+                pass
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="heleket-reconcile")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+heleket_reconciler = HeleketReconciler()
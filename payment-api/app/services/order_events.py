@@ -0,0 +1,28 @@
+import json
+import os
+
+from ..models import OrderEvent
+
+# все события outbox order_events уходят в этот стрим; потребители (фулфилмент,
+# уведомления в user-bot, аналитика) читают его каждый в своём темпе
+ORDER_EVENTS_STREAM = os.getenv("ORDER_EVENTS_STREAM", "order_events")
+ORDER_EVENTS_MAXLEN = int(os.getenv("ORDER_EVENTS_MAXLEN", "100000"))
+
+# каким статусом заказа заканчивается событие (для подписчиков, которым нужен только статус)
+_STATUS_BY_KIND = {"created": "pending", "paid": "paid", "failed": "failed"}
+
+
+def stream_fields(event: OrderEvent) -> dict:
+    payload = event.payload or {}
+    fields = {
+        "event_id": str(event.id),
+        "order_id": str(event.order_id),
+        "kind": event.kind,
+        "payload": json.dumps(payload, ensure_ascii=False, default=str),
+    }
+    status = _STATUS_BY_KIND.get(event.kind)
+    if status:
+        fields["status"] = status
+    if payload.get("message"):
+        fields["message"] = payload["message"]
+    return fields
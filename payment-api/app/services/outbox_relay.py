@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import os
+from typing import List
+
+import asyncpg
+
+from ..db import SessionLocal, DATABASE_URL
+from ..redis import get_redis, close_redis
+from ..repositories.order_events import OrderEventsRepo
+from .. import metrics
+from .fulfillment_worker import FULFILLMENT_STREAM
+from .order_events import ORDER_EVENTS_STREAM, ORDER_EVENTS_MAXLEN, stream_fields
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_BATCH = int(os.getenv("OUTBOX_BATCH", "100"))
+# страховочный интервал; обычно relay будит NOTIFY order_events после коммита
+OUTBOX_POLL_SEC = float(os.getenv("OUTBOX_POLL_SEC", "5"))
+OUTBOX_LISTEN_RECONNECT_SEC = int(os.getenv("OUTBOX_LISTEN_RECONNECT_SEC", "5"))
+OUTBOX_NOTIFY_CHANNEL = "order_events"
+
+
+class OutboxRelay:
+    """
+    Переносит outbox order_events в Redis Streams.
+    Строки берутся пачкой под FOR UPDATE SKIP LOCKED, публикуются одним pipeline
+    (каждое событие — в ORDER_EVENTS_STREAM, paid — ещё и в очередь фулфилмента)
+    и помечаются published_at в той же транзакции, поэтому несколько relay'ев
+    не мешают друг другу. Доставка at-least-once: если процесс упадёт между
+    публикацией и коммитом, пачка уйдёт повторно (event_id в полях — для дедупликации;
+    повторную задачу фулфилмента отсекает OrdersRepo.claim_fulfillment).
+    Будится по LISTEN order_events (триггер в db/init/07_order_events_notify.sql).
+    """
+
+    def __init__(self):
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+    def wake(self):
+        self._wakeup.set()
+
+    async def relay_once(self) -> int:
+        async with SessionLocal() as session:
+            repo = OrderEventsRepo(session)
+            events = await repo.claim_unpublished(OUTBOX_BATCH)
+            if not events:
+                return 0
+            pipe = get_redis().pipeline(transaction=False)
+            for event in events:
+                pipe.xadd(ORDER_EVENTS_STREAM, stream_fields(event), maxlen=ORDER_EVENTS_MAXLEN, approximate=True)
+                if event.kind == "paid":
+                    pipe.xadd(FULFILLMENT_STREAM, {"order_id": str(event.order_id), "attempt": "0"})
+            await pipe.execute()
+            await repo.mark_published([e.id for e in events])
+            await session.commit()
+        metrics.inc_counter("outbox_relayed_total", len(events), help="События outbox, переданные в Redis Streams")
+        return len(events)
+
+    async def _run(self):
+        while True:
+            try:
+                if await self.relay_once() >= OUTBOX_BATCH:
+                    continue  # хвост ещё есть — разбираем без паузы
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("outbox relay: %s", e)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=OUTBOX_POLL_SEC)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _listen(self, dsn: str):
+        while True:
+            conn = None
+            try:
+                conn = await asyncpg.connect(dsn)
+                await conn.add_listener(OUTBOX_NOTIFY_CHANNEL, lambda *_: self.wake())
+                # пока слушателя не было, события могли накопиться
+                self.wake()
+                while not conn.is_closed():
+                    await asyncio.sleep(OUTBOX_LISTEN_RECONNECT_SEC)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("outbox relay: LISTEN %s: %s", OUTBOX_NOTIFY_CHANNEL, e)
+            finally:
+                if conn is not None and not conn.is_closed():
+                    await conn.close()
+            await asyncio.sleep(OUTBOX_LISTEN_RECONNECT_SEC)
+
+    async def start(self, database_url: str = DATABASE_URL):
+        if self._tasks:
+            return
+        dsn = database_url.replace("postgresql+asyncpg://", "postgresql://", 1)
+        self._tasks.append(asyncio.create_task(self._listen(dsn), name="outbox-relay-listen"))
+        self._tasks.append(asyncio.create_task(self._run(), name="outbox-relay"))
+
+    async def stop(self):
+        for t in self._tasks:
+            t.cancel()
+        for t in self._tasks:
+            try:
+                await t
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+
+outbox_relay = OutboxRelay()
+
+
+async def run_outbox_relay():
+    """Точка входа отдельного процесса relay."""
+    await outbox_relay.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await outbox_relay.stop()
+        await close_redis()
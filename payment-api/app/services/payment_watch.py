@@ -0,0 +1,326 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import random
+import time
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+from ..db import SessionLocal
+from ..repositories.orders import OrdersRepo
+from . import heleket as hk
+from . import platega
+from .poll_schedule import PollSchedule, platega_schedule, heleket_schedule
+from .settlement import on_order_paid
+from .ton_watcher import get_ton_watcher
+
+logger = logging.getLogger(__name__)
+
+CONCURRENCY = int(os.getenv("PAYMENT_WATCH_CONCURRENCY", "20"))
+REHYDRATE_SPREAD_SEC = int(os.getenv("PAYMENT_WATCH_REHYDRATE_SPREAD_SEC", "60"))
+SETTLE_RETRY_SEC = int(os.getenv("PAYMENT_WATCH_SETTLE_RETRY_SEC", "10"))
+
+TON_TIMEOUT_SEC = int(os.getenv("TON_CONFIRM_TIMEOUT_SEC", "900"))
+HELEKET_TIMEOUT_SEC = int(os.getenv("HELEKET_TIMEOUT_SEC", "900"))
+# при включённых вебхуках Platega/Heleket опрос — только страховка:
+# первый запрос статуса, если колбэк так и не пришёл за это время
+PAYMENT_WEBHOOKS_ENABLED = os.getenv("PAYMENT_WEBHOOKS_ENABLED", "1") == "1"
+WEBHOOK_FALLBACK_AFTER_SEC = int(os.getenv("WEBHOOK_FALLBACK_AFTER_SEC", "300"))
+# статусы Heleket сверяет heleket_reconciler по истории платежей — поштучный опрос не нужен
+HELEKET_RECONCILE_ENABLED = os.getenv("HELEKET_RECONCILE_ENABLED", "1") == "1"
+
+
+def ton_amount_of(order) -> Decimal:
+    """
+    Сумма TON, которую просили оплатить. Точное значение лежит в gateway_payload.amount_ton;
+    orders.price — DECIMAL(18,2), и округление вверх сорвало бы сравнение amount >= total.
+    Для заказов, созданных до появления amount_ton, остаётся price.
+    """
+    exact = (order.gateway_payload or {}).get("amount_ton")
+    return Decimal(str(exact if exact else order.price))
+
+
+@dataclass
+class _Watch:
+    order_id: int
+    kind: str                      # ton / platega / heleket
+    bot_id: Optional[int]
+    created_at: float
+    deadline: float                # unix-время, после которого наблюдение снимаем
+    interval: float                # шаг повтора проводки / после ошибки
+    ref: dict = field(default_factory=dict)
+    paid: bool = False
+    tx_hash: Optional[str] = None
+    boosted_at: Optional[float] = None
+    version: int = 0               # записи в куче со старой версией игнорируются
+
+
+class PaymentWatchScheduler:
+    """
+    Планировщик проверок оплаты.
+    Наблюдения живут в куче по времени следующей проверки; диспетчер отдаёт созревшие
+    в ограниченную очередь, которую разбирает фиксированный пул воркеров.
+    Каждый воркер делает ровно один шаг проверки и перепланирует наблюдение,
+    так что число одновременных запросов к шлюзам не превышает CONCURRENCY
+    при любом количестве открытых заказов.
+    Источник истины — сами заказы в статусе pending: после рестарта наблюдения
+    восстанавливаются из таблицы orders.
+    Интервалы опроса Platega/Heleket берутся из общего адаптивного графика (poll_schedule).
+    """
+
+    def __init__(self, concurrency: int = CONCURRENCY):
+        self.concurrency = max(1, concurrency)
+        self._heap: List[tuple] = []
+        self._seq = itertools.count()
+        self._watches: Dict[int, _Watch] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+
+    # ==== жизненный цикл ====
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        self._wakeup = asyncio.Event()
+        try:
+            await self.rehydrate()
+        except Exception as e:
+            logger.warning("payment watch: не удалось восстановить наблюдения: %s", e)
+        self._tasks.append(asyncio.create_task(self._dispatch(), name="payment-watch-dispatch"))
+        for i in range(self.concurrency):
+            self._tasks.append(asyncio.create_task(self._worker(), name=f"payment-watch-{i}"))
+
+    async def stop(self):
+        for t in self._tasks:
+            t.cancel()
+        for t in self._tasks:
+            try:
+                await t
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+    async def rehydrate(self):
+        """
+        Поднимает наблюдения по всем pending-заказам, которые ещё не вышли за таймаут.
+        Первые проверки размазываем по REHYDRATE_SPREAD_SEC, чтобы после деплоя
+        не ударить по шлюзам всей пачкой разом.
+        """
+        max_age = max(TON_TIMEOUT_SEC, platega.TIMEOUT_SEC, HELEKET_TIMEOUT_SEC)
+        async with SessionLocal() as session:
+            rows = await OrdersRepo(session).list_pending_for_watch(max_age)
+
+        now = time.time()
+        restored = 0
+        for order, user_tg_id, user_bot_id, age_sec in rows:
+            gp = order.gateway_payload or {}
+            bot_id = gp.get("bot_id") or user_bot_id
+            created_at = now - float(age_sec or 0)
+            first_check = now + random.uniform(0, REHYDRATE_SPREAD_SEC)
+
+            if gp.get("network") == "TON" and gp.get("memo") and gp.get("wallet"):
+                self.watch_ton(order.id, gp["wallet"], gp["memo"], ton_amount_of(order), bot_id,
+                               created_at=created_at)
+            elif gp.get("provider") == "platega" and gp.get("transactionId"):
+                self.watch_platega(order.id, gp["transactionId"], bot_id,
+                                   created_at=created_at, first_check=first_check)
+            elif gp.get("provider") == "heleket":
+                uuid = (gp.get("heleket") or {}).get("uuid")
+                self.watch_heleket(order.id, user_tg_id, bot_id, uuid=uuid,
+                                   created_at=created_at, first_check=first_check)
+            else:
+                continue
+            restored += 1
+        logger.info("payment watch: восстановлено %s наблюдений", restored)
+
+    # ==== регистрация ====
+
+    def watch_ton(self, order_id: int, wallet: str, memo: str, total_ton: Decimal, bot_id: Optional[int], *,
+                  created_at: Optional[float] = None):
+        created_at = created_at or time.time()
+        w = _Watch(order_id=order_id, kind="ton", bot_id=bot_id, created_at=created_at,
+                   deadline=created_at + TON_TIMEOUT_SEC, interval=SETTLE_RETRY_SEC,
+                   ref={"wallet": wallet, "memo": memo})
+        self._register(w)
+
+        async def _on_match(tx_hash: Optional[str]):
+            w.paid, w.tx_hash = True, tx_hash
+            self._schedule(w, time.time())
+
+        # сам поллинг блокчейна делает общий вотчер кошелька, в куче держим только дедлайн
+        get_ton_watcher(wallet).add(memo, total_ton, created_at, _on_match)
+        self._schedule(w, w.deadline)
+
+    def watch_platega(self, order_id: int, transaction_id: str, bot_id: Optional[int], *,
+                      created_at: Optional[float] = None, first_check: Optional[float] = None):
+        now = time.time()
+        created_at = created_at or now
+        w = _Watch(order_id=order_id, kind="platega", bot_id=bot_id, created_at=created_at,
+                   deadline=created_at + platega.TIMEOUT_SEC, interval=SETTLE_RETRY_SEC,
+                   ref={"transaction_id": transaction_id})
+        self._register(w)
+        self._schedule(w, first_check or now + self._first_delay(w))
+
+    def watch_heleket(self, order_id: int, user_tg_id: Optional[int], bot_id: Optional[int], *,
+                      uuid: Optional[str] = None, created_at: Optional[float] = None,
+                      first_check: Optional[float] = None):
+        now = time.time()
+        created_at = created_at or now
+        w = _Watch(order_id=order_id, kind="heleket", bot_id=bot_id, created_at=created_at,
+                   deadline=created_at + HELEKET_TIMEOUT_SEC, interval=SETTLE_RETRY_SEC,
+                   ref={"uuid": uuid, "user_tg_id": user_tg_id})
+        self._register(w)
+        if not self._polled(w):
+            # статус сверяет heleket_reconciler, в куче держим только дедлайн, как у TON
+            self._schedule(w, w.deadline)
+            return
+        self._schedule(w, first_check or now + self._first_delay(w))
+
+    def cancel(self, order_id: int):
+        w = self._watches.pop(order_id, None)
+        if w is None:
+            return
+        w.version += 1
+        self._forget(w)
+        if w.kind == "ton":
+            get_ton_watcher(w.ref["wallet"]).remove(w.ref["memo"])
+
+    def boost(self, order_id: int) -> Optional[str]:
+        """
+        Пользователь нажал «Оплатить»: возвращаем наблюдение в частый режим графика.
+        Возвращает тип наблюдения (ton/platega/heleket) или None, если заказ не наблюдается.
+        """
+        w = self._watches.get(order_id)
+        if w is None or w.paid:
+            return None
+        w.boosted_at = time.time()
+        if w.kind == "ton":
+            get_ton_watcher(w.ref["wallet"]).boost(w.ref["memo"])
+        elif self._polled(w):
+            sched = self._schedule_for(w)
+            sched.record_boost()
+            self._schedule(w, min(w.boosted_at + sched.fast, w.deadline))
+        return w.kind
+
+    def pending_count(self) -> int:
+        return len(self._watches)
+
+    # ==== внутреннее ====
+
+    def _first_delay(self, w: _Watch) -> float:
+        if PAYMENT_WEBHOOKS_ENABLED:
+            return min(WEBHOOK_FALLBACK_AFTER_SEC, max(0.0, w.deadline - time.time()))
+        return self._schedule_for(w).fast
+
+    @staticmethod
+    def _schedule_for(w: _Watch) -> PollSchedule:
+        return platega_schedule if w.kind == "platega" else heleket_schedule
+
+    def _polled(self, w: _Watch) -> bool:
+        # наблюдения, у которых в куче только дедлайн, не опрашиваем
+        return w.kind == "platega" or (w.kind == "heleket" and not (HELEKET_RECONCILE_ENABLED and w.ref.get("uuid")))
+
+    def _forget(self, w: _Watch):
+        if w.kind != "ton":
+            self._schedule_for(w).forget(w.order_id)
+
+    def _register(self, w: _Watch):
+        self.cancel(w.order_id)
+        self._watches[w.order_id] = w
+
+    def _schedule(self, w: _Watch, at: float):
+        w.version += 1
+        heapq.heappush(self._heap, (at, next(self._seq), w.version, w))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _dispatch(self):
+        while True:
+            if not self._heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            at, _, version, w = self._heap[0]
+            delay = at - time.time()
+            if delay > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            heapq.heappop(self._heap)
+            if self._watches.get(w.order_id) is not w or w.version != version:
+                continue
+            # очередь ограничена: если воркеры заняты, диспетчер ждёт, а не плодит задачи
+            await self._queue.put(w)
+
+    async def _worker(self):
+        while True:
+            w = await self._queue.get()
+            try:
+                await self._step(w)
+            except Exception as e:
+                logger.warning("payment watch: заказ %s: %s", w.order_id, e)
+                if self._watches.get(w.order_id) is w:
+                    self._schedule(w, time.time() + w.interval)
+            finally:
+                self._queue.task_done()
+
+    async def _step(self, w: _Watch):
+        if w.paid:
+            await self._settle(w, w.tx_hash)
+            return
+        if time.time() >= w.deadline:
+            self.cancel(w.order_id)
+            return
+
+        if not self._polled(w):
+            self._schedule(w, w.deadline)
+            return
+
+        sched = self._schedule_for(w)
+        sched.record_request()
+        if w.kind == "platega":
+            status = await platega.get_transaction_status(w.ref["transaction_id"])
+            if status == "CONFIRMED":
+                await self._settle(w, w.ref["transaction_id"])
+                return
+            if platega.is_final_failure(status):
+                self.cancel(w.order_id)
+                return
+        elif w.kind == "heleket":
+            status, res = await hk.get_invoice_status(
+                uuid=w.ref.get("uuid"),
+                order_id=None if w.ref.get("uuid") else str(w.order_id),
+                user_tg_id=str(w.ref.get("user_tg_id")),
+            )
+            if hk.is_paid_status(status):
+                await self._settle(w, res.get("txid"))
+                return
+            if hk.is_failed_status(status):
+                self.cancel(w.order_id)
+                return
+
+        self._schedule(w, sched.next_check(w.order_id, w.created_at, w.deadline, w.boosted_at))
+
+    async def _settle(self, w: _Watch, tx_hash: Optional[str]):
+        w.paid, w.tx_hash = True, tx_hash
+        try:
+            await on_order_paid(w.order_id, tx_hash, w.bot_id)
+        except Exception as e:
+            # оплата уже подтверждена шлюзом — повторяем проводку, пока не пройдёт
+            logger.warning("payment watch: заказ %s: ошибка проводки: %s", w.order_id, e)
+            self._schedule(w, time.time() + SETTLE_RETRY_SEC)
+            return
+        self._watches.pop(w.order_id, None)
+        w.version += 1
+        self._forget(w)
+
+
+watch_scheduler = PaymentWatchScheduler()
@@ -1,5 +1,6 @@
-import os, aiohttp, uuid, asyncio
+import os, uuid, asyncio
 from typing import Optional
+from ..http_client import get_client
 
 BASE = os.getenv("PLATEGA_BASE", "https://app.platega.io").rstrip("/")
 MID  = os.getenv("PLATEGA_MERCHANT_ID", "")
@@ -33,30 +34,37 @@ async def create_sbp_invoice(amount_rub: int, description: str, payload: str) ->
         "payload": payload,
     }
     url = f"{BASE}/transaction/process"
-    async with aiohttp.ClientSession() as http:
-        async with http.post(url, json=body, headers=_hdrs()) as r:
-            r.raise_for_status()
-            data = await r.json()
-            # ожидаем в ответе redirect + статус PENDING
-            return tx_id, data.get("redirect") or ""
+    r = await get_client(url).post(url, json=body, headers=_hdrs())
+    r.raise_for_status()
+    data = r.json()
+    # ожидаем в ответе redirect + статус PENDING
+    return tx_id, data.get("redirect") or ""
+
+async def get_transaction_status(transaction_id: str) -> str:
+    """
+    Один запрос статуса транзакции (PENDING / CONFIRMED / CANCELED / ...).
+    """
+    url = f"{BASE}/transaction/{transaction_id}"
+    r = await get_client(url).get(url, headers=_hdrs())
+    r.raise_for_status()
+    data = r.json()
+    return (data.get("status") or "").upper()
+
+def is_final_failure(status: str) -> bool:
+    return status in ("CANCELED", "FAILED", "EXPIRED")
 
 async def wait_payment_confirmed(transaction_id: str) -> Optional[str]:
     """
     Пуллим статус до CONFIRMED. Возвращает псевдо tx_hash (transaction_id),
     чтобы положить его в gateway_payload.tx_hash.
     """
-    url = f"{BASE}/transaction/{transaction_id}"
     elapsed = 0
-    async with aiohttp.ClientSession() as http:
-        while elapsed <= TIMEOUT_SEC:
-            async with http.get(url, headers=_hdrs()) as r:
-                r.raise_for_status()
-                data = await r.json()
-            status = (data.get("status") or "").upper()
-            if status == "CONFIRMED":
-                return transaction_id
-            if status in ("CANCELED", "FAILED", "EXPIRED"):
-                return None
-            await asyncio.sleep(POLL_INTERVAL)
-            elapsed += POLL_INTERVAL
+    while elapsed <= TIMEOUT_SEC:
+        status = await get_transaction_status(transaction_id)
+        if status == "CONFIRMED":
+            return transaction_id
+        if is_final_failure(status):
+            return None
+        await asyncio.sleep(POLL_INTERVAL)
+        elapsed += POLL_INTERVAL
     return None
@@ -0,0 +1,104 @@
+import os
+import time
+from typing import Dict, Hashable, Optional
+
+from .. import metrics
+
+POLL_FAST_SEC = float(os.getenv("POLL_FAST_SEC", "5"))
+POLL_SLOW_SEC = float(os.getenv("POLL_SLOW_SEC", "60"))
+# столько секунд после создания счёта / нажатия «Оплатить» опрашиваем с POLL_FAST_SEC
+POLL_FAST_WINDOW_SEC = float(os.getenv("POLL_FAST_WINDOW_SEC", "90"))
+# дальше интервал удваивается каждые POLL_DOUBLING_SEC, пока не упрётся в POLL_SLOW_SEC
+POLL_DOUBLING_SEC = float(os.getenv("POLL_DOUBLING_SEC", "120"))
+
+
+class PollSchedule:
+    """
+    Адаптивный график опроса одного шлюза (общий для TON, Platega и Heleket).
+    Частый опрос сразу после создания счёта и после boost (пользователь нажал «Оплатить»),
+    затем интервал экспоненциально растёт до slow; следующая проверка не позже дедлайна.
+
+    Заодно ведёт учёт бюджета запросов: у каждого ключа (заказ или кошелёк) есть текущий
+    интервал, их сумма 1/interval — плановая нагрузка на шлюз в запросах в секунду.
+    Если она выше budget_rps, интервалы растягиваются пропорционально (но не короче fast).
+    """
+
+    def __init__(self, gateway: str, *, fast: float = POLL_FAST_SEC, slow: float = POLL_SLOW_SEC,
+                 fast_window: float = POLL_FAST_WINDOW_SEC, doubling: float = POLL_DOUBLING_SEC,
+                 budget_rps: Optional[float] = None):
+        self.gateway = gateway
+        self.fast = fast
+        self.slow = max(slow, fast)
+        self.fast_window = fast_window
+        self.doubling = max(1.0, doubling)
+        self.budget_rps = budget_rps
+        self._planned: Dict[Hashable, float] = {}
+        self._planned_rps = 0.0
+
+    def interval(self, created_at: float, boosted_at: Optional[float] = None, now: Optional[float] = None) -> float:
+        now = now or time.time()
+        age = max(0.0, now - max(created_at, boosted_at or 0.0))
+        if age <= self.fast_window:
+            base = self.fast
+        else:
+            base = min(self.slow, self.fast * 2 ** ((age - self.fast_window) / self.doubling))
+        if self.budget_rps and self._planned_rps > self.budget_rps:
+            base = min(self.slow, base * self._planned_rps / self.budget_rps)
+        return base
+
+    def next_check(self, key: Hashable, created_at: float, deadline: float,
+                   boosted_at: Optional[float] = None, now: Optional[float] = None) -> float:
+        """Время следующей проверки ключа; попутно обновляет плановую нагрузку."""
+        now = now or time.time()
+        iv = self.interval(created_at, boosted_at, now)
+        self._plan(key, iv)
+        return min(now + iv, deadline)
+
+    def forget(self, key: Hashable):
+        iv = self._planned.pop(key, None)
+        if iv:
+            self._planned_rps = max(0.0, self._planned_rps - 1.0 / iv)
+            self._publish()
+
+    def record_request(self, n: int = 1):
+        metrics.inc_counter("payment_poll_requests_total", n, "Запросы статуса к платёжным шлюзам",
+                            labels={"gateway": self.gateway})
+
+    def record_boost(self):
+        metrics.inc_counter("payment_poll_boosts_total", 1, "Ускорения опроса по нажатию «Оплатить»",
+                            labels={"gateway": self.gateway})
+
+    def planned_rps(self) -> float:
+        return self._planned_rps
+
+    def _plan(self, key: Hashable, iv: float):
+        old = self._planned.get(key)
+        if old:
+            self._planned_rps -= 1.0 / old
+        self._planned[key] = iv
+        self._planned_rps = max(0.0, self._planned_rps + 1.0 / iv)
+        self._publish()
+
+    def _publish(self):
+        labels = {"gateway": self.gateway}
+        metrics.set_gauge("payment_poll_planned_rps", self._planned_rps,
+                          "Плановая нагрузка опроса на шлюз, запросов в секунду", labels=labels)
+        metrics.set_gauge("payment_poll_watched", len(self._planned),
+                          "Ключей (заказов/кошельков) в графике опроса", labels=labels)
+        if self.budget_rps:
+            metrics.set_gauge("payment_poll_budget_rps", self.budget_rps,
+                              "Бюджет запросов опроса на шлюз, в секунду", labels=labels)
+
+
+def _budget(name: str) -> Optional[float]:
+    raw = os.getenv(name)
+    return float(raw) if raw else None
+
+
+# прежние фиксированные интервалы шлюзов теперь задают потолок (slow) графика
+ton_schedule = PollSchedule("ton", slow=float(os.getenv("TON_POLL_INTERVAL_SEC", POLL_SLOW_SEC)),
+                            budget_rps=_budget("TON_POLL_BUDGET_RPS"))
+platega_schedule = PollSchedule("platega", slow=float(os.getenv("PLATEGA_POLL_INTERVAL_SEC", POLL_SLOW_SEC)),
+                                budget_rps=_budget("PLATEGA_POLL_BUDGET_RPS"))
+heleket_schedule = PollSchedule("heleket", slow=float(os.getenv("HELEKET_POLL_INTERVAL_SEC", POLL_SLOW_SEC)),
+                                budget_rps=_budget("HELEKET_POLL_BUDGET_RPS"))
@@ -1,16 +1,18 @@
 from decimal import Decimal, ROUND_UP, ROUND_HALF_UP
 from sqlalchemy.ext.asyncio import AsyncSession
 from ..repositories.pricing import PricingRepo
-from ..repositories.user_bots import UserBotsRepo
 from .fragment import PremiumFragmentClient, StarsFragmentClient
+from .pricing_cache import pricing_cache
 from ..db import SessionLocal
-import asyncio
+from .. import metrics
+import asyncio, logging, os, random, time
+
+logger = logging.getLogger(__name__)
 
 async def get_star_price_in_ton(session: AsyncSession, bot_id: int) -> Decimal:
-    repo = PricingRepo(session)
     # rule = await repo.get_active_manual(item_type="stars", currency="TON", bot_id=bot_id)
     # await update_ton_price(repo=repo, bot_id=bot_id)
-    rule = await repo.get_active_dynamic(item_type="stars", currency="TON", bot_id=bot_id)
+    rule = await pricing_cache.get_rule(session, bot_id, "stars", "dynamic", "TON")
     if not rule or rule.manual_price is None:
         raise RuntimeError("Не задана цена 'stars' в TON (pricing_rules)")
     price = rule.manual_price + (rule.manual_price / 100 * rule.markup_percent)
@@ -23,8 +25,7 @@ def calc_ton_for_stars(qty: int, price_per_star_ton: Decimal) -> Decimal:
 
 
 async def get_star_price_in_rub(session: AsyncSession, bot_id: int) -> Decimal:
-    repo = PricingRepo(session)
-    rule = await repo.get_active_manual(item_type="stars", currency="RUB", bot_id=bot_id)
+    rule = await pricing_cache.get_rule(session, bot_id, "stars", "manual", "RUB")
     if not rule or rule.manual_price is None:
         raise RuntimeError("Не задана цена 'stars' в RUB (pricing_rules)")
     return Decimal(str(rule.manual_price))
@@ -34,16 +35,14 @@ def calc_rub_for_stars(qty: int, price_per_star_rub: Decimal) -> int:
     return int(total)  # Platega ждёт целую сумму в рублях
 
 async def get_premium_price_in_rub(session: AsyncSession, bot_id: int) -> Decimal:
-    repo = PricingRepo(session)
-    rule = await repo.get_active_manual(item_type="premium", currency="RUB", bot_id=bot_id)
+    rule = await pricing_cache.get_rule(session, bot_id, "premium", "manual", "RUB")
     if not rule or rule.manual_price is None:
         raise RuntimeError("Не задана цена 'premium' в RUB (pricing_rules)")
     return Decimal(str(rule.manual_price))
 
 async def get_premium_price_in_ton(session: AsyncSession, bot_id: int) -> Decimal:
-    repo = PricingRepo(session)
     # await update_ton_price(repo=repo, bot_id=bot_id)
-    rule = await repo.get_active_dynamic(item_type="premium", currency="TON", bot_id=bot_id)
+    rule = await pricing_cache.get_rule(session, bot_id, "premium", "dynamic", "TON")
     if not rule or rule.manual_price is None:
         raise RuntimeError("Не задана цена 'premium' в TON (pricing_rules)")
     price = rule.manual_price + (rule.manual_price / 100 * rule.markup_percent)
@@ -58,8 +57,7 @@ def calc_ton_for_premium(months: int, price_per_month_ton: Decimal) -> Decimal:
     return total.quantize(Decimal("0.000000001"), rounding=ROUND_UP)
 
 async def get_ton_price_in_ton(session: AsyncSession, bot_id: int) -> Decimal:
-    repo = PricingRepo(session)
-    rule = await repo.get_active_dynamic(item_type="ton", currency="TON", bot_id=bot_id)
+    rule = await pricing_cache.get_rule(session, bot_id, "ton", "dynamic", "TON")
     if not rule or rule.manual_price is None:
         raise RuntimeError("Не задана цена 'ton' в TON (pricing_rules)")
     price = rule.manual_price + (rule.manual_price / 100 * rule.markup_percent)
@@ -71,8 +69,7 @@ def calc_ton_for_ton(amount: float, price_per_ton: Decimal) -> Decimal:
     return total.quantize(Decimal("0.000000001"), rounding=ROUND_UP)
 
 async def get_ton_price_in_rub(session: AsyncSession, bot_id: int) -> Decimal:
-    repo = PricingRepo(session)
-    rule = await repo.get_active_manual(item_type="ton", currency="RUB", bot_id=bot_id)
+    rule = await pricing_cache.get_rule(session, bot_id, "ton", "manual", "RUB")
     if not rule or rule.manual_price is None:
         raise RuntimeError("Не задана цена 'ton' в RUB (pricing_rules)")
     # price = rule.manual_price + (rule.manual_price / 100 * rule.markup_percent)
@@ -83,22 +80,59 @@ def calc_rub_for_ton(amount: float, price_per_ton: Decimal):
     return int(total)  # Platega ждёт целую сумму в рублях
 
 
+PRICE_REFRESH_INTERVAL_SEC = int(os.getenv("PRICE_REFRESH_INTERVAL_SEC", "600"))
+PRICE_REFRESH_JITTER = float(os.getenv("PRICE_REFRESH_JITTER", "0.1"))
+PRICE_REFRESH_BACKOFF_MAX_SEC = int(os.getenv("PRICE_REFRESH_BACKOFF_MAX_SEC", "600"))
+
+_last_refresh_at: float | None = None
+
+metrics.gauge_callback(
+    "price_refresh_staleness_seconds",
+    lambda: time.time() - _last_refresh_at if _last_refresh_at else -1,
+    "Секунд с последнего успешного обновления динамических цен (-1 — ещё не было)",
+)
+
+
 async def update_ton_price():
+    """Одно обновление динамических цен для всех ботов."""
+    global _last_refresh_at
     premium_client = PremiumFragmentClient()
     stars_client = StarsFragmentClient()
-    # ton_client = TonFragmentClient()
-    # stars_price, premium_price = await get_stars_price(), await get_premium_price()
-    premium_price = await premium_client.fetch_price_per_month()
-    stars_price = await stars_client.fetch_price_per_star()
+    started = time.time()
+    premium_price, stars_price = await asyncio.gather(
+        premium_client.fetch_price_per_month(),
+        stars_client.fetch_price_per_star(),
+    )
     async with SessionLocal() as session:
-        repo = PricingRepo(session)
-        user_bots = UserBotsRepo(session)
-        bots = await user_bots.get_all()
-        for bot in bots:
-            await repo.set_active("stars", "TON", stars_price, bot.id)
-            await repo.set_active("premium", "TON", premium_price, bot.id)
-            await repo.set_active("ton", "TON", 1.0, bot.id)
-    print("prices updated")
-    await asyncio.sleep(60 * 10)
-
-
+        await PricingRepo(session).set_dynamic_for_all_bots({
+            ("stars", "TON"): stars_price,
+            ("premium", "TON"): premium_price,
+            ("ton", "TON"): 1.0,
+        })
+    _last_refresh_at = time.time()
+    metrics.set_gauge("price_refresh_last_success_timestamp", _last_refresh_at,
+                      "Unix-время последнего успешного обновления цен")
+    metrics.set_gauge("price_refresh_duration_seconds", _last_refresh_at - started,
+                      "Длительность последнего обновления цен")
+    logger.info("prices updated: stars=%s premium=%s", stars_price, premium_price)
+
+
+async def run_price_refresher():
+    """
+    Фоновый цикл обновления цен: интервал с джиттером, при ошибках — экспоненциальный backoff.
+    """
+    failures = 0
+    while True:
+        try:
+            await update_ton_price()
+            failures = 0
+            delay = PRICE_REFRESH_INTERVAL_SEC
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            failures += 1
+            metrics.inc_counter("price_refresh_failures_total", help="Неудачные попытки обновления цен")
+            delay = min(PRICE_REFRESH_BACKOFF_MAX_SEC, 5 * 2 ** failures)
+            logger.warning("Не удалось обновить цены (попытка %s): %s", failures, e)
+        delay *= 1 + random.uniform(-PRICE_REFRESH_JITTER, PRICE_REFRESH_JITTER)
+        await asyncio.sleep(delay)
@@ -0,0 +1,140 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Dict, Optional, Tuple
+
+import asyncpg
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models import PricingRule, UserBot
+
+logger = logging.getLogger(__name__)
+
+PRICING_NOTIFY_CHANNEL = "pricing_changed"
+# страховка на случай потерянного NOTIFY (например, во время переподключения)
+PRICING_CACHE_TTL_SEC = int(os.getenv("PRICING_CACHE_TTL_SEC", "300"))
+PRICING_LISTEN_RECONNECT_SEC = int(os.getenv("PRICING_LISTEN_RECONNECT_SEC", "5"))
+
+
+@dataclass(frozen=True)
+class CachedRule:
+    manual_price: Optional[Decimal]
+    markup_percent: Optional[Decimal]
+
+
+_RuleKey = Tuple[str, str, str]  # (item_type, mode, currency)
+
+
+class PricingCache:
+    """
+    Read-through кеш прайсинга.
+    На промах по боту одним запросом грузим весь его прайс-лист (все активные правила),
+    дальше цены отдаются из памяти. Сбрасывается по NOTIFY из триггеров
+    на pricing_rules и user_bots (db/init/04_pricing_notify.sql).
+    """
+
+    def __init__(self, ttl: int = PRICING_CACHE_TTL_SEC):
+        self.ttl = ttl
+        self._sheets: Dict[int, Tuple[float, Dict[_RuleKey, CachedRule]]] = {}
+        self._bot_ids: Dict[int, Tuple[float, Optional[int]]] = {}
+        self._listener: Optional[asyncio.Task] = None
+
+    # ==== чтение ====
+
+    async def get_bot_id(self, session: AsyncSession, tg_bot_id: int) -> Optional[int]:
+        """user_bots.id по Telegram id бота."""
+        hit = self._bot_ids.get(tg_bot_id)
+        if hit and time.monotonic() - hit[0] < self.ttl:
+            return hit[1]
+        res = await session.execute(select(UserBot.id).where(UserBot.tg_bot_id == tg_bot_id))
+        bot_id = res.scalar_one_or_none()
+        self._bot_ids[tg_bot_id] = (time.monotonic(), bot_id)
+        return bot_id
+
+    async def get_sheet(self, session: AsyncSession, bot_id: int) -> Dict[_RuleKey, CachedRule]:
+        """Весь прайс-лист бота. Пока кеш не сброшен, возвращается один и тот же объект."""
+        sheet = self._sheets.get(bot_id)
+        if not sheet or time.monotonic() - sheet[0] >= self.ttl:
+            sheet = (time.monotonic(), await self._load_sheet(session, bot_id))
+            self._sheets[bot_id] = sheet
+        return sheet[1]
+
+    async def get_rule(self, session: AsyncSession, bot_id: int, item_type: str, mode: str, currency: str) -> Optional[CachedRule]:
+        sheet = await self.get_sheet(session, bot_id)
+        return sheet.get((item_type, mode, currency))
+
+    async def _load_sheet(self, session: AsyncSession, bot_id: int) -> Dict[_RuleKey, CachedRule]:
+        res = await session.execute(
+            select(PricingRule.item_type, PricingRule.mode, PricingRule.currency,
+                   PricingRule.manual_price, PricingRule.markup_percent)
+            .where(PricingRule.bot_id == bot_id, PricingRule.is_active == True)  # noqa: E712
+            .order_by(PricingRule.id.desc())
+        )
+        sheet: Dict[_RuleKey, CachedRule] = {}
+        for item_type, mode, currency, price, markup in res.all():
+            # как и в PricingRepo, действует самое свежее правило
+            sheet.setdefault((item_type, mode, currency), CachedRule(manual_price=price, markup_percent=markup))
+        return sheet
+
+    # ==== инвалидация ====
+
+    def invalidate(self, bot_id: Optional[int] = None):
+        if bot_id is None:
+            self._sheets.clear()
+            self._bot_ids.clear()
+        else:
+            self._sheets.pop(bot_id, None)
+
+    def _on_notify(self, conn, pid, channel, payload):
+        try:
+            data = json.loads(payload or "{}")
+        except ValueError:
+            data = {}
+        if data.get("table") == "user_bots":
+            # таблица маленькая, проще сбросить маппинг целиком
+            self._bot_ids.clear()
+            self.invalidate(data.get("bot_id"))
+        else:
+            self.invalidate(data.get("bot_id"))
+
+    async def _listen(self, dsn: str):
+        while True:
+            conn = None
+            try:
+                conn = await asyncpg.connect(dsn)
+                await conn.add_listener(PRICING_NOTIFY_CHANNEL, self._on_notify)
+                # пока не слушали, могли пропустить изменения
+                self.invalidate()
+                logger.info("pricing cache: слушаем %s", PRICING_NOTIFY_CHANNEL)
+                while not conn.is_closed():
+                    await asyncio.sleep(PRICING_LISTEN_RECONNECT_SEC)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("pricing cache: LISTEN упал: %s", e)
+            finally:
+                if conn is not None and not conn.is_closed():
+                    await conn.close()
+            await asyncio.sleep(PRICING_LISTEN_RECONNECT_SEC)
+
+    async def start(self, database_url: str):
+        if self._listener is None:
+            dsn = database_url.replace("postgresql+asyncpg://", "postgresql://", 1)
+            self._listener = asyncio.create_task(self._listen(dsn), name="pricing-cache-listen")
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+
+pricing_cache = PricingCache()
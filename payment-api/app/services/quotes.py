@@ -0,0 +1,86 @@
+from dataclasses import dataclass
+from decimal import Decimal, ROUND_UP
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .pricing_cache import pricing_cache, CachedRule
+
+ORDER_TYPES = ("stars", "premium", "ton")
+# способ оплаты -> (режим правила, валюта)
+PAYMENT_METHODS = {
+    "TON": ("dynamic", "TON"),
+    "SBP": ("manual", "RUB"),
+    "CRYPTO_OTHER": ("manual", "RUB"),  # Heleket принимает сумму в RUB
+}
+
+NANO = Decimal("0.000000001")
+
+
+@dataclass(frozen=True)
+class Quote:
+    order_type: str
+    payment_method: str
+    currency: str
+    unit_price: Decimal
+
+    def total(self, amount: int):
+        """
+        Итог к оплате: TON — округление вверх до нанотонов,
+        RUB — вверх до целого рубля (Platega ждёт целую сумму).
+        """
+        total = self.unit_price * Decimal(amount)
+        if self.currency == "TON":
+            return total.quantize(NANO, rounding=ROUND_UP)
+        return int(total.quantize(Decimal("1"), rounding=ROUND_UP))
+
+
+@dataclass(frozen=True)
+class BotQuotes:
+    bot_id: int
+    quotes: Dict[Tuple[str, str], Quote]
+
+    def get(self, order_type: str, payment_method: str) -> Optional[Quote]:
+        return self.quotes.get((order_type, payment_method))
+
+    def as_list(self) -> List[Quote]:
+        return list(self.quotes.values())
+
+
+def _unit_price(rule: Optional[CachedRule], mode: str) -> Optional[Decimal]:
+    if not rule or rule.manual_price is None:
+        return None
+    price = Decimal(str(rule.manual_price))
+    if mode == "dynamic":
+        # к рыночной цене из Fragment добавляем наценку бота
+        price = price + price / 100 * Decimal(str(rule.markup_percent or 0))
+    return price
+
+
+class QuoteEngine:
+    """
+    Котировки по всем (тип товара, способ оплаты) бота за один проход по прайс-листу.
+    Результат переиспользуется, пока pricing_cache отдаёт тот же прайс-лист.
+    """
+
+    def __init__(self):
+        self._cache: Dict[int, Tuple[dict, BotQuotes]] = {}
+
+    async def for_bot(self, session: AsyncSession, bot_id: int) -> BotQuotes:
+        sheet = await pricing_cache.get_sheet(session, bot_id)
+        hit = self._cache.get(bot_id)
+        if hit and hit[0] is sheet:
+            return hit[1]
+
+        quotes: Dict[Tuple[str, str], Quote] = {}
+        for order_type in ORDER_TYPES:
+            for method, (mode, currency) in PAYMENT_METHODS.items():
+                unit = _unit_price(sheet.get((order_type, mode, currency)), mode)
+                if unit is not None:
+                    quotes[(order_type, method)] = Quote(order_type, method, currency, unit)
+        bot_quotes = BotQuotes(bot_id=bot_id, quotes=quotes)
+        self._cache[bot_id] = (sheet, bot_quotes)
+        return bot_quotes
+
+
+quote_engine = QuoteEngine()
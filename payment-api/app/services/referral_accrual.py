@@ -16,10 +16,11 @@ from ..services.converter import get_amount
 #     except Exception:
 #         return Decimal("5")
 
-async def accrue_referral_reward(session: AsyncSession, order: Order, bot_id: int) -> None:
+async def accrue_referral_reward(session: AsyncSession, order: Order, bot_id: int, *, commit: bool = True) -> None:
     """
     Начисляет реферальную награду пригласившему пользователя, оформившего заказ.
     Баланс храним в TON-эквиваленте (users.balance).
+    commit=False — начисление остаётся в транзакции вызывающего (проводка оплаты).
     """
     # находим пригласившего
     refs = ReferralsRepo(session)
@@ -42,7 +43,7 @@ async def accrue_referral_reward(session: AsyncSession, order: Order, bot_id: in
 
     # обновляем баланс пригласившего
     users = UsersRepo(session)
-    await users.add_balance(referrer_id, float(amount))
+    await users.add_balance(referrer_id, float(amount), commit=commit)
 
     # опционально: положим след в payload заказа
     # from sqlalchemy import update
@@ -0,0 +1,36 @@
+import logging
+
+from ..db import SessionLocal
+from ..repositories.orders import OrdersRepo
+from ..repositories.order_events import OrderEventsRepo
+from .referral_accrual import accrue_referral_reward
+
+logger = logging.getLogger(__name__)
+
+
+async def on_order_paid(order_id: int, tx_hash: str | None, bot_id: int):
+    """
+    Общая точка входа после подтверждения оплаты (поллинг, вебхук, вотчер).
+    Одна транзакция: заказ переводится в paid только из pending (UPDATE ... RETURNING),
+    начисляется рефералка и пишется событие в outbox order_events.
+    Параллельное подтверждение того же заказа ничего не обновит и выйдет,
+    так что реферер не получит награду дважды. Фулфилмент и уведомления
+    разносит outbox_relay после коммита (его будит NOTIFY order_events).
+    Рефералка идёт в SAVEPOINT: её ошибка (курс, правило цены) не откатывает оплату,
+    а пишется в outbox событием referral_failed.
+    """
+    async with SessionLocal() as session:
+        order = await OrdersRepo(session).mark_paid_if_pending(order_id, tx_hash or "n/a", income=None)
+        if order is None:
+            return
+        # после отката savepoint'а атрибуты могут быть expired — берём заранее
+        paid_id, message = order.id, order.message
+        events = OrderEventsRepo(session)
+        try:
+            async with session.begin_nested():
+                await accrue_referral_reward(session, order, bot_id, commit=False)
+        except Exception as e:
+            logger.exception("referral accrual for order %s failed", paid_id)
+            await events.add(paid_id, "referral_failed", {"bot_id": bot_id, "error": str(e)[:500]})
+        await events.add(paid_id, "paid", {"bot_id": bot_id, "message": message})
+        await session.commit()
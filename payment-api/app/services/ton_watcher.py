@@ -0,0 +1,243 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+from ..http_client import get_client
+from .poll_schedule import ton_schedule
+from .ton import _env, _get_provider, _fetch_json, _extract_toncenter_incoming, _extract_tonapi_incoming
+
+logger = logging.getLogger(__name__)
+
+PAGE_LIMIT = 40
+
+
+@dataclass
+class _PendingInvoice:
+    memo: str
+    min_amount: Decimal
+    since: float                                   # unix-время создания счёта
+    on_match: Callable[[Optional[str]], Awaitable[None]]
+    boosted_at: Optional[float] = None             # когда пользователь нажал «Оплатить»
+
+
+class TonWalletWatcher:
+    """
+    Один поллер на кошелёк.
+    Держим курсор (lt последней увиденной транзакции), на каждом тике забираем
+    только новые транзакции и сопоставляем их с ожидающими заказами через
+    индекс memo -> заказ. Стоимость сопоставления O(1) на транзакцию
+    и не зависит от числа открытых счетов.
+    Частота опроса — по общему графику ton_schedule: определяется самым «свежим»
+    счётом кошелька (только что созданным или ускоренным через boost).
+    """
+
+    def __init__(self, wallet: str):
+        self.wallet = wallet
+        self.provider = _get_provider()
+        base = (_env("TON_API_BASE") or "").strip().rstrip("/")
+        if not base:
+            base = "https://toncenter.com/api/v2" if self.provider == "toncenter" else "https://tonapi.io/v2"
+        self.base = base
+
+        api_key = (_env("TON_API_KEY") or "").strip()
+        self.headers: Dict[str, str] = {}
+        if self.provider == "toncenter" and api_key:
+            self.headers["X-API-Key"] = api_key
+        if self.provider == "tonapi" and api_key:
+            self.headers["Authorization"] = f"Bearer {api_key}"
+
+        self._pending: Dict[str, _PendingInvoice] = {}
+        self._last_lt: Optional[int] = None
+        self._has_pending = asyncio.Event()
+        self._boost = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    # ==== публичное API ====
+
+    def add(self, memo: str, min_amount_ton: Decimal, since: float, on_match: Callable[[Optional[str]], Awaitable[None]]):
+        """
+        Регистрирует счёт в индексе. Когда поллер найдёт оплату,
+        вызовет on_match(tx_hash) и сам уберёт счёт из индекса.
+        """
+        self._pending[memo] = _PendingInvoice(memo=memo, min_amount=min_amount_ton, since=since, on_match=on_match)
+        self._has_pending.set()
+        self._ensure_running()
+
+    def remove(self, memo: str):
+        self._pending.pop(memo, None)
+        if not self._pending:
+            ton_schedule.forget(self.wallet)
+
+    def boost(self, memo: str):
+        """Пользователь перешёл к оплате — опрашиваем кошелёк часто, начиная прямо сейчас."""
+        invoice = self._pending.get(memo)
+        if invoice is None:
+            return
+        invoice.boosted_at = time.time()
+        ton_schedule.record_boost()
+        self._boost.set()
+
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    async def stop(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    # ==== поллинг ====
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name=f"ton-watcher-{self.wallet}")
+
+    async def _run(self):
+        while True:
+            if not self._pending:
+                self._has_pending.clear()
+                await self._has_pending.wait()
+            try:
+                ton_schedule.record_request()
+                txs = await self._fetch_new(get_client(self.base))
+                for tx_hash, lt, amount, msg_text in txs:
+                    await self._match(tx_hash, amount, msg_text)
+                    if self._last_lt is None or lt > self._last_lt:
+                        self._last_lt = lt
+            except Exception as e:
+                logger.warning("TON watcher %s: ошибка опроса: %s", self.wallet, e)
+            await self._sleep()
+
+    def _next_interval(self) -> float:
+        now = time.time()
+        if not self._pending:
+            ton_schedule.forget(self.wallet)
+            return ton_schedule.slow
+        created = max(inv.since for inv in self._pending.values())
+        boosted = max((inv.boosted_at or 0.0) for inv in self._pending.values()) or None
+        # дедлайн кошелька не ограничивает: каждый счёт снимает payment_watch
+        return ton_schedule.next_check(self.wallet, created, float("inf"), boosted, now) - now
+
+    async def _sleep(self):
+        self._boost.clear()
+        try:
+            await asyncio.wait_for(self._boost.wait(), timeout=self._next_interval())
+        except asyncio.TimeoutError:
+            pass
+
+    async def _match(self, tx_hash: Optional[str], amount: Decimal, msg_text: Optional[str]):
+        if not msg_text:
+            return
+        invoice = self._pending.get(msg_text.strip())
+        if invoice is None or amount < invoice.min_amount:
+            return
+        del self._pending[invoice.memo]
+        try:
+            await invoice.on_match(tx_hash)
+        except Exception as e:
+            logger.warning("TON watcher %s: ошибка обработки оплаты %s: %s", self.wallet, invoice.memo, e)
+
+    def _backfill_since(self) -> Optional[float]:
+        # после рестарта курсора нет: листаем назад до самого старого открытого счёта,
+        # чтобы не пропустить оплаты, пришедшие пока сервис лежал
+        if self._last_lt is not None or not self._pending:
+            return None
+        return min(inv.since for inv in self._pending.values())
+
+    async def _fetch_new(self, http: httpx.AsyncClient) -> List[tuple]:
+        """
+        Возвращает транзакции новее курсора в порядке возрастания lt:
+        [(tx_hash, lt, amount, memo), ...]
+        """
+        if self.provider == "toncenter":
+            return await self._fetch_new_toncenter(http)
+        return await self._fetch_new_tonapi(http)
+
+    async def _fetch_new_toncenter(self, http: httpx.AsyncClient) -> List[tuple]:
+        # toncenter отдаёт транзакции от новых к старым; листаем назад по (lt, hash),
+        # пока не дойдём до курсора (или до момента создания самого старого счёта).
+        url = f"{self.base}/getTransactions"
+        out: List[tuple] = []
+        since = self._backfill_since()
+        params = {"address": self.wallet, "limit": PAGE_LIMIT, "archival": "true"}
+        if self._last_lt is not None:
+            params["to_lt"] = self._last_lt
+        while True:
+            data = await _fetch_json(http, url, self.headers, params=params)
+            txs = data.get("result") or data.get("transactions") or []
+            for tx in txs:
+                lt = _tx_lt(tx)
+                if self._last_lt is not None and lt <= self._last_lt:
+                    continue
+                tx_hash, amount, msg_text = _extract_toncenter_incoming(tx)
+                out.append((tx_hash, lt, amount, msg_text))
+            if len(txs) < PAGE_LIMIT:
+                break
+            if self._last_lt is None and (since is None or _tx_utime(txs[-1]) < since):
+                break
+            if self._last_lt is not None and _tx_lt(txs[-1]) <= self._last_lt:
+                break
+            oldest = txs[-1].get("transaction_id") or {}
+            params = {**params, "lt": oldest.get("lt"), "hash": oldest.get("hash")}
+        out.sort(key=lambda t: t[1])
+        return out
+
+    async def _fetch_new_tonapi(self, http: httpx.AsyncClient) -> List[tuple]:
+        # tonapi умеет отдавать транзакции по возрастанию после заданного lt — листаем вперёд.
+        url = f"{self.base}/blockchain/accounts/{self.wallet}/transactions"
+        out: List[tuple] = []
+        since = self._backfill_since()
+        if self._last_lt is None:
+            params = {"limit": PAGE_LIMIT}
+        else:
+            params = {"limit": PAGE_LIMIT, "after_lt": self._last_lt, "sort_order": "asc"}
+        while True:
+            data = await _fetch_json(http, url, self.headers, params=params)
+            txs = data.get("transactions") or data.get("result") or []
+            for tx in txs:
+                tx_hash, amount, msg_text = _extract_tonapi_incoming(tx)
+                out.append((tx_hash, _tx_lt(tx), amount, msg_text))
+            if len(txs) < PAGE_LIMIT:
+                break
+            if self._last_lt is None:
+                # без курсора идём назад (desc) до самого старого открытого счёта
+                if since is None or min(_tx_utime(tx) for tx in txs) < since:
+                    break
+                params = {**params, "before_lt": min(_tx_lt(tx) for tx in txs)}
+                continue
+            params = {**params, "after_lt": max(_tx_lt(tx) for tx in txs)}
+        out.sort(key=lambda t: t[1])
+        return out
+
+
+def _tx_lt(tx: dict) -> int:
+    return int((tx.get("transaction_id") or {}).get("lt") or tx.get("lt") or 0)
+
+
+def _tx_utime(tx: dict) -> int:
+    return int(tx.get("utime") or 0)
+
+
+_watchers: Dict[str, TonWalletWatcher] = {}
+
+
+def get_ton_watcher(wallet: str) -> TonWalletWatcher:
+    watcher = _watchers.get(wallet)
+    if watcher is None:
+        watcher = TonWalletWatcher(wallet)
+        _watchers[wallet] = watcher
+    return watcher
+
+
+async def stop_ton_watchers():
+    for watcher in list(_watchers.values()):
+        await watcher.stop()
+    _watchers.clear()
@@ -0,0 +1,179 @@
+import asyncio
+import logging
+import os
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+from pytoniq_core import Address
+from tonutils.client import TonapiClient
+from tonutils.utils import to_nano
+from tonutils.wallet import WalletV5R1
+from tonutils.wallet.data import TransferData
+
+from .. import metrics
+from ..http_client import get_client
+
+logger = logging.getLogger(__name__)
+
+API_TON = os.getenv("API_TON", "")
+MNEMONIC = os.getenv("TON_MNEMONICS", "").split()
+
+# W5 принимает до 255 сообщений в одном external message
+WALLET_BATCH_MAX = min(int(os.getenv("WALLET_BATCH_MAX", "255")), 255)
+WALLET_BATCH_WINDOW_SEC = float(os.getenv("WALLET_BATCH_WINDOW_SEC", "1.0"))
+WALLET_CONFIRM_TIMEOUT_SEC = int(os.getenv("WALLET_CONFIRM_TIMEOUT_SEC", "90"))
+WALLET_CONFIRM_POLL_SEC = float(os.getenv("WALLET_CONFIRM_POLL_SEC", "3"))
+TONAPI_BASE = os.getenv("TONAPI_BASE", "https://tonapi.io/v2").rstrip("/")
+
+
+@dataclass
+class _Outgoing:
+    destination: str
+    amount: float
+    body: Optional[str]
+    future: asyncio.Future = field(repr=False)
+
+
+class WalletSender:
+    """
+    Отправка исходящих платежей с горячего кошелька пачками.
+    Кошелёк (вывод ключей из мнемоники) поднимается один раз. Платежи копятся
+    в очереди WALLET_BATCH_WINDOW_SEC и уходят одним batch_transfer — один seqno на пачку,
+    а не на заказ. Seqno ведётся локально и передаётся в перевод явно; из сети
+    перечитывается только после сбоя. Пачки идут строго по одной: следующая только
+    после того, как seqno кошелька вырос. Каждый платёж пачки подтверждается отдельно —
+    по исходящим сообщениям транзакции, которую породил наш external message.
+    """
+
+    def __init__(self):
+        self.client = None
+        self.wallet = None
+        self._seqno: Optional[int] = None
+        self._pending: List[_Outgoing] = []
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def _ensure_wallet(self):
+        if self.wallet is None:
+            self.client = TonapiClient(api_key=API_TON, is_testnet=False)
+            self.wallet, _, _, _ = WalletV5R1.from_mnemonic(self.client, MNEMONIC)
+            logger.info("Кошелек успешно загружен.")
+
+    async def _get_seqno(self) -> int:
+        return int(await self.wallet.get_seqno(self.client, self.wallet.address.to_str()))
+
+    async def send(self, destination: str, amount: float, body: Optional[str]) -> Tuple[bool, Optional[str]]:
+        """
+        Ставит платёж в ближайшую пачку и ждёт её подтверждения.
+        Возвращает (success, tx_hash) — как раньше TonTransaction.send_ton_transaction.
+        """
+        fut = asyncio.get_running_loop().create_future()
+        self._pending.append(_Outgoing(destination=destination, amount=amount, body=body, future=fut))
+        self._wakeup.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="wallet-sender")
+        return await fut
+
+    async def _run(self):
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            # окно на сбор пачки
+            await asyncio.sleep(WALLET_BATCH_WINDOW_SEC)
+            batch, self._pending = self._pending[:WALLET_BATCH_MAX], self._pending[WALLET_BATCH_MAX:]
+            if batch:
+                await self._flush(batch)
+
+    async def _flush(self, batch: List[_Outgoing]):
+        tx_hash = None
+        try:
+            self._ensure_wallet()
+            seqno = self._seqno if self._seqno is not None else await self._get_seqno()
+            tx_hash = await self.wallet.batch_transfer(data_list=[
+                TransferData(destination=o.destination, amount=o.amount, body=o.body) for o in batch
+            ], seqno=seqno)
+            logger.info(f"✅ Пачка из {len(batch)} транзакций отправлена: {tx_hash}")
+            metrics.inc_counter("wallet_batches_total", help="Отправленные пачки исходящих платежей")
+            metrics.inc_counter("wallet_messages_total", len(batch), help="Исходящие платежи в пачках")
+            accepted = await self._wait_seqno(seqno + 1)
+            delivered = await self._confirm_messages(tx_hash, batch) if accepted else [False] * len(batch)
+        except Exception as e:
+            logger.error(f"❌ Ошибка при отправке пачки: {str(e)}")
+            # локальный seqno больше не доверяем — перечитаем из сети
+            self._seqno = None
+            for o in batch:
+                if not o.future.done():
+                    o.future.set_result((False, None))
+            return
+
+        if accepted:
+            self._seqno = seqno + 1
+        else:
+            logger.warning("Пачка %s не подтвердилась за %s с", tx_hash, WALLET_CONFIRM_TIMEOUT_SEC)
+            self._seqno = None
+        if accepted and not all(delivered):
+            logger.warning("Пачка %s: не найдено %s исходящих из %s", tx_hash, delivered.count(False), len(batch))
+        # неподтверждённый платёж ещё может дойти: отдаём success=False без исключения,
+        # чтобы фулфилмент не отправил платёж повторно
+        for o, ok in zip(batch, delivered):
+            if not o.future.done():
+                o.future.set_result((ok, tx_hash))
+
+    async def _wait_seqno(self, expected: int) -> bool:
+        deadline = time.monotonic() + WALLET_CONFIRM_TIMEOUT_SEC
+        while time.monotonic() < deadline:
+            await asyncio.sleep(WALLET_CONFIRM_POLL_SEC)
+            try:
+                if await self._get_seqno() >= expected:
+                    return True
+            except Exception as e:
+                logger.warning("wallet sender: не удалось прочитать seqno: %s", e)
+        return False
+
+    async def _confirm_messages(self, msg_hash: str, batch: List[_Outgoing]) -> List[bool]:
+        """
+        Для каждого платежа пачки: ушло ли исходящее сообщение с тем же адресом и суммой
+        из транзакции кошелька, порождённой нашим external message (tonapi, поиск по hash).
+        """
+        url = f"{TONAPI_BASE}/blockchain/messages/{msg_hash}/transaction"
+        headers = {"Authorization": f"Bearer {API_TON}"}
+        deadline = time.monotonic() + WALLET_CONFIRM_TIMEOUT_SEC
+        tx = None
+        while tx is None and time.monotonic() < deadline:
+            try:
+                resp = await get_client(url).get(url, headers=headers)
+                if resp.status_code != 404:  # 404 — транзакция ещё не проиндексирована
+                    resp.raise_for_status()
+                    tx = resp.json()
+            except Exception as e:
+                logger.warning("wallet sender: не удалось получить транзакцию %s: %s", msg_hash, e)
+            if tx is None:
+                await asyncio.sleep(WALLET_CONFIRM_POLL_SEC)
+        if tx is None:
+            return [False] * len(batch)
+
+        sent = Counter(
+            (_raw_address((m.get("destination") or {}).get("address")), int(m.get("value") or 0))
+            for m in tx.get("out_msgs") or []
+        )
+        result = []
+        for o in batch:
+            key = (_raw_address(o.destination), to_nano(o.amount))
+            result.append(sent[key] > 0)
+            sent[key] -= 1
+        return result
+
+
+def _raw_address(address: Optional[str]) -> Optional[str]:
+    if not address:
+        return None
+    try:
+        return Address(address).to_str(is_user_friendly=False)
+    except Exception:
+        return address.lower()
+
+
+wallet_sender = WalletSender()
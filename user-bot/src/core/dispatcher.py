@@ -1,17 +1,45 @@
 # src/core/dispatcher.py
+import os
+from typing import Tuple
+
 from aiogram import Dispatcher
+from aiogram.fsm.storage.base import BaseEventIsolation, BaseStorage, DefaultKeyBuilder
+from aiogram.fsm.storage.memory import MemoryStorage, SimpleEventIsolation
 from aiogram.fsm.storage.redis import RedisStorage
-from aiogram.fsm.storage.base import DefaultKeyBuilder
-from redis.asyncio import Redis
 from sqlalchemy.ext.asyncio import async_sessionmaker
 
 from src.handlers import start, menu, stars, premium, history, referral, mirror
 
-def build_dispatcher(session_maker: async_sessionmaker, redis_dsn: str) -> Dispatcher:
-    # FSM-хранилище с ключами per-bot (как в мультибот-примере это обязательно)
-    redis = Redis.from_url(redis_dsn)
-    storage = RedisStorage(redis=redis, key_builder=DefaultKeyBuilder(with_bot_id=True))
-    dp = Dispatcher(storage=storage)
+# memory — одна реплика, состояние теряется при рестарте;
+# redis — состояние и блокировки апдейтов общие для всех процессов
+# (переживает рестарт и перенос бота в другой шард, см. BOT_SHARD_* в bot_registry)
+FSM_STORAGE = os.getenv("FSM_STORAGE", "memory").lower()
+REDIS_DSN = os.getenv("REDIS_DSN", "redis://redis:6379/0")
+# брошенная покупка не должна висеть в Redis вечно
+FSM_STATE_TTL_SEC = int(os.getenv("FSM_STATE_TTL_SEC", "86400"))
+FSM_DATA_TTL_SEC = int(os.getenv("FSM_DATA_TTL_SEC", "86400"))
+
+
+def build_fsm(redis_dsn: str = REDIS_DSN) -> Tuple[BaseStorage, BaseEventIsolation]:
+    """FSM-хранилище и изоляция апдейтов по FSM_STORAGE."""
+    if FSM_STORAGE == "redis":
+        # ключи per-bot: у зеркал одни и те же chat_id/user_id
+        storage = RedisStorage.from_url(
+            redis_dsn,
+            key_builder=DefaultKeyBuilder(with_bot_id=True),
+            state_ttl=FSM_STATE_TTL_SEC,
+            data_ttl=FSM_DATA_TTL_SEC,
+        )
+        # RedisEventIsolation: апдейты одного чата не обрабатываются параллельно и между процессами
+        return storage, storage.create_isolation()
+    if FSM_STORAGE != "memory":
+        raise RuntimeError(f"FSM_STORAGE={FSM_STORAGE!r}: ожидается memory или redis")
+    return MemoryStorage(), SimpleEventIsolation()
+
+
+def build_dispatcher(session_maker: async_sessionmaker, redis_dsn: str = REDIS_DSN) -> Dispatcher:
+    storage, isolation = build_fsm(redis_dsn)
+    dp = Dispatcher(storage=storage, events_isolation=isolation)
 
     # Общие роутеры (одни и те же для всех ботов)
     dp.include_router(start.get_router(session_maker))
@@ -1,5 +1,15 @@
 import os
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncEngine, AsyncSession
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncEngine, AsyncSession
+
+from common.db_pool import create_engine, log_pool_stats as _log_pool_stats, pool_stats as _pool_stats
+
+# пул и asyncpg настраиваются в common/db_pool.py, здесь — размеры для этого сервиса.
+# user-bot обслуживает все зеркала в одном процессе, поэтому пул по умолчанию больше.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_APPLICATION_NAME = os.getenv("DB_APPLICATION_NAME", "user-bot")
+
 
 _engine: AsyncEngine | None = None
 _session_maker: async_sessionmaker[AsyncSession] | None = None
@@ -9,7 +19,7 @@ async def init_engine():
     db_url = os.getenv("DATABASE_URL")
     if not db_url:
         raise RuntimeError("DATABASE_URL is not set")
-    _engine = create_async_engine(db_url, pool_pre_ping=True)
+    _engine = create_engine(db_url, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_APPLICATION_NAME)
     _session_maker = async_sessionmaker(_engine, expire_on_commit=False)
 
 def get_session_maker() -> async_sessionmaker[AsyncSession]:
@@ -21,3 +31,12 @@ async def close_engine():
     if _engine is not None:
         await _engine.dispose()
         _engine = None
+
+def pool_stats() -> dict:
+    assert _engine is not None, "Engine not initialized. Call init_engine() first."
+    return _pool_stats(_engine)
+
+async def log_pool_stats():
+    # метрик-эндпоинта у бота нет: состояние пула периодически пишем в лог
+    assert _engine is not None, "Engine not initialized. Call init_engine() first."
+    await _log_pool_stats(_engine)
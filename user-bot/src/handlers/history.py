@@ -1,10 +1,10 @@
 from aiogram import Router, F, types
 # from aiogram.filters import Text
 from sqlalchemy.ext.asyncio import async_sessionmaker
-from datetime import datetime
+from datetime import datetime, timedelta
 from ..repositories.users import UsersRepo
 from ..repositories.orders import OrdersRepo
-from ..repositories.user_bots import UserBotsRepo
+from ..services.identity import Identity
 from ..keyboards.common import history_nav_kb, main_menu_kb, back_nav_kb
 
 PAGE_SIZE = 10
@@ -30,35 +30,66 @@ def _fmt_order(o) -> str:
 
     return f"#{o.id} • {dt_str} • {what}{rec}{price}"
 
-def get_router(session_maker: async_sessionmaker) -> Router:
-    router = Router(name="history")
+_EPOCH = datetime(1970, 1, 1)
 
-    async def _render_page(m: types.Message, user_tg, page: int, edit: bool = False):
-        page = max(1, page)
-        offset = (page - 1) * PAGE_SIZE
 
-        async with session_maker() as session:
-            users = UsersRepo(session)
-            orders = OrdersRepo(session)
-            userbots = UserBotsRepo(session)
+def _cursor(o) -> str:
+    # paid_at хранится без таймзоны — кодируем смещением от «наивной» эпохи, без перевода в локальное время
+    return f"{(o.paid_at - _EPOCH) // timedelta(microseconds=1)}:{o.id}"
 
-            bot = await userbots.get_by_tg_bot_id(m.bot.id)
-            user = await users.upsert_from_telegram(user_tg, bot.id)
-            total = await orders.count_paid_by_user(user.id)
-            rows = await orders.list_paid_by_user(user.id, limit=PAGE_SIZE, offset=offset)
 
-        if total == 0:
+def _parse_cursor(raw: str) -> tuple[datetime, int]:
+    ts, order_id = raw.split(":")
+    return _EPOCH + timedelta(microseconds=int(ts)), int(order_id)
+
+
+def get_router(session_maker: async_sessionmaker) -> Router:
+    router = Router(name="history")
+
+    async def _render_page(m: types.Message, identity: Identity, page: int = 1, direction: str | None = None,
+                           cursor: tuple[datetime, int] | None = None, edit: bool = False):
+        # только чтение: пользователь уже определён IdentityMiddleware, количество — users.paid_orders_count
+        async with session_maker() as session:
+            total = await UsersRepo(session).get_paid_orders_count(identity.user_id)
+            rows = []
+            if total:
+                rows = await OrdersRepo(session).list_paid_by_user(
+                    identity.user_id, limit=PAGE_SIZE + 1,
+                    after=cursor if direction == "n" else None,
+                    before=cursor if direction == "p" else None,
+                )
+
+        if direction and not rows:
+            # курсор устарел — начинаем сначала
+            page, direction = 1, None
+            if total:
+                async with session_maker() as session:
+                    rows = await OrdersRepo(session).list_paid_by_user(identity.user_id, limit=PAGE_SIZE + 1)
+
+        if not rows:
             text = "Пока нет оплаченных заказов."
             await m.edit_text(text, reply_markup=back_nav_kb())
             return
 
+        # лишняя строка показывает, есть ли ещё страница в направлении листания
+        more = len(rows) > PAGE_SIZE
+        if direction == "p":
+            rows = rows[-PAGE_SIZE:]
+            has_prev, has_next = more, True
+        else:
+            rows = rows[:PAGE_SIZE]
+            has_prev, has_next = direction == "n", more
+        page = max(1, page) if has_prev else 1
+
         lines = ["📦 <b>История заказов</b>", f"Всего: {total}", ""]
         lines += [_fmt_order(o) for o in rows]
         text = "\n".join(lines)
 
-        has_prev = page > 1
-        has_next = offset + len(rows) < total
-        kb = history_nav_kb(page, has_prev, has_next)
+        kb = history_nav_kb(
+            page,
+            prev_cursor=_cursor(rows[0]) if has_prev else None,
+            next_cursor=_cursor(rows[-1]) if has_next else None,
+        )
 
         if edit:
             await m.edit_text(text, reply_markup=kb, disable_web_page_preview=True)
@@ -67,22 +98,24 @@ def get_router(session_maker: async_sessionmaker) -> Router:
 
     # Вход из меню
     @router.callback_query(F.data == ("history"))
-    async def history_entry(cb: types.CallbackQuery):
-        m = cb.message
-        await _render_page(m, m.from_user, page=1, edit=False)
+    async def history_entry(cb: types.CallbackQuery, identity: Identity):
+        await _render_page(cb.message, identity, edit=False)
 
-    # Пагинация
+    # Пагинация: hist:<n|p>:<страница>:<курсор>
     @router.callback_query(F.data.startswith("hist:"))
-    async def history_paginate(cb: types.CallbackQuery):
+    async def history_paginate(cb: types.CallbackQuery, identity: Identity):
         _, payload = cb.data.split(":", 1)
         if payload == "stay":
             await cb.answer()
             return
         try:
-            page = int(payload)
+            direction, page, raw_cursor = payload.split(":", 2)
+            cursor = _parse_cursor(raw_cursor)
+            page = int(page)
         except Exception:
-            page = 1
-        await _render_page(cb.message, cb.from_user, page=page, edit=True)
+            # старые кнопки с номером страницы — показываем первую
+            direction, page, cursor = None, 1, None
+        await _render_page(cb.message, identity, page=page, direction=direction, cursor=cursor, edit=True)
         await cb.answer()
 
     return router
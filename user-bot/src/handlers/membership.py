@@ -0,0 +1,17 @@
+# src/handlers/membership.py
+from aiogram import Router, types
+
+from ..services.subscription import membership_cache
+
+
+def get_router() -> Router:
+    router = Router(name="membership")
+
+    # приходит из каналов, где бот — админ; любое изменение участника сбрасывает кеш подписки
+    # во всех процессах (остальные шарды этот апдейт не получают)
+    @router.chat_member()
+    async def on_chat_member(update: types.ChatMemberUpdated):
+        if update.chat.username:
+            await membership_cache.broadcast_invalidate(update.chat.username, update.new_chat_member.user.id)
+
+    return router
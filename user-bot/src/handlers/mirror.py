@@ -5,10 +5,11 @@ from aiogram.fsm.context import FSMContext
 from sqlalchemy.ext.asyncio import async_sessionmaker
 import re, asyncio
 
-from ..repositories.users import UsersRepo
+from ..services.identity import Identity
 from ..repositories.user_bots import UserBotsRepo
 from ..repositories.pricing import PricingRepo
 from ..services.polling_manager import PollingManager
+from ..services.bot_registry import bot_registry, owns_bot
 
 from ..keyboards.common import back_nav_kb
 
@@ -28,19 +29,11 @@ def get_router(session_maker: async_sessionmaker) -> Router:
     router = Router(name="mirror")
 
     @router.callback_query(F.data == "create_bot")
-    async def ask_token(cb: types.CallbackQuery, state: FSMContext):
+    async def ask_token(cb: types.CallbackQuery, state: FSMContext, identity: Identity):
         m = cb.message
         async with session_maker() as session:
-            users = UsersRepo(session)
-            userbots = UserBotsRepo(session)
-
-            bot = await userbots.get_by_tg_bot_id(cb.bot.id)
-            inst = await cb.bot.get_chat_member(m.chat.id, m.chat.id)
-            user = inst.user
-            me = await users.upsert_from_telegram(user, bot.id)
-
             bots = UserBotsRepo(session)
-            existing = await bots.get_by_owner(me.id)
+            existing = await bots.get_by_owner(identity.user_id)
 
             if existing and existing.is_active:
                 await m.answer(
@@ -59,7 +52,8 @@ def get_router(session_maker: async_sessionmaker) -> Router:
         )
 
     @router.message(MirrorStates.waiting_token)
-    async def receive_token(m: types.Message, state: FSMContext, dp_for_new_bot: Dispatcher, polling_manager: PollingManager):
+    async def receive_token(m: types.Message, state: FSMContext, dp_for_new_bot: Dispatcher, polling_manager: PollingManager,
+                            identity: Identity):
         token = (m.text or "").strip()
         if not TOKEN_RE.match(token):
             await m.answer("Похоже, это не токен. Проверьте и пришлите снова.", reply_markup=back_nav_kb())
@@ -80,15 +74,10 @@ def get_router(session_maker: async_sessionmaker) -> Router:
 
         # сохраняем в БД и запускаем зеркало
         async with session_maker() as session:
-            users = UsersRepo(session)
-            userbots = UserBotsRepo(session)
             pricing = PricingRepo(session)
 
-            bot = await userbots.get_by_tg_bot_id(m.bot.id)
-            u = await users.upsert_from_telegram(m.from_user, bot.id)
-
             bots = UserBotsRepo(session)
-            existing = await bots.get_by_owner(u.id)
+            existing = await bots.get_by_owner(identity.user_id)
             if existing and existing.is_active:
                 await m.answer(
                     "У вас уже есть активное зеркало. Сейчас можно только одно.",
@@ -101,17 +90,19 @@ def get_router(session_maker: async_sessionmaker) -> Router:
                 # на будущее: можно сделать «переактивацию» — сейчас просто создадим новый
                 pass
 
-            created = await bots.create(owner_user_id=u.id, token=token, username=bot_username, tg_bot_id=tg_bot_id)
+            created = await bots.create(owner_user_id=identity.user_id, token=token, username=bot_username, tg_bot_id=tg_bot_id)
+            bot_registry.register(created)
 
-            main_bot_key = (await userbots.get_by_tg_bot_id(int(MAIN_BOT))).id
+            main_bot_key = (await bot_registry.resolve(session, int(MAIN_BOT))).key
             main_price_stars = (await pricing.get_active_manual("stars", "RUB", main_bot_key)).manual_price
             main_price_premium = (await pricing.get_active_manual("premium", "RUB", main_bot_key)).manual_price
             await pricing.upsert_manual("stars", "RUB", float(main_price_stars), main_bot_key)
             await pricing.upsert_manual("premium", "RUB", float(main_price_premium), main_bot_key)
 
-        bot = Bot(token=token, default=DefaultBotProperties(parse_mode=ParseMode.HTML)) 
-        
-        polling_manager.start_bot_polling(dp=dp_for_new_bot, bot=bot, dp_for_new_bot=dp_for_new_bot, polling_manager=polling_manager)
+        # при шардировании зеркало поднимает процесс, которому принадлежит бот (см. main._watch_new_bots)
+        if owns_bot(tg_bot_id):
+            bot = Bot(token=token, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+            polling_manager.start_bot_polling(dp=dp_for_new_bot, bot=bot, dp_for_new_bot=dp_for_new_bot, polling_manager=polling_manager)
         
         await m.answer(f"Готово! Зеркало @{bot_username} запущено.\n"
                        "Администрируйте своего бота в @stars_admin_frag_bot", reply_markup=back_nav_kb())
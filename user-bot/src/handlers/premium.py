@@ -11,7 +11,8 @@ from ..repositories.users import UsersRepo
 from ..repositories.orders import OrdersRepo
 from ..keyboards.common import who_kb, cancel_kb, main_menu_kb, payment_methods_kb, premium_duration_kb, payment_kb, back_nav_kb
 
-from ..services.payments_api import create_order
+from ..services.payments_api import create_order, pay_link
+from ..services.quotes import method_prices
 from ..services.order_poll import poll_until_paid
 
 class BuyPremium(StatesGroup):
@@ -38,7 +39,7 @@ def get_router(session_maker: async_sessionmaker) -> Router:
     @router.callback_query(F.data == ("premium"))
     async def entry(cb: types.CallbackQuery, state: FSMContext):
         await state.clear()
-        user = (await cb.bot.get_chat_member(cb.message.chat.id, cb.message.chat.id)).user
+        user = cb.from_user
         if not user.username:
             await state.set_state(BuyStars.enter_me)
             await cb.message.edit_text("У вас отсутствует имя пользователся. Введите его в настройках профиля telegram.", reply_markup=back_nav_kb())
@@ -80,7 +81,8 @@ def get_router(session_maker: async_sessionmaker) -> Router:
         await state.set_state(BuyPremium.choose_payment)
         await cb.message.edit_text(
             f"Premium на {months} мес.\nВыберите способ оплаты:",
-            reply_markup=payment_methods_kb(BTN_PAY_SBP, BTN_PAY_TON, BTN_PAY_OTHER, BTN_CANCEL)
+            reply_markup=payment_methods_kb(BTN_PAY_SBP, BTN_PAY_TON, BTN_PAY_OTHER, BTN_CANCEL,
+                                          prices=await method_prices(cb.bot.id, "premium", months))
         )
 
     @router.callback_query(F.data == BTN_M3)
@@ -134,7 +136,7 @@ def get_router(session_maker: async_sessionmaker) -> Router:
             "Либо перейдите по ссылке:\n"
             f"<code>{redirect}</code>\n\n"
             "Счет для оплаты действителен 30 минут",
-            reply_markup=payment_kb(redirect)
+            reply_markup=payment_kb(pay_link(order_id, redirect))
         )
         await _start_polling(cb, order_id)
 
@@ -175,7 +177,7 @@ def get_router(session_maker: async_sessionmaker) -> Router:
             f"<code>{memo}</code>\n\n"
             f"Если вы не укажите комментарий - ваш депозит не будет зачислен\n\n"
             f"Счет для оплаты действителен 30 минут",
-            reply_markup=payment_kb(link)
+            reply_markup=payment_kb(pay_link(order_id, link))
         )
         await _start_polling(cb, order_id)
 
@@ -209,7 +211,7 @@ def get_router(session_maker: async_sessionmaker) -> Router:
                                     "Нажмите на копку <b>Оплатить</b> для перехода к оплате\n\n"
                                     "Либо перейдите по ссылке:\n"
                                     f"<code>{url}</code>\n\n"
-                                    "Счет для оплаты действителен 30 минут", reply_markup=payment_kb(url))
+                                    "Счет для оплаты действителен 30 минут", reply_markup=payment_kb(pay_link(order_id, url)))
         await _start_polling(cb, order_id)
 
     return router
@@ -5,6 +5,7 @@ from aiogram.utils.keyboard import InlineKeyboardBuilder
 from ..services.referral import build_ref_link
 from ..keyboards.common import main_menu_kb, back_nav_kb, accept_kb, back_new_kb  # если у тебя есть главное меню
 from ..repositories.users import UsersRepo
+from ..services.identity import Identity
 import os
 from sqlalchemy.ext.asyncio import async_sessionmaker
 from aiogram.fsm.state import State, StatesGroup
@@ -24,15 +25,15 @@ def get_router(session_maker: async_sessionmaker) -> Router:
     router = Router(name="referral")
 
     @router.callback_query(F.data == "referal")
-    async def show_ref_link(cb: types.CallbackQuery):
+    async def show_ref_link(cb: types.CallbackQuery, identity: Identity):
         m = cb.message
-        me = await m.bot.get_me()
-        user = (await m.bot.get_chat_member(m.chat.id, m.chat.id)).user
-        link = build_ref_link(me.username or "", user.id)
+        me = await m.bot.me()
+        link = build_ref_link(me.username or "", identity.tg_user_id)
 
+        # баланс меняется начислениями из payment-api — читаем свежий
         async with session_maker() as s:
             users = UsersRepo(s)
-            user = await users.get_by_tg_id(m.chat.id)
+            user = await users.get_by_tg_id(identity.tg_user_id)
 
         kb = InlineKeyboardBuilder()
         kb.row(types.InlineKeyboardButton(text="🔗 Открыть ссылку", url=link))
@@ -123,18 +124,14 @@ def get_router(session_maker: async_sessionmaker) -> Router:
         await state.set_state(Referral.accept_withdraw)
 
     @router.callback_query(F.data == "accept")
-    async def choose_net(cb: types.CallbackQuery, state: FSMContext):
+    async def choose_net(cb: types.CallbackQuery, state: FSMContext, identity: Identity):
         data = await state.get_data()
         address = str(data.get("address"))
         amount = float(data.get("amount"))
         net = str(data.get("net"))
         m = cb.message
 
-        async with session_maker() as s:
-            users = UsersRepo(s)
-            user = await users.get_by_tg_id(m.chat.id)
-
-        user_id = user.id
+        user_id = identity.user_id
 
         print(m.chat.id, address, amount, net)
         
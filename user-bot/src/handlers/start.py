@@ -3,7 +3,7 @@ from aiogram.filters import CommandStart, CommandObject
 from sqlalchemy.ext.asyncio import async_sessionmaker
 
 from ..repositories.users import UsersRepo
-from ..repositories.user_bots import UserBotsRepo
+from ..services.identity import Identity, identity_cache
 from ..repositories.channels import ChannelsRepo
 from ..repositories.referrals import ReferralsRepo
 from ..keyboards.common import offer_kb, check_subs_kb, main_menu_kb
@@ -28,36 +28,25 @@ def get_router(session_maker: async_sessionmaker) -> Router:
     router = Router(name="start")
 
     @router.message(CommandStart(deep_link=True))
-    async def cmd_start(m: types.Message, u: types.User | None = None, command: CommandObject | None = None):
+    async def cmd_start(m: types.Message, identity: Identity, command: CommandObject | None = None):
         # ref_code = command.args if command else None
         if command:
             ref_code = command.args
         else:
             ref_code = None
         async with session_maker() as session:
-            users = UsersRepo(session)
-            bots = UserBotsRepo(session)
-            # channels = ChannelsRepo(session)
-
-            tg = u if u else (await m.bot.get_chat_member(m.chat.id, m.chat.id)).user
-            bot = await bots.get_by_tg_bot_id(m.bot.id)
-            user = await users.upsert_from_telegram(tg, bot.id)
-            # user = await users.get_by_tg_id(tg.id)
+            # пользователь уже определён IdentityMiddleware (кеш + отложенный upsert)
 
             referrer_tg_id = int(ref_code) if (ref_code and ref_code.isdigit()) else None
             if referrer_tg_id:
-                print(referrer_tg_id)
                 # найти referrer в users по tg_user_id
                 ref_q = await session.execute(select(User).where(User.tg_user_id == referrer_tg_id))
                 ref_user = ref_q.scalar_one_or_none()
-                print(ref_user.id)
                 if ref_user:
                     refs = ReferralsRepo(session)
-                    print("yo")
-                    await refs.create_link_if_absent(ref_user.id, user.id)
+                    await refs.create_link_if_absent(ref_user.id, identity.user_id)
 
-            if not user.accepted_offer_at:
-                print(user.accepted_offer_at)
+            if not identity.accepted_offer_at:
                 await m.answer(OFFER_TEXT, reply_markup=offer_kb(BTN_AGREE, BTN_DISAGREE))
                 return
 
@@ -72,7 +61,7 @@ def get_router(session_maker: async_sessionmaker) -> Router:
             #     await m.answer("Для использования бота подпишитесь на каналы:", reply_markup=check_subs_kb(missing, BTN_CHECK_SUBS))
             #     return
 
-            ok, missing = await check_user_subscriptions(session, m.bot, m.from_user.id)
+            ok, missing = await check_user_subscriptions(session, m.bot, identity.tg_user_id)
 
             if not ok:
                 links = "\n".join(f"• {c}" for c in missing)
@@ -87,24 +76,24 @@ def get_router(session_maker: async_sessionmaker) -> Router:
             await m.answer("Добро пожаловать! Выберите действие:", reply_markup=main_menu_kb())
 
     @router.message(CommandStart())
-    async def default_cmd_start(m: types.Message, u: types.User | None = None, command: CommandObject | None = None):
-        await cmd_start(m=m, u=u)
-        print("qwe")
+    async def default_cmd_start(m: types.Message, identity: Identity):
+        await cmd_start(m=m, identity=identity)
 
     @router.callback_query(F.data == BTN_AGREE)
-    async def agree_offer(cb: types.CallbackQuery):
+    async def agree_offer(cb: types.CallbackQuery, identity: Identity):
         async with session_maker() as session:
             users = UsersRepo(session)
             await users.set_offer_accepted_now(cb.from_user.id)
+        identity_cache.set_offer_accepted(identity)
         await cb.message.edit_text("Спасибо! Оферта принята ✅\nПроверяю подписку…")
-        await cmd_start(cb.message, cb.from_user)
+        await cmd_start(cb.message, identity)
 
     @router.callback_query(F.data == BTN_DISAGREE)
     async def disagree_offer(cb: types.CallbackQuery):
         await cb.message.edit_text("Вы можете вернуться к использованию бота после принятия оферты.")
 
     @router.callback_query(F.data == BTN_CHECK_SUBS)
-    async def check_subs(cb: types.CallbackQuery):
-        await cmd_start(cb.message, u=cb.from_user)
+    async def check_subs(cb: types.CallbackQuery, identity: Identity):
+        await cmd_start(cb.message, identity)
 
     return router
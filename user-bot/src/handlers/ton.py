@@ -11,7 +11,8 @@ from ..repositories.orders import OrdersRepo
 from ..repositories.user_bots import UserBotsRepo
 from ..keyboards.common import who_kb, cancel_kb, main_menu_kb, payment_methods_kb, payment_kb, back_nav_kb
 
-from ..services.payments_api import create_order
+from ..services.payments_api import create_order, pay_link
+from ..services.quotes import method_prices
 from ..services.order_poll import poll_until_paid
 
 class BuyTON(StatesGroup):
@@ -36,7 +37,7 @@ def get_router(session_maker: async_sessionmaker) -> Router:
     @router.callback_query(F.data == "ton")
     async def entry(cb: types.CallbackQuery, state: FSMContext):
         await state.clear()
-        user = (await cb.bot.get_chat_member(cb.message.chat.id, cb.message.chat.id)).user
+        user = cb.from_user
         if not user.username:
             await state.set_state(BuyStars.enter_me)
             await cb.message.edit_text("У вас отсутствует имя пользователся. Введите его в настройках профиля telegram.", reply_markup=back_nav_kb())
@@ -91,7 +92,8 @@ def get_router(session_maker: async_sessionmaker) -> Router:
         await state.set_state(BuyTON.choose_payment)
         await m.answer(
             f"Окей, {qty} TON.\nВыберите способ оплаты:",
-            reply_markup=payment_methods_kb(BTN_PAY_SBP, BTN_PAY_TON, BTN_PAY_OTHER, BTN_CANCEL)
+            reply_markup=payment_methods_kb(BTN_PAY_SBP, BTN_PAY_TON, BTN_PAY_OTHER, BTN_CANCEL,
+                                          prices=await method_prices(m.bot.id, "ton", qty))
         )
 
     async def _start_polling(cb: types.CallbackQuery, order_id: int):
@@ -141,7 +143,7 @@ def get_router(session_maker: async_sessionmaker) -> Router:
             f"<code>{memo}</code>\n\n"
             f"Если вы не укажите комментарий - ваш депозит не будет зачислен\n\n"
             f"Счет для оплаты действителен 30 минут",
-            reply_markup=payment_kb(link)
+            reply_markup=payment_kb(pay_link(order_id, link))
         )
         await _start_polling(cb, order_id)
 
@@ -178,7 +180,7 @@ def get_router(session_maker: async_sessionmaker) -> Router:
             "Либо перейдите по ссылке:\n"
             f"{redirect}\n\n"
             "Счет для оплаты действителен 30 минут",
-            reply_markup=payment_kb(redirect)
+            reply_markup=payment_kb(pay_link(order_id, redirect))
         )
         await _start_polling(cb, order_id)
 
@@ -212,7 +214,7 @@ def get_router(session_maker: async_sessionmaker) -> Router:
                                     "Либо перейдите по ссылке:\n"
                                     f"<code>{url}</code>\n\n"
                                     "Счет для оплаты действителен 30 минут",
-                                    reply_markup=payment_kb(url))
+                                    reply_markup=payment_kb(pay_link(order_id, url)))
         # Если хочешь показать URL сразу здесь — расширь ответ Payment API (добавь поле heleket.url)
         await _start_polling(cb, order_id)
         
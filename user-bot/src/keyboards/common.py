@@ -53,11 +53,17 @@ def cancel_kb(cancel_cb: str):
     kb.button(text="Отмена", callback_data=cancel_cb)
     return kb.as_markup()
 
-def payment_methods_kb(sbp_cb: str, ton_cb: str, other_cb: str, cancel_cb: str):
+def payment_methods_kb(sbp_cb: str, ton_cb: str, other_cb: str, cancel_cb: str, prices: dict | None = None):
+    # prices: {"SBP": "150 ₽", "TON": "0.5 TON", ...} — подписи с итоговой суммой
+    prices = prices or {}
+
+    def _label(text: str, method: str) -> str:
+        return f"{text} — {prices[method]}" if prices.get(method) else text
+
     kb = InlineKeyboardBuilder()
-    kb.row(types.InlineKeyboardButton(text="🏦 СБП", callback_data=sbp_cb))
-    kb.row(types.InlineKeyboardButton(text="💎 TON", callback_data=ton_cb))
-    kb.row(types.InlineKeyboardButton(text="🪙 Другая крипта", callback_data=other_cb))
+    kb.row(types.InlineKeyboardButton(text=_label("🏦 СБП", "SBP"), callback_data=sbp_cb))
+    kb.row(types.InlineKeyboardButton(text=_label("💎 TON", "TON"), callback_data=ton_cb))
+    kb.row(types.InlineKeyboardButton(text=_label("🪙 Другая крипта", "CRYPTO_OTHER"), callback_data=other_cb))
     kb.row(types.InlineKeyboardButton(text="Отмена", callback_data=cancel_cb))
     return kb.as_markup()
 
@@ -70,13 +76,14 @@ def premium_duration_kb(m3_cb: str, m6_cb: str, m12_cb: str, cancel_cb: str):
     return kb.as_markup()
 
 
-def history_nav_kb(page: int, has_prev: bool, has_next: bool):
+def history_nav_kb(page: int, prev_cursor: str | None, next_cursor: str | None):
+    # курсоры — "<paid_at в мкс>:<order_id>" крайних заказов текущей страницы
     kb = InlineKeyboardBuilder()
-    if has_prev:
-        kb.button(text="⬅️ Назад", callback_data=f"hist:{page-1}")
+    if prev_cursor:
+        kb.button(text="⬅️ Назад", callback_data=f"hist:p:{page-1}:{prev_cursor}")
     kb.button(text=f"Стр. {page}", callback_data="hist:stay")
-    if has_next:
-        kb.button(text="Вперёд ➡️", callback_data=f"hist:{page+1}")
+    if next_cursor:
+        kb.button(text="Вперёд ➡️", callback_data=f"hist:n:{page+1}:{next_cursor}")
     return kb.as_markup()
 
 def back_nav_kb():
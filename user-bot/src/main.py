@@ -9,23 +9,28 @@ from aiogram.enums import ParseMode
 from aiogram.fsm.storage.base import DefaultKeyBuilder
 
 from src.services.mirror_manager import MirrorManager
-from .db import init_engine, close_engine, get_session_maker
+from .db import init_engine, close_engine, get_session_maker, log_pool_stats
 # from .build_dispatcher import build_dispatcher
 from .utils import on_startup_banner
 from src.handlers import mirror
-from .handlers import start, menu, stars, premium, history, referral, test_fragment, ton
-from .services.mirror_manager import MirrorManager
+from .handlers import start, menu, stars, premium, history, referral, test_fragment, ton, membership
 from src.services.polling_manager import PollingManager
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
-from sqlalchemy import select
 
-from src.core.dispatcher import build_dispatcher
+from src.core.dispatcher import build_dispatcher, build_fsm
 from src.core.multibot import run_all
-from src.repositories.user_bots import UserBot
 
-from aiogram.fsm.storage.memory import SimpleEventIsolation
+from src.services.pricing_cache import pricing_cache
+from src.services.order_events import order_events
+from src.services.order_poll import order_poller
+from src.services.identity import identity_cache
+from src.services.subscription import membership_cache
+from src.services.bot_registry import bot_registry, owns_bot, tg_bot_id_from_token, BOT_SHARD_COUNT, BOT_SHARD_INDEX
+from src.middlewares.identity import IdentityMiddleware
 
 LOG_LEVEL = os.getenv("BOT_LOG_LEVEL", "INFO").upper()
+# как часто шард ищет в user_bots новые зеркала своего шарда, заведённые через другие процессы
+BOT_RESCAN_SEC = int(os.getenv("BOT_RESCAN_SEC", "60"))
 
 async def _load_tokens(session_maker: async_sessionmaker) -> list[str]:
     """
@@ -39,11 +44,11 @@ async def _load_tokens(session_maker: async_sessionmaker) -> list[str]:
 
     # tokens.append(main_token)
 
+    # заодно заполняем bot_registry: tg_bot_id → user_bots
     async with session_maker() as session:
-        rows = (await session.execute(
-            select(UserBot.tg_bot_token).where(UserBot.is_active.is_(True))
-        )).scalars().all()
-        tokens.extend(t for t in rows if t)
+        rows = await bot_registry.load(session)
+        # поллим только боты своего шарда
+        tokens.extend(r.tg_bot_token for r in rows if r.tg_bot_token and owns_bot(tg_bot_id_from_token(r.tg_bot_token)))
 
     # Уберём дубли на всякий:
     seen, uniq = set(), []
@@ -53,6 +58,27 @@ async def _load_tokens(session_maker: async_sessionmaker) -> list[str]:
             seen.add(t)
     return uniq
 
+async def _watch_new_bots(session_maker: async_sessionmaker, dp: Dispatcher, polling_manager: PollingManager, started: set[int]):
+    """
+    Зеркало создаёт тот процесс, куда написал пользователь, а поллит — шард-владелец.
+    Владелец подхватывает такие боты периодическим перечитыванием user_bots.
+    """
+    while True:
+        await asyncio.sleep(BOT_RESCAN_SEC)
+        try:
+            tokens = await _load_tokens(session_maker)
+        except Exception as e:
+            logging.getLogger(__name__).warning("bot rescan: %s", e)
+            continue
+        for token in tokens:
+            tg_bot_id = tg_bot_id_from_token(token)
+            if tg_bot_id in started or tg_bot_id in polling_manager.bot_ids:
+                continue
+            started.add(tg_bot_id)
+            bot = Bot(token=token, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+            polling_manager.start_bot_polling(dp=dp, bot=bot, dp_for_new_bot=dp, polling_manager=polling_manager)
+
+
 async def main():
     logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
     # token = os.getenv("USER_BOT_TOKEN")
@@ -62,12 +88,27 @@ async def main():
     # DB
     await init_engine()
     session_maker = get_session_maker()
+    # ссылку держим, иначе задачу может собрать GC
+    pool_stats_task = asyncio.create_task(log_pool_stats(), name="db-pool-stats")
+    await pricing_cache.start(os.getenv("DATABASE_URL"))
+    # статусы заказов приходят push'ем из payment-api, а не опросом из каждого чата
+    await order_events.start()
+    # запасной опрос — один на процесс, пачками по всем ждущим заказам
+    await order_poller.start()
+    # отложенная запись профилей пользователей (см. IdentityMiddleware)
+    await identity_cache.start(session_maker)
+    # сбросы кеша проверок подписки между шардами
+    await membership_cache.start()
 
     tokens = await _load_tokens(session_maker)
 
     bots = [Bot(token=token, default=DefaultBotProperties(parse_mode=ParseMode.HTML)) for token in tokens]
 
-    dp = Dispatcher(session_maker=session_maker, events_isolation=SimpleEventIsolation())
+    # FSM_STORAGE=redis: состояния покупок и блокировки апдейтов в Redis, общие для всех реплик
+    storage, events_isolation = build_fsm()
+    dp = Dispatcher(session_maker=session_maker, storage=storage, events_isolation=events_isolation)
+    # пользователь и ключ бота определяются один раз на апдейт и приходят в хендлеры как identity / bot_key
+    dp.update.outer_middleware(IdentityMiddleware(session_maker))
 
 
     # # redis = Redis.from_url(os.getenv("REDIS_DSN", "redis://redis:6379/0"))
@@ -90,12 +131,33 @@ async def main():
     dp.include_router(referral.get_router(session_maker))
     dp.include_router(mirror.get_router(session_maker))
     dp.include_router(test_fragment.get_router())
+    # chat_member из обязательных каналов — сброс кеша проверок подписки
+    dp.include_router(membership.get_router())
 
     polling_manager = PollingManager()
 
     for bot in bots:
         await bot.get_updates(offset=-1)
-    await dp.start_polling(*bots, dp_for_new_bot=dp, polling_manager=polling_manager)
+    logging.getLogger(__name__).info("shard %d/%d: %d bots", BOT_SHARD_INDEX, BOT_SHARD_COUNT, len(bots))
+    rescan = None
+    if BOT_SHARD_COUNT > 1 or not bots:
+        started = {b.id for b in bots}
+        rescan = asyncio.create_task(_watch_new_bots(session_maker, dp, polling_manager, started))
+    try:
+        if bots:
+            await dp.start_polling(*bots, dp_for_new_bot=dp, polling_manager=polling_manager)
+        else:
+            # своих ботов у шарда пока нет (start_polling без ботов падает):
+            # живём на перечитывании user_bots, найденные боты поднимает polling_manager
+            await rescan
+    finally:
+        if rescan:
+            rescan.cancel()
+        pool_stats_task.cancel()
+        # дописываем накопленные изменения профилей
+        await identity_cache.stop()
+        await membership_cache.stop()
+        await dp.storage.close()
 
     # poll = PollingManager(dp=dp, session_maker=session_maker)
 
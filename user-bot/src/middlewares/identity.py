@@ -0,0 +1,40 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.types import TelegramObject, User as TgUser
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from ..services.identity import identity_cache
+from ..services.bot_context import resolve_bot_key
+from ..services.bot_registry import bot_registry
+
+
+class IdentityMiddleware(BaseMiddleware):
+    """
+    Outer-middleware на update: один раз на апдейт определяет ключ бота и пользователя
+    (bot_registry и identity_cache, без похода в БД на горячем пути) и кладёт их в data —
+    хендлеры получают `identity` и `bot_key` аргументами.
+    """
+
+    def __init__(self, session_maker: async_sessionmaker):
+        self.session_maker = session_maker
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        tg_user: TgUser | None = data.get("event_from_user")
+        bot: Bot | None = data.get("bot")
+        chat = data.get("event_chat")
+        # апдейты из каналов и групп (chat_member и т.п.) — не наши пользователи, в users их не пишем
+        private = chat is None or chat.type == "private"
+        if tg_user is not None and bot is not None and not tg_user.is_bot and private:
+            bot_key = bot_registry.key(bot.id)
+            if bot_key is None:
+                async with self.session_maker() as session:
+                    bot_key = await resolve_bot_key(session, bot)
+            data["bot_key"] = bot_key
+            data["identity"] = await identity_cache.resolve(self.session_maker, tg_user, bot_key)
+        return await handler(event, data)
@@ -1,5 +1,5 @@
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
-from sqlalchemy import BigInteger, Text, String, Boolean, JSON, TIMESTAMP, ForeignKey, DECIMAL
+from sqlalchemy import BigInteger, Integer, Text, String, Boolean, JSON, TIMESTAMP, ForeignKey, DECIMAL
 from datetime import datetime
 
 class Base(DeclarativeBase):
@@ -18,6 +18,8 @@ class User(Base):
     # accepted_offer_at = mapped_column(TIMESTAMP(timezone=False), nullable=True)
     is_blocked: Mapped[bool] = mapped_column(Boolean, default=False)
     bot_id: Mapped[int] = mapped_column(ForeignKey("user_bots.id"), nullable=False)
+    # ведётся триггером orders_paid_count (db/init/09_paid_orders_count.sql)
+    paid_orders_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
     created_at: Mapped[datetime | None] = mapped_column(TIMESTAMP(timezone=False))
 
 class RequiredChannel(Base):
@@ -1,5 +1,6 @@
+from datetime import datetime
 from typing import Optional, List
-from sqlalchemy import select, insert, update, func, cast, desc, nulls_last
+from sqlalchemy import select, insert, update, func, cast, desc, tuple_
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.asyncio import AsyncSession
 from ..models import Order
@@ -74,18 +75,24 @@ class OrdersRepo:
         res = await self.session.execute(select(Order).where(Order.id == order_id))
         return res.scalar_one_or_none()
     
-    async def list_paid_by_user(self, user_id: int, limit: int = 10, offset: int = 0) -> List[Order]:
-        q = (
-            select(Order)
-            .where(Order.user_id == user_id, Order.status == "paid")
-            # .order_by(desc(Order.paid_at.nullslast()), desc(Order.created_at))
-            .order_by(
-                nulls_last(Order.paid_at.desc()),   # → даст "paid_at DESC NULLS LAST"
-                Order.created_at.desc(),
-            )
-            .limit(limit)
-            .offset(offset)
-        )
+    async def list_paid_by_user(
+        self, user_id: int, limit: int = 10,
+        after: tuple[datetime, int] | None = None, before: tuple[datetime, int] | None = None,
+    ) -> List[Order]:
+        """
+        Страница оплаченных заказов, новые сверху. Keyset по (paid_at, id) вместо OFFSET:
+        after — заказы старше курсора (следующая страница), before — новее (предыдущая).
+        Идёт по индексу idx_orders_user_paid_keyset, цена не растёт с номером страницы.
+        """
+        q = select(Order).where(Order.user_id == user_id, Order.status == "paid")
+        if before is not None:
+            q = q.where(tuple_(Order.paid_at, Order.id) > tuple_(*before))
+            q = q.order_by(Order.paid_at.asc(), Order.id.asc()).limit(limit)
+            res = await self.session.execute(q)
+            return list(reversed(res.scalars().all()))
+        if after is not None:
+            q = q.where(tuple_(Order.paid_at, Order.id) < tuple_(*after))
+        q = q.order_by(Order.paid_at.desc(), Order.id.desc()).limit(limit)
         res = await self.session.execute(q)
         return list(res.scalars().all())
 
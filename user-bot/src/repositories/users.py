@@ -12,6 +12,10 @@ class UsersRepo:
         res = await self.session.execute(q)
         return res.scalar_one_or_none()
 
+    async def get_paid_orders_count(self, user_id: int) -> int:
+        res = await self.session.execute(select(User.paid_orders_count).where(User.id == user_id))
+        return int(res.scalar_one_or_none() or 0)
+
     async def upsert_from_telegram(self, tg_user, bot_id) -> User:
         user = await self.get_by_tg_id(tg_user.id)
         if user is None:
@@ -0,0 +1,82 @@
+import logging
+import os
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models import UserBot
+
+logger = logging.getLogger(__name__)
+
+# шардирование ботов между процессами: процесс поллит боты с tg_bot_id % COUNT == INDEX
+BOT_SHARD_COUNT = max(1, int(os.getenv("BOT_SHARD_COUNT", "1")))
+BOT_SHARD_INDEX = int(os.getenv("BOT_SHARD_INDEX", "0"))
+
+
+@dataclass(frozen=True)
+class BotInfo:
+    key: int                      # user_bots.id
+    tg_bot_id: int
+    username: Optional[str]
+    owner_user_id: Optional[int]
+
+
+def tg_bot_id_from_token(token: str) -> int:
+    """Telegram id бота — часть токена до двоеточия, get_me для этого не нужен."""
+    return int(token.split(":", 1)[0])
+
+
+def owns_bot(tg_bot_id: int) -> bool:
+    """Этот ли процесс поллит бота."""
+    return tg_bot_id % BOT_SHARD_COUNT == BOT_SHARD_INDEX
+
+
+class BotRegistry:
+    """
+    Боты этого процесса: tg_bot_id → строка user_bots.
+    Заполняется при старте из _load_tokens и дополняется при создании зеркала,
+    так что на горячем пути это поиск в словаре. Промах (бота завели в другом процессе)
+    дочитывается из БД одним запросом.
+    """
+
+    def __init__(self):
+        self._by_tg_id: Dict[int, BotInfo] = {}
+
+    def register(self, row: UserBot) -> BotInfo:
+        tg_bot_id = row.tg_bot_id or tg_bot_id_from_token(row.tg_bot_token)
+        info = BotInfo(key=row.id, tg_bot_id=tg_bot_id, username=row.bot_username, owner_user_id=row.owner_user_id)
+        self._by_tg_id[tg_bot_id] = info
+        return info
+
+    def get(self, tg_bot_id: int) -> Optional[BotInfo]:
+        return self._by_tg_id.get(tg_bot_id)
+
+    def key(self, tg_bot_id: int) -> Optional[int]:
+        info = self._by_tg_id.get(tg_bot_id)
+        return info.key if info else None
+
+    async def resolve(self, session: AsyncSession, tg_bot_id: int) -> Optional[BotInfo]:
+        info = self._by_tg_id.get(tg_bot_id)
+        if info is not None:
+            return info
+        res = await session.execute(select(UserBot).where(UserBot.tg_bot_id == tg_bot_id))
+        row = res.scalar_one_or_none()
+        if row is None:
+            logger.warning("bot registry: бот %s не найден в user_bots", tg_bot_id)
+            return None
+        return self.register(row)
+
+    async def load(self, session: AsyncSession) -> List[UserBot]:
+        """Все активные боты; регистрирует их и возвращает строки (нужны токены)."""
+        rows = (await session.execute(
+            select(UserBot).where(UserBot.is_active.is_(True))
+        )).scalars().all()
+        for row in rows:
+            if row.tg_bot_token:
+                self.register(row)
+        return list(rows)
+
+
+bot_registry = BotRegistry()
@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Optional
+
+from aiogram import types
+from sqlalchemy import select, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from ..models import User
+
+logger = logging.getLogger(__name__)
+
+IDENTITY_CACHE_SIZE = int(os.getenv("IDENTITY_CACHE_SIZE", "50000"))
+IDENTITY_CACHE_TTL_SEC = int(os.getenv("IDENTITY_CACHE_TTL_SEC", "900"))
+# изменения профиля копятся и пишутся одним upsert раз в столько секунд
+IDENTITY_FLUSH_SEC = float(os.getenv("IDENTITY_FLUSH_SEC", "5"))
+
+_PROFILE_FIELDS = ("username", "first_name", "last_name", "lang_code")
+
+
+@dataclass
+class Identity:
+    """Кто прислал апдейт: строка users и ключ бота, через который он пришёл."""
+    user_id: int
+    tg_user_id: int
+    bot_key: Optional[int]
+    username: Optional[str]
+    first_name: Optional[str]
+    last_name: Optional[str]
+    lang_code: Optional[str]
+    accepted_offer_at: Optional[datetime]
+
+
+def _profile(tg_user: types.User, bot_key: Optional[int]) -> dict:
+    return {
+        "tg_user_id": tg_user.id,
+        "username": tg_user.username,
+        "first_name": tg_user.first_name,
+        "last_name": tg_user.last_name,
+        "lang_code": getattr(tg_user, "language_code", None),
+        "bot_id": bot_key,
+    }
+
+
+def _identity(user: User) -> Identity:
+    return Identity(
+        user_id=user.id, tg_user_id=user.tg_user_id, bot_key=user.bot_id,
+        username=user.username, first_name=user.first_name, last_name=user.last_name,
+        lang_code=user.lang_code, accepted_offer_at=user.accepted_offer_at,
+    )
+
+
+class IdentityCache:
+    """
+    LRU-кеш пользователей по tg id.
+    Попадание — ноль запросов. Промах — SELECT, для нового пользователя — один
+    INSERT ... ON CONFLICT. Если в апдейте поменялся профиль (username, имя, язык)
+    или бот, через который пишет пользователь, запись в users откладывается
+    и уходит пачкой одним upsert раз в IDENTITY_FLUSH_SEC.
+    """
+
+    def __init__(self, size: int = IDENTITY_CACHE_SIZE, ttl: int = IDENTITY_CACHE_TTL_SEC):
+        self.size = size
+        self.ttl = ttl
+        self._items: "OrderedDict[int, tuple[float, Identity]]" = OrderedDict()
+        self._dirty: Dict[int, dict] = {}
+        self._session_maker: Optional[async_sessionmaker] = None
+        self._flusher: Optional[asyncio.Task] = None
+
+    async def resolve(self, session_maker: async_sessionmaker, tg_user: types.User, bot_key: Optional[int]) -> Identity:
+        profile = _profile(tg_user, bot_key)
+        hit = self._items.get(tg_user.id)
+        if hit and time.monotonic() - hit[0] < self.ttl:
+            self._items.move_to_end(tg_user.id)
+            ident = hit[1]
+        else:
+            ident = await self._load(session_maker, profile)
+            self._put(ident)
+        if self._apply(ident, profile):
+            self._dirty[tg_user.id] = profile
+        return ident
+
+    async def _load(self, session_maker: async_sessionmaker, profile: dict) -> Identity:
+        async with session_maker() as session:
+            res = await session.execute(select(User).where(User.tg_user_id == profile["tg_user_id"]))
+            user = res.scalar_one_or_none()
+            if user is None and profile["bot_id"] is not None:
+                # новый пользователь: сразу вставляем, id нужен хендлерам
+                res = await session.execute(
+                    insert(User).values(**profile, balance=0, created_at=func.now())
+                    .on_conflict_do_nothing(index_elements=[User.tg_user_id])
+                    .returning(User)
+                )
+                user = res.scalar_one_or_none()
+                await session.commit()
+                if user is None:  # вставил параллельный апдейт
+                    res = await session.execute(select(User).where(User.tg_user_id == profile["tg_user_id"]))
+                    user = res.scalar_one()
+            if user is None:
+                raise LookupError(f"user {profile['tg_user_id']} not found and bot is unknown")
+            return _identity(user)
+
+    def _apply(self, ident: Identity, profile: dict) -> bool:
+        """Переносит профиль из апдейта в кешированную запись; True — что-то поменялось."""
+        changed = False
+        for field in _PROFILE_FIELDS:
+            if getattr(ident, field) != profile[field]:
+                setattr(ident, field, profile[field])
+                changed = True
+        if profile["bot_id"] is not None and ident.bot_key != profile["bot_id"]:
+            ident.bot_key = profile["bot_id"]
+            changed = True
+        return changed
+
+    def _put(self, ident: Identity):
+        self._items[ident.tg_user_id] = (time.monotonic(), ident)
+        self._items.move_to_end(ident.tg_user_id)
+        while len(self._items) > self.size:
+            self._items.popitem(last=False)
+
+    def set_offer_accepted(self, ident: Identity, at: datetime | None = None):
+        """Отражает в кеше запись оферты (сама запись — UsersRepo.set_offer_accepted_now)."""
+        ident.accepted_offer_at = at or datetime.now()
+        self._put(ident)
+
+    def invalidate(self, tg_user_id: int | None = None):
+        if tg_user_id is None:
+            self._items.clear()
+        else:
+            self._items.pop(tg_user_id, None)
+
+    async def flush(self):
+        if not self._dirty or self._session_maker is None:
+            return
+        batch, self._dirty = list(self._dirty.values()), {}
+        batch = [p for p in batch if p["bot_id"] is not None]
+        if not batch:
+            return
+        stmt = insert(User).values([{**p, "balance": 0} for p in batch])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[User.tg_user_id],
+            set_={f: stmt.excluded[f] for f in (*_PROFILE_FIELDS, "bot_id")},
+        )
+        try:
+            async with self._session_maker() as session:
+                await session.execute(stmt)
+                await session.commit()
+        except Exception as e:
+            logger.warning("identity: flush of %d profiles failed: %s", len(batch), e)
+            # вернём в очередь, если за это время не пришли более свежие данные
+            for p in batch:
+                self._dirty.setdefault(p["tg_user_id"], p)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(IDENTITY_FLUSH_SEC)
+            await self.flush()
+
+    async def start(self, session_maker: async_sessionmaker):
+        self._session_maker = session_maker
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._run(), name="identity-flush")
+
+    async def stop(self):
+        if self._flusher:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        await self.flush()
+
+
+identity_cache = IdentityCache()
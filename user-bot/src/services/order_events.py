@@ -0,0 +1,100 @@
+import asyncio
+import logging
+import os
+from typing import Dict, List, Optional
+
+from redis.asyncio import Redis
+
+logger = logging.getLogger(__name__)
+
+REDIS_DSN = os.getenv("REDIS_DSN", "redis://redis:6379/0")
+ORDER_EVENTS_STREAM = os.getenv("ORDER_EVENTS_STREAM", "order_events")
+ORDER_EVENTS_RECONNECT_SEC = int(os.getenv("ORDER_EVENTS_RECONNECT_SEC", "5"))
+
+
+class OrderEvents:
+    """
+    Одна подписка процесса на стрим переходов статусов заказов из payment-api.
+    Чаты, ждущие оплату, регистрируют future по order_id; подписчик резолвит его
+    событием {"order_id", "status", "message"}. Без группы потребителей:
+    каждый инстанс бота видит все события и реагирует только на свои заказы.
+    """
+
+    def __init__(self):
+        self._waiters: Dict[int, List[asyncio.Future]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._redis = None
+        self.connected = False
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def pending_ids(self) -> List[int]:
+        return list(self._waiters)
+
+    def wait(self, order_id: int) -> asyncio.Future:
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(order_id, []).append(fut)
+        return fut
+
+    def discard(self, order_id: int, fut: asyncio.Future):
+        waiters = self._waiters.get(order_id)
+        if not waiters:
+            return
+        if fut in waiters:
+            waiters.remove(fut)
+        if not waiters:
+            self._waiters.pop(order_id, None)
+
+    def resolve(self, data: dict):
+        """Отдаёт ждущим заказ итоговое состояние — из стрима или из батч-поллера."""
+        try:
+            order_id = int(data.get("order_id"))
+        except (TypeError, ValueError):
+            return
+        for fut in self._waiters.pop(order_id, []):
+            if not fut.done():
+                fut.set_result(data)
+
+    async def _run(self):
+        self._redis = Redis.from_url(REDIS_DSN)
+        # читаем только новое: ждущие чаты живут в памяти этого процесса
+        last_id = "$"
+        while True:
+            try:
+                resp = await self._redis.xread({ORDER_EVENTS_STREAM: last_id}, count=100, block=30000)
+                self.connected = True
+                for _, messages in resp or []:
+                    for msg_id, fields in messages:
+                        last_id = msg_id
+                        data = {(k.decode() if isinstance(k, bytes) else k):
+                                (v.decode() if isinstance(v, bytes) else v) for k, v in fields.items()}
+                        # в стриме все события outbox (created, fulfilled, ...) — ждущим нужен только итог оплаты
+                        if data.get("status") in ("paid", "failed"):
+                            self.resolve(data)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.connected = False
+                logger.warning("order events: ошибка чтения стрима: %s", e)
+                await asyncio.sleep(ORDER_EVENTS_RECONNECT_SEC)
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="order-events")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+
+order_events = OrderEvents()
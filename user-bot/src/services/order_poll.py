@@ -1,6 +1,63 @@
 import asyncio
+import logging
+import os
 from typing import Callable, Awaitable, Optional
-from .payments_api import get_order_status
+from .payments_api import get_order_status, get_order_statuses
+from .order_events import order_events
+
+logger = logging.getLogger(__name__)
+
+ORDER_POLL_INTERVAL_SEC = float(os.getenv("ORDER_POLL_INTERVAL_SEC", "15"))
+# пока подписка на события жива, опрос — только страховка от потерянных событий
+ORDER_POLL_SAFETY_SEC = float(os.getenv("ORDER_POLL_SAFETY_SEC", "120"))
+ORDER_POLL_BATCH = int(os.getenv("ORDER_POLL_BATCH", "200"))
+
+FINAL_STATUSES = {"paid", "failed"}
+
+
+class OrderStatusPoller:
+    """
+    Один поллер на процесс: собирает id всех ждущих оплату заказов (по всем зеркалам)
+    и опрашивает GET /orders/status пачками по ORDER_POLL_BATCH.
+    Нагрузка на payment-api зависит от частоты опроса, а не от числа заказов.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+
+    async def poll_once(self):
+        ids = order_events.pending_ids()
+        for i in range(0, len(ids), ORDER_POLL_BATCH):
+            for item in await get_order_statuses(ids[i:i + ORDER_POLL_BATCH]):
+                if item.get("status") in FINAL_STATUSES:
+                    order_events.resolve(item)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(ORDER_POLL_SAFETY_SEC if order_events.connected else ORDER_POLL_INTERVAL_SEC)
+            try:
+                await self.poll_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("order poller: %s", e)
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="order-poller")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+order_poller = OrderStatusPoller()
+
 
 async def poll_until_paid(
     order_id: int,
@@ -10,11 +67,18 @@ async def poll_until_paid(
     interval_sec: float = 5.0,
     timeout_sec: float = 15 * 60
 ):
-    deadline = asyncio.get_event_loop().time() + timeout_sec
-    while asyncio.get_event_loop().time() < deadline:
+    """
+    Ждём итоговый статус заказа: его приносит push-событие payment-api
+    или общий батч-поллер. По таймауту один раз сверяемся с API.
+    interval_sec оставлен для совместимости: частоту задаёт ORDER_POLL_INTERVAL_SEC.
+    """
+    fut = order_events.wait(order_id)
+    try:
+        data = await asyncio.wait_for(asyncio.shield(fut), timeout=timeout_sec)
+    except asyncio.TimeoutError:
+        order_events.discard(order_id, fut)
         data = await get_order_status(order_id)
-        if data.get("status") == "paid":
-            await on_paid(data)
-            return
-        await asyncio.sleep(interval_sec)
-    await on_timeout()
+    if data.get("status") == "paid":
+        await on_paid(data)
+    else:
+        await on_timeout()
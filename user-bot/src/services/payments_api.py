@@ -3,6 +3,8 @@ import aiohttp
 from typing import Optional, Literal, TypedDict
 
 PAYMENT_API = os.getenv("PAYMENT_API_BASE", "http://payment-api:8081").rstrip("/")
+# публичный адрес Payment API: кнопка «Оплатить» ведёт через него, чтобы ускорить опрос шлюза
+PAYMENT_API_PUBLIC = os.getenv("PAYMENT_API_PUBLIC_URL", "").rstrip("/")
 
 PaymentMethod = Literal["TON", "SBP", "CRYPTO_OTHER"]
 OrderType = Literal["stars", "premium", "ton"]
@@ -16,6 +18,12 @@ class CreateOrderResult(TypedDict, total=False):
     other: dict
     # у HELEKET ответ может прийти текстом в message (или расширите API при желании)
 
+def pay_link(order_id: int, url: str) -> str:
+    """Ссылка для кнопки «Оплатить»; без публичного адреса API — прямая ссылка шлюза."""
+    if not PAYMENT_API_PUBLIC:
+        return url
+    return f"{PAYMENT_API_PUBLIC}/orders/{order_id}/pay"
+
 async def create_order(
     *, user_tg_id: int, username: Optional[str],
     recipient: Optional[str],
@@ -38,12 +46,27 @@ async def create_order(
             r.raise_for_status()
             return await r.json()
 
+async def get_quotes(bot_tg_id: int) -> dict:
+    """Цены за единицу по всем (order_type, payment_method) бота."""
+    async with aiohttp.ClientSession() as http:
+        async with http.get(f"{PAYMENT_API}/quotes", params={"bot_tg_id": bot_tg_id}, timeout=10) as r:
+            r.raise_for_status()
+            return await r.json()
+
 async def get_order_status(order_id: int) -> dict:
     async with aiohttp.ClientSession() as http:
         async with http.get(f"{PAYMENT_API}/orders/{order_id}", timeout=15) as r:
             r.raise_for_status()
             return await r.json()
         
+async def get_order_statuses(order_ids: list[int]) -> list[dict]:
+    """Статусы пачки заказов: [{"order_id", "status", "message"}, ...]."""
+    ids = ",".join(str(i) for i in order_ids)
+    async with aiohttp.ClientSession() as http:
+        async with http.get(f"{PAYMENT_API}/orders/status", params={"ids": ids}, timeout=15) as r:
+            r.raise_for_status()
+            return (await r.json()).get("orders") or []
+
 async def create_withdraw(user_id: int, to_address: str, amount: float):
     body = {
         "user_id": user_id, 
@@ -3,7 +3,7 @@ import functools
 import logging
 from asyncio import AbstractEventLoop, CancelledError, Task, get_running_loop
 from contextvars import Context
-from typing import Any, Awaitable, Dict, List, Optional
+from typing import Any, Awaitable, Dict, List, Optional, Set
 
 from aiogram import Bot
 from aiogram.dispatcher.dispatcher import DEFAULT_BACKOFF_CONFIG, Dispatcher
@@ -16,6 +16,8 @@ logger = logging.getLogger(__name__)
 class PollingManager:
     def __init__(self):
         self.polling_tasks: Dict[int, Task] = {}
+        # боты, для которых поллинг уже запрошен (задача появляется не сразу)
+        self.bot_ids: Set[int] = set()
 
     def _create_pooling_task(
         self,
@@ -49,6 +51,10 @@ class PollingManager:
         allowed_updates: Optional[List[str]] = None,
         **kwargs: Any,
     ):
+        self.bot_ids.add(bot.id)
+        if allowed_updates is None:
+            # как в Dispatcher.start_polling: иначе Telegram не присылает chat_member
+            allowed_updates = dp.resolve_used_update_types()
         loop: AbstractEventLoop = get_running_loop()
         # noinspection PyArgumentList
         loop.call_soon(
@@ -116,5 +122,6 @@ class PollingManager:
             await bot.session.close()
 
     def stop_bot_polling(self, bot_id: int):
+        self.bot_ids.discard(bot_id)
         polling_task = self.polling_tasks.pop(bot_id)
         polling_task.cancel()
@@ -0,0 +1,49 @@
+import logging
+import time
+from decimal import Decimal, ROUND_UP
+
+from .payments_api import get_quotes
+
+logger = logging.getLogger(__name__)
+
+QUOTES_TTL_SEC = 60
+
+# bot_tg_id -> (время загрузки, {(order_type, payment_method): (currency, unit_price)})
+_cache: dict[int, tuple[float, dict]] = {}
+
+
+async def _load(bot_tg_id: int) -> dict:
+    hit = _cache.get(bot_tg_id)
+    if hit and time.monotonic() - hit[0] < QUOTES_TTL_SEC:
+        return hit[1]
+    data = await get_quotes(bot_tg_id)
+    quotes = {
+        (q["order_type"], q["payment_method"]): (q["currency"], Decimal(q["unit_price"]))
+        for q in data.get("quotes", [])
+    }
+    _cache[bot_tg_id] = (time.monotonic(), quotes)
+    return quotes
+
+
+async def method_prices(bot_tg_id: int, order_type: str, amount: int) -> dict:
+    """
+    Подписи для payment_methods_kb: {"SBP": "150 ₽", "TON": "0.52 TON", ...}.
+    Округление как в payment-api. Если котировки недоступны — пустой словарь,
+    клавиатура покажется без цен.
+    """
+    try:
+        quotes = await _load(bot_tg_id)
+    except Exception as e:
+        logger.warning("Не удалось получить котировки: %s", e)
+        return {}
+    out = {}
+    for (q_type, method), (currency, unit) in quotes.items():
+        if q_type != order_type:
+            continue
+        total = unit * Decimal(amount)
+        if currency == "TON":
+            total = total.quantize(Decimal("0.000000001"), rounding=ROUND_UP).normalize()
+            out[method] = f"{total:f} TON"
+        else:
+            out[method] = f"{int(total.quantize(Decimal('1'), rounding=ROUND_UP))} ₽"
+    return out
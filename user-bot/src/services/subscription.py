@@ -1,11 +1,119 @@
-from typing import List, Tuple
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple
 from aiogram import Bot
 from aiogram.exceptions import TelegramBadRequest
+from redis.asyncio import Redis
 from sqlalchemy.ext.asyncio import AsyncSession
 from ..repositories.required_channels import RequiredChannelsRepo
 from .bot_context import resolve_bot_key
 from ..models import RequiredChannel
 
+logger = logging.getLogger(__name__)
+
+# подтверждённая подписка живёт столько секунд; отписку раньше ловим по chat_member.
+# Кеш у каждого процесса свой, а chat_member получает только шард, который поллит
+# бота-админа канала, — сброс рассылается остальным через Redis pub/sub. Если Redis
+# недоступен, чужой шард видит отписку не позже чем через TTL.
+SUBSCRIPTION_CACHE_TTL_SEC = int(os.getenv("SUBSCRIPTION_CACHE_TTL_SEC", "600"))
+REDIS_DSN = os.getenv("REDIS_DSN", "redis://redis:6379/0")
+MEMBERSHIP_INVALIDATE_CHANNEL = os.getenv("MEMBERSHIP_INVALIDATE_CHANNEL", "membership:invalidate")
+MEMBERSHIP_RECONNECT_SEC = int(os.getenv("MEMBERSHIP_RECONNECT_SEC", "5"))
+
+_LEFT_STATUSES = ("left", "kicked", "ChatMemberLeft", "ChatMemberBanned")
+
+
+def _channel_key(channel: str) -> str:
+    return channel.strip().lstrip("@").lower()
+
+
+class MembershipCache:
+    """
+    Кеш только положительных проверок: (канал, пользователь) → {бот: истекает_в}.
+    Отрицательный результат не кешируем — пользователь подпишется и сразу нажмёт «Проверить».
+    """
+
+    def __init__(self, ttl: int = SUBSCRIPTION_CACHE_TTL_SEC):
+        self.ttl = ttl
+        self._items: Dict[Tuple[str, int], Dict[int, float]] = {}
+        self._pruned_at = time.monotonic()
+        self._redis = None
+        self._task: Optional[asyncio.Task] = None
+
+    def is_member(self, bot_id: int, channel: str, user_id: int) -> bool:
+        expires = self._items.get((_channel_key(channel), user_id), {}).get(bot_id)
+        return expires is not None and expires > time.monotonic()
+
+    def remember(self, bot_id: int, channel: str, user_id: int):
+        self._items.setdefault((_channel_key(channel), user_id), {})[bot_id] = time.monotonic() + self.ttl
+
+    def invalidate(self, channel: str, user_id: int):
+        # апдейт приходит только боту-админу канала, а сбрасываем для всех ботов
+        self._items.pop((_channel_key(channel), user_id), None)
+
+    async def broadcast_invalidate(self, channel: str, user_id: int):
+        """Сброс здесь и во всех остальных процессах."""
+        self.invalidate(channel, user_id)
+        if self._redis is None:
+            return
+        try:
+            await self._redis.publish(MEMBERSHIP_INVALIDATE_CHANNEL, f"{_channel_key(channel)}:{user_id}")
+        except Exception as e:
+            logger.warning("membership cache: не удалось разослать сброс: %s", e)
+
+    def prune(self):
+        # не чаще раза в TTL: проход по всему словарю
+        now = time.monotonic()
+        if now - self._pruned_at < self.ttl:
+            return
+        self._pruned_at = now
+        for key in [k for k, bots in self._items.items() if all(t <= now for t in bots.values())]:
+            del self._items[key]
+
+    async def _listen(self):
+        while True:
+            pubsub = self._redis.pubsub()
+            try:
+                await pubsub.subscribe(MEMBERSHIP_INVALIDATE_CHANNEL)
+                # сбросы, разосланные пока подписки не было, потеряны — начинаем с чистого кеша
+                self._items.clear()
+                async for msg in pubsub.listen():
+                    if msg.get("type") != "message":
+                        continue
+                    data = msg["data"].decode() if isinstance(msg["data"], bytes) else msg["data"]
+                    channel, _, user_id = data.rpartition(":")
+                    self.invalidate(channel, int(user_id))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("membership cache: подписка на сбросы: %s", e)
+                await asyncio.sleep(MEMBERSHIP_RECONNECT_SEC)
+            finally:
+                await pubsub.aclose()
+
+    async def start(self):
+        if self._task is None:
+            self._redis = Redis.from_url(REDIS_DSN)
+            self._task = asyncio.create_task(self._listen(), name="membership-invalidate")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+
+membership_cache = MembershipCache()
+
+
 async def fetch_required_channels(session: AsyncSession, bot: Bot) -> List[str]:
     """
     Вернёт список usernames каналов (вида @channel) для текущего бота.
@@ -16,26 +124,39 @@ async def fetch_required_channels(session: AsyncSession, bot: Bot) -> List[str]:
     # channel_username хранится как '@channel' — оставим как есть
     return [r.channel_username for r in rows]
 
+
+async def _is_joined(bot: Bot, channel: str, user_id: int) -> bool:
+    try:
+        member = await bot.get_chat_member(chat_id=channel, user_id=user_id)
+    except TelegramBadRequest:
+        # если канал приватный/неправильный — считаем как «не подписан»
+        return False
+    status = getattr(member, "status", None)
+    # ChatMemberStatus — str-enum, str() от него в 3.11 даёт «ChatMemberStatus.LEFT»
+    status = getattr(status, "value", status)
+    # joined если не 'left' и не 'kicked'
+    return str(status) not in _LEFT_STATUSES
+
+
 async def check_user_subscriptions(session: AsyncSession, bot: Bot, user_id: int) -> Tuple[bool, List[str]]:
     """
     Проверяет, подписан ли user_id на все required_channels для текущего бота.
     Возвращает (ok, not_joined_list).
+    Подтверждённые подписки берутся из membership_cache, остальные каналы
+    проверяются параллельно.
     """
-    # print(bot.id, user_id)
     channels = await fetch_required_channels(session, bot)
-    not_joined: List[str] = []
+    unknown = [ch for ch in channels if not membership_cache.is_member(bot.id, ch, user_id)]
+    if not unknown:
+        return True, []
 
-    for ch in channels:
-        try:
-            member = await bot.get_chat_member(chat_id=ch, user_id=user_id)
-            status = getattr(member, "status", None)
-            # joined если не 'left' и не 'kicked'
-            if str(status) in ("left", "kicked", "ChatMemberLeft", "ChatMemberBanned"):
-                not_joined.append(ch)
-        except TelegramBadRequest:
-            # если канал приватный/неправильный — считаем как «не подписан»
+    results = await asyncio.gather(*(_is_joined(bot, ch, user_id) for ch in unknown))
+    not_joined: List[str] = []
+    for ch, joined in zip(unknown, results):
+        if joined:
+            membership_cache.remember(bot.id, ch, user_id)
+        else:
             not_joined.append(ch)
-
-    # print(not_joined)
+    membership_cache.prune()
 
     return (len(not_joined) == 0, not_joined)